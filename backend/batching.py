@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+# --------------------------------------------------
+# Settings (env overridable)
+# --------------------------------------------------
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+
+# --------------------------------------------------
+# Dynamic micro-batcher
+# --------------------------------------------------
+class MicroBatcher:
+    """
+    Collects concurrent submit() calls into one batch_fn(items) call.
+
+    A batch is flushed when it reaches max_batch_size or when the
+    oldest waiting item has waited max_wait_ms. batch_fn must return
+    one result per item, in order; results are scattered back to the
+    awaiting callers. At most max_inflight batches run at once (on
+    `executor`), so requests that arrive while every worker is busy
+    pile up into the next, larger batch.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=BATCH_MAX_SIZE,
+                 max_wait_ms=BATCH_MAX_WAIT_MS, executor=None,
+                 max_inflight=1):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+        self.max_inflight = max(1, int(max_inflight))
+
+        self._queue = None
+        self._workers = []
+
+    def start(self):
+        if not self._workers:
+            self._queue = asyncio.Queue()
+            loop = asyncio.get_running_loop()
+            self._workers = [
+                loop.create_task(self._run())
+                for _ in range(self.max_inflight)
+            ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item):
+        self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, fut))
+        return await fut
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+
+            # Callers that went away (client disconnect) are dropped
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.batch_fn, items
+                )
+                results = list(results)
+                if len(results) != len(batch):
+                    # zip() would leave the extra callers waiting forever
+                    raise RuntimeError(
+                        f"batch_fn returned {len(results)} results for "
+                        f"{len(batch)} items"
+                    )
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
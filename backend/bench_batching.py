@@ -0,0 +1,126 @@
+"""
+Throughput vs concurrency for the /predict micro-batcher.
+
+    python -m backend.bench_batching --images path/to/imgs --requests 64
+
+Runs the real ml_code.ensemble.predict pipeline in-process, first
+checking that batched outputs match single-image outputs, then firing
+`concurrency` simultaneous submits for each batch size setting.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from ml_code.preprocessing import load_image
+from ml_code.ensemble.predict import predict_image, predict_batch
+from backend.batching import MicroBatcher
+
+
+# --------------------------------------------------
+# Inputs
+# --------------------------------------------------
+def load_inputs(images_dir, n):
+    if images_dir:
+        exts = (".jpg", ".jpeg", ".png")
+        paths = sorted(
+            os.path.join(images_dir, f) for f in os.listdir(images_dir)
+            if f.lower().endswith(exts)
+        )[:n]
+        if paths:
+            return [load_image(p) for p in paths]
+
+    rng = np.random.default_rng(42)
+    return [
+        load_image(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8))
+        for _ in range(n)
+    ]
+
+
+# --------------------------------------------------
+# Batched == single-image check
+# --------------------------------------------------
+def check_equivalence(imgs, atol=1e-4):
+    batched = predict_batch(imgs)
+
+    for img, b in zip(imgs, batched):
+        s = predict_image(img)
+
+        assert s["cnn"]["label"] == b["cnn"]["label"], "CNN label mismatch"
+        assert abs(s["cnn"]["confidence"] - b["cnn"]["confidence"]) <= atol, \
+            "CNN confidence mismatch"
+
+        s_top = dict(s["clip_top5"])
+        b_top = dict(b["clip_top5"])
+        assert s_top.keys() == b_top.keys(), "CLIP top-5 mismatch"
+        for k in s_top:
+            assert abs(s_top[k] - b_top[k]) <= atol, "CLIP score mismatch"
+
+        assert s["final_label"] == b["final_label"], "Final label mismatch"
+
+    print(f"Equivalence OK on {len(imgs)} images (atol={atol})")
+
+
+# --------------------------------------------------
+# Throughput
+# --------------------------------------------------
+async def run_load(imgs, concurrency, total, max_batch_size, max_wait_ms):
+    batcher = MicroBatcher(
+        predict_batch,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+    )
+    batcher.start()
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with sem:
+            t0 = time.perf_counter()
+            await batcher.submit(imgs[i % len(imgs)])
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - t0
+
+    await batcher.stop()
+
+    lat = np.array(latencies) * 1000
+    return total / elapsed, np.percentile(lat, 50), np.percentile(lat, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", default=None, help="Folder of test images")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    imgs = load_inputs(args.images, 16)
+    check_equivalence(imgs[:4])
+
+    # Warm-up (graph tracing, allocator growth)
+    predict_batch(imgs[:2])
+
+    print(f"\n{'max_batch':>9} {'conc':>5} {'img/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for bs in [int(b) for b in args.batch_sizes.split(",")]:
+        for conc in [int(c) for c in args.concurrency.split(",")]:
+            tput, p50, p95 = asyncio.run(
+                run_load(imgs, conc, args.requests, bs, args.max_wait_ms)
+            )
+            print(f"{bs:>9} {conc:>5} {tput:>8.2f} {p50:>8.1f} {p95:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
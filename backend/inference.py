@@ -0,0 +1,82 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from ml_code.runtime import tuned_settings
+
+# --------------------------------------------------
+# Settings (env overridable)
+# --------------------------------------------------
+# Threads that run model forwards. TF / PyTorch release the GIL in
+# their kernels, so these never block the event loop. Default: the
+# concurrency picked by python -m ml_code.tune_runtime, else core count.
+INFERENCE_WORKERS = int(os.getenv(
+    "INFERENCE_WORKERS",
+    str(tuned_settings().get("inference_workers") or os.cpu_count() or 1),
+))
+
+# Requests allowed inside the model pipeline at the same time
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "16"))
+
+# Requests allowed to wait for a slot before /predict answers 503
+INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", "64"))
+
+
+# --------------------------------------------------
+# Dedicated, bounded executor for blocking inference
+# --------------------------------------------------
+executor = ThreadPoolExecutor(
+    max_workers=max(1, INFERENCE_WORKERS),
+    thread_name_prefix="inference",
+)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class InferenceLimiter:
+    """
+    Admission control in front of the inference executor.
+
+    At most max_concurrency requests hold a slot; up to queue_depth more
+    may wait for one. Beyond that slot() raises QueueFull immediately
+    (reject=True) so the caller can answer 503 instead of piling up.
+    """
+
+    def __init__(self, max_concurrency=INFERENCE_MAX_CONCURRENCY,
+                 queue_depth=INFERENCE_QUEUE_DEPTH):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_depth = max(0, queue_depth)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self.active = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self, reject=True):
+        if reject and self._sem.locked() and self.waiting >= self.queue_depth:
+            raise QueueFull(
+                f"{self.active} running, {self.waiting} queued"
+            )
+
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+        }
@@ -1,10 +1,19 @@
 import os
 import sys
+import json
+import asyncio
+import time
+import shutil
 import tempfile
+import zipfile
+import zlib
+from functools import partial
+from typing import List, Optional
 import requests
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from geopy.distance import geodesic
 from backend.places_service import (
     fetch_dermatology_hospitals,
@@ -22,7 +31,19 @@ ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from ml_code.ensemble.predict import predict_image
+from ml_code.ensemble.predict import predict_batch, pipeline_version
+from ml_code.model_manager import models
+from ml_code import metrics
+from ml_code.preprocessing import load_image
+from ml_code.config import CNN_TTA
+from backend.batching import MicroBatcher, BATCH_MAX_SIZE
+from backend.inference import (
+    executor as inference_executor,
+    InferenceLimiter,
+    QueueFull,
+    INFERENCE_WORKERS,
+)
+from backend.result_cache import ResultCache, image_key
 
 # --------------------------------------------------
 # APP INIT
@@ -40,6 +61,105 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --------------------------------------------------
+# INFERENCE BATCHER (concurrent /predict calls share forwards)
+# --------------------------------------------------
+# Forwards run on the dedicated inference executor, never on the
+# event loop, so /health and /locations/* stay responsive.
+batcher = MicroBatcher(
+    partial(predict_batch, tta=False),
+    executor=inference_executor,
+    max_inflight=INFERENCE_WORKERS,
+)
+# ?tta=true requests batch separately; same executor, so the worker
+# count still bounds concurrent forwards
+tta_batcher = MicroBatcher(
+    partial(predict_batch, tta=True),
+    executor=inference_executor,
+    max_inflight=INFERENCE_WORKERS,
+)
+limiter = InferenceLimiter()
+
+# Identical images (retries, re-submits) are served from cache
+result_cache = ResultCache()
+PIPELINE_VERSION = pipeline_version()
+
+
+def decode_upload(data, tta=False):
+    image = load_image(data)
+    version = PIPELINE_VERSION + ("|tta" if tta else "")
+    return image, image_key(image, version)
+
+
+async def cached_predict(image, key, tta=False):
+    target = tta_batcher if tta else batcher
+    return await result_cache.get_or_compute(
+        key, lambda: target.submit(image)
+    )
+
+
+# Models needed by /predict, loaded + warmed in the background
+SERVING_MODELS = ["cnn", "clip"]
+
+
+@app.on_event("startup")
+async def start_batcher():
+    models.load_async(SERVING_MODELS)
+    batcher.start()
+    tta_batcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+    await tta_batcher.stop()
+    inference_executor.shutdown(wait=False)
+    # Commits pending write-behind results
+    await run_in_threadpool(result_cache.close)
+
+# --------------------------------------------------
+# METRICS (Prometheus text format, no collector needed)
+# --------------------------------------------------
+HTTP_REQUESTS = metrics.Counter(
+    "skin_http_requests_total", "HTTP requests",
+    labelnames=("path", "method", "status"),
+)
+HTTP_SECONDS = metrics.Histogram(
+    "skin_http_request_seconds", "HTTP request latency",
+    labelnames=("path",),
+)
+metrics.Gauge("skin_inference_batch_queue_depth",
+              "Images waiting for the micro-batcher",
+              lambda: batcher.depth + tta_batcher.depth)
+metrics.Gauge("skin_inference_active",
+              "Requests holding an inference slot", lambda: limiter.active)
+metrics.Gauge("skin_inference_waiting",
+              "Requests waiting for an inference slot", lambda: limiter.waiting)
+for _name in ("memory_hits", "disk_hits", "misses", "coalesced", "evictions"):
+    metrics.Gauge(f"skin_result_cache_{_name}_total", f"Result cache {_name}",
+                  lambda n=_name: result_cache.counters[n], kind="counter")
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+
+    # Route template, not raw URL, to keep label cardinality bounded
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    HTTP_SECONDS.observe(time.perf_counter() - t0, path=path)
+    HTTP_REQUESTS.inc(path=path, method=request.method,
+                      status=response.status_code)
+    return response
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )
+
 # --------------------------------------------------
 # HEALTH CHECK
 # --------------------------------------------------
@@ -47,22 +167,54 @@ app.add_middleware(
 def health():
     return {"status": "ok"}
 
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness (vs /health liveness): 200 only once every serving
+    model is loaded and warmed. Per-model state and load time.
+    """
+    body = {
+        "ready": models.is_ready(SERVING_MODELS),
+        "models": models.status(SERVING_MODELS),
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+@app.get("/health/inference")
+def inference_health():
+    return {**limiter.stats(), "batch_queue": batcher.depth,
+            "tta_batch_queue": tta_batcher.depth}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return result_cache.stats()
+
 # --------------------------------------------------
 # PREDICTION ENDPOINT
 # --------------------------------------------------
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(file: UploadFile = File(...), tta: Optional[bool] = None):
+    # tta: re-score low-confidence CNN predictions with test-time
+    # augmentation (default: CNN_TTA)
+    tta = CNN_TTA if tta is None else tta
     try:
-        # Validate image using PIL (safer than content_type)
-        image = Image.open(file.file).convert("RGB")
+        async with limiter.slot():
+            # Validate + decode once using PIL (safer than content_type)
+            image, key = await run_in_threadpool(
+                decode_upload, await file.read(), tta
+            )
 
-        # Save image temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            image.save(tmp.name)
-            img_path = tmp.name
+            # Run your existing ML pipeline (cached, micro-batched)
+            result = await cached_predict(image, key, tta)
 
-        # Run your existing ML pipeline
-        result = predict_image(img_path)
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Inference queue full ({e}), retry later",
+            headers={"Retry-After": "1"},
+        )
 
     except HTTPException:
         raise
@@ -71,10 +223,10 @@ async def predict(file: UploadFile = File(...)):
         print("BACKEND ERROR:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        if "img_path" in locals() and os.path.exists(img_path):
-            os.remove(img_path)
+    return format_prediction(result)
 
+
+def format_prediction(result):
     return {
         "disease": result["final_label"],
         "confidence": round(
@@ -87,6 +239,177 @@ async def predict(file: UploadFile = File(...)):
     }
 
 
+# --------------------------------------------------
+# BULK PREDICTION (multipart files and/or .zip, NDJSON out)
+# --------------------------------------------------
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+# Uploads above this spill from memory to a temp file
+UPLOAD_SPOOL_BYTES = 8 * 1024 * 1024
+
+# Largest single image (plain upload or zip member) /predict/batch reads;
+# zip members are checked before and while decompressing (zip bombs)
+UPLOAD_MAX_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+
+# What a truncated, corrupt, encrypted or oddly compressed archive raises
+ZIP_ERRORS = (zipfile.BadZipFile, zlib.error, OSError, RuntimeError,
+              NotImplementedError)
+
+
+def spool_uploads(files):
+    """
+    Copies every UploadFile into a temp file owned by the response.
+    The UploadFiles are closed once the handler returns, before the
+    NDJSON stream is consumed. Blocking I/O: call via run_in_threadpool.
+    """
+    spooled = []
+    try:
+        for upload in files:
+            tmp = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+            upload.file.seek(0)
+            shutil.copyfileobj(upload.file, tmp)
+            tmp.seek(0)
+            spooled.append((upload.filename or "upload", tmp))
+    except BaseException:
+        for _, tmp in spooled:
+            tmp.close()
+        raise
+    return spooled
+
+
+def _too_large(size=None):
+    if size is None:
+        return f"Image too large (> {UPLOAD_MAX_IMAGE_BYTES} bytes)"
+    return f"Image too large ({size} > {UPLOAD_MAX_IMAGE_BYTES} bytes)"
+
+
+def _read_capped(f):
+    # One byte past the limit is enough to tell it was exceeded
+    data = f.read(UPLOAD_MAX_IMAGE_BYTES + 1)
+    if len(data) > UPLOAD_MAX_IMAGE_BYTES:
+        return None, _too_large()
+    return data, None
+
+
+def iter_uploaded_images(spooled):
+    """
+    spooled: [(filename, file object)] from spool_uploads().
+    Yields (filename, raw_bytes, error) one image at a time; raw_bytes
+    is None when error is set (bad archive, oversized image).
+    Zip archives are walked member by member, never extracted whole.
+    Blocking (decompression, disk reads): iterate it in the threadpool.
+    """
+    for name, f in spooled:
+        f.seek(0)
+        if not (name.lower().endswith(".zip") or zipfile.is_zipfile(f)):
+            f.seek(0)
+            yield (name, *_read_capped(f))
+            continue
+
+        f.seek(0)
+        try:
+            zf = zipfile.ZipFile(f)
+        except ZIP_ERRORS as e:
+            yield name, None, f"Invalid zip: {e}"
+            continue
+
+        with zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTS):
+                    continue
+                # Declared size first; the capped read catches a header
+                # that lies about it
+                if info.file_size > UPLOAD_MAX_IMAGE_BYTES:
+                    yield info.filename, None, _too_large(info.file_size)
+                    continue
+                try:
+                    with zf.open(info) as member:
+                        data, error = _read_capped(member)
+                except ZIP_ERRORS as e:
+                    data, error = None, f"Invalid zip member: {e}"
+                yield info.filename, data, error
+
+
+async def _score_one(index, filename, data, error, tta=False):
+    """
+    One upload -> its NDJSON object. Never raises.
+    """
+    line = {"index": index, "filename": filename}
+    if error:
+        return {**line, "error": error}
+
+    try:
+        image, key = await run_in_threadpool(decode_upload, data, tta)
+    except Exception as e:
+        return {**line, "error": f"Invalid image: {e}"}
+
+    try:
+        # Bulk jobs wait for a slot instead of being rejected
+        async with limiter.slot(reject=False):
+            result = await cached_predict(image, key, tta)
+    except Exception as e:
+        print("BACKEND ERROR:", e)
+        return {**line, "error": str(e)}
+
+    return {**line, **format_prediction(result)}
+
+
+async def _score_chunk(chunk, tta=False):
+    """
+    chunk: [(index, filename, raw_bytes, error)] -> NDJSON lines, input order.
+    Images are decoded and scored concurrently; each line goes out as
+    soon as it and every line before it are done.
+    """
+    tasks = [asyncio.ensure_future(_score_one(*item, tta=tta)) for item in chunk]
+    order = [item[0] for item in chunk]
+    done = {}
+    pos = 0
+    try:
+        for finished in asyncio.as_completed(tasks):
+            line = await finished
+            done[line["index"]] = line
+            # Reorder buffer: release the finished prefix
+            while pos < len(order) and order[pos] in done:
+                yield json.dumps(done.pop(order[pos])) + "\n"
+                pos += 1
+    finally:
+        # Client went away mid-chunk: don't keep scoring for nobody
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/predict/batch")
+async def predict_batch_endpoint(files: List[UploadFile] = File(...),
+                                 tta: Optional[bool] = None):
+    tta = CNN_TTA if tta is None else tta
+
+    # Read everything while the request (and its UploadFiles) is alive
+    spooled = await run_in_threadpool(spool_uploads, files)
+
+    async def stream():
+        try:
+            chunk = []
+            index = 0
+            images = iterate_in_threadpool(iter_uploaded_images(spooled))
+            async for filename, data, error in images:
+                chunk.append((index, filename, data, error))
+                index += 1
+                if len(chunk) >= BATCH_MAX_SIZE:
+                    async for line in _score_chunk(chunk, tta):
+                        yield line
+                    chunk = []
+
+            if chunk:
+                async for line in _score_chunk(chunk, tta):
+                    yield line
+        finally:
+            for _, tmp in spooled:
+                tmp.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 # ------------------------------
 # Overpass fallback servers
 # ------------------------------
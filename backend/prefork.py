@@ -0,0 +1,283 @@
+"""
+Pre-fork launcher: load CLIP once, then fork N uvicorn workers.
+
+    python -m backend.prefork --workers 4 --port 8000
+    python -m backend.prefork --measure 1,2,4 --img some.jpg
+
+The parent builds open_clip (most of the serving weights) through
+ml_code.clip_registry, computes the cached text features, moves the
+tensors into shared memory, and only then forks. Workers get the same
+instance from the registry, so those pages are shared and never copied.
+
+TensorFlow is not fork-safe: its thread pools and runtime state don't
+survive fork(). So the parent never imports it, and each worker loads
+its own CNN after the fork. The parent's torch also stays
+single-threaded, so no OpenMP pool is inherited; each worker applies
+its own thread budget (ml_code.runtime) on first model load.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import deque
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", "2"))
+
+# Crashed workers are restarted after 1s, 2s, 4s ... (capped). More than
+# PREFORK_MAX_RESTARTS restarts within PREFORK_RESTART_WINDOW seconds is
+# a crash loop (bad weights, port, config): stop and exit non-zero.
+PREFORK_RESTART_BACKOFF = float(os.getenv("PREFORK_RESTART_BACKOFF", "1"))
+PREFORK_RESTART_BACKOFF_MAX = float(os.getenv("PREFORK_RESTART_BACKOFF_MAX", "30"))
+PREFORK_MAX_RESTARTS = int(os.getenv("PREFORK_MAX_RESTARTS", "5"))
+PREFORK_RESTART_WINDOW = float(os.getenv("PREFORK_RESTART_WINDOW", "60"))
+
+
+# --------------------------------------------------
+# Parent: shared weights
+# --------------------------------------------------
+def preload_clip():
+    import torch
+    from ml_code.clip_registry import get_open_clip
+    from ml_code.clip_text_cache import get_text_features
+    from ml_code.open_set.clip_predict import (
+        CLIP_ARCH, CLIP_PRETRAINED, CLIP_PRECISION, TEXT_PROMPTS,
+    )
+
+    # No intra-op pool in the parent; OpenMP pools don't survive fork
+    torch.set_num_threads(1)
+
+    t0 = time.perf_counter()
+    model, _, tokenizer = get_open_clip(CLIP_ARCH, CLIP_PRETRAINED, CLIP_PRECISION)
+    get_text_features(model, tokenizer, TEXT_PROMPTS, CLIP_ARCH, CLIP_PRETRAINED)
+    model.share_memory()
+    print(f"[prefork] CLIP loaded in parent in {time.perf_counter() - t0:.1f}s")
+
+
+# --------------------------------------------------
+# Workers
+# --------------------------------------------------
+def _bind(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker(sock):
+    import uvicorn
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_DFL)
+
+    # Imported after the fork: TF, the SQLite result cache and the
+    # executors all belong to this worker
+    config = uvicorn.Config("backend.main:app", log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _worker(sock)
+        finally:
+            os._exit(0)
+    print(f"[prefork] worker {pid} started")
+    return pid
+
+
+def restart_delay(recent, base=PREFORK_RESTART_BACKOFF,
+                  cap=PREFORK_RESTART_BACKOFF_MAX):
+    """
+    Seconds to wait before the `recent`-th restart inside the window.
+    """
+    return min(cap, base * 2 ** max(0, recent - 1))
+
+
+def serve(workers=PREFORK_WORKERS, host="0.0.0.0", port=8000, preload=True):
+    sock = _bind(host, port)
+    if preload:
+        preload_clip()
+
+    pids = {_spawn(sock) for _ in range(workers)}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    restarts = deque()
+    crash_loop = False
+
+    while pids:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        pids.discard(pid)
+        if stopping:
+            continue
+
+        now = time.monotonic()
+        while restarts and now - restarts[0] > PREFORK_RESTART_WINDOW:
+            restarts.popleft()
+        if len(restarts) >= PREFORK_MAX_RESTARTS:
+            print(f"[prefork] worker {pid} exited ({status}); "
+                  f"{len(restarts)} restarts in {PREFORK_RESTART_WINDOW:.0f}s, "
+                  f"giving up")
+            crash_loop = True
+            _stop(None, None)
+            continue
+
+        restarts.append(now)
+        delay = restart_delay(len(restarts))
+        print(f"[prefork] worker {pid} exited ({status}), "
+              f"restarting in {delay:.1f}s")
+        # Short sleeps so SIGTERM during the backoff is honoured
+        deadline = now + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if not stopping:
+            pids.add(_spawn(sock))
+
+    if crash_loop:
+        raise SystemExit(1)
+
+
+# --------------------------------------------------
+# Memory measurement
+# --------------------------------------------------
+def _smaps(pid):
+    mem = {"rss": 0, "pss": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key = line.split(":")[0].lower()
+                if key in mem:
+                    mem[key] = int(line.split()[1])
+    except OSError:
+        pass
+    return mem
+
+
+def _process_tree(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _wait_ready(url, workers, timeout=900):
+    import requests
+
+    deadline = time.time() + timeout
+    streak = 0
+    # Connections land on arbitrary workers; a long enough streak of
+    # 200s means every worker has its models
+    while time.time() < deadline:
+        try:
+            ok = requests.get(f"{url}/ready", timeout=5).status_code == 200
+        except requests.RequestException:
+            ok = False
+        streak = streak + 1 if ok else 0
+        if streak >= 5 * workers:
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def measure(levels, img=None, port=8765):
+    import requests
+
+    url = f"http://127.0.0.1:{port}"
+    rows = []
+
+    for workers in levels:
+        for preload in (False, True):
+            cmd = [sys.executable, "-m", "backend.prefork", "--workers",
+                   str(workers), "--host", "127.0.0.1", "--port", str(port)]
+            if not preload:
+                cmd.append("--no-preload")
+
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL)
+            try:
+                if not _wait_ready(url, workers):
+                    print(f"workers={workers} preload={preload}: not ready, skipped")
+                    continue
+                if img:
+                    for _ in range(4 * workers):
+                        with open(img, "rb") as f:
+                            requests.post(f"{url}/predict", files={"file": f},
+                                          timeout=120)
+                time.sleep(2)
+
+                mem = [_smaps(p) for p in _process_tree(proc.pid)]
+                rows.append({
+                    "workers": workers,
+                    "mode": "prefork" if preload else "independent",
+                    "rss_mb": round(sum(m["rss"] for m in mem) / 1024, 1),
+                    "pss_mb": round(sum(m["pss"] for m in mem) / 1024, 1),
+                })
+            finally:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    for p in _process_tree(proc.pid):
+                        try:
+                            os.kill(p, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                    proc.wait()
+
+    # RSS double-counts shared pages; PSS splits them between processes
+    # and is the real footprint
+    print(f"{'workers':>7} {'mode':>12} {'sum RSS MB':>11} {'PSS MB':>9} "
+          f"{'PSS/worker':>11}")
+    for r in rows:
+        print(f"{r['workers']:>7} {r['mode']:>12} {r['rss_mb']:>11} "
+              f"{r['pss_mb']:>9} {r['pss_mb'] / r['workers']:>11.1f}")
+    print(json.dumps(rows))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=PREFORK_WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-preload", action="store_true",
+                        help="Each worker loads its own CLIP (baseline)")
+    parser.add_argument("--measure", default=None,
+                        help="Worker counts to measure, e.g. 1,2,4")
+    parser.add_argument("--img", help="Image to POST before measuring")
+    args = parser.parse_args()
+
+    if args.measure:
+        measure([int(n) for n in args.measure.split(",")], args.img)
+    else:
+        serve(args.workers, args.host, args.port, preload=not args.no_preload)
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --------------------------------------------------
+# Settings (env overridable)
+# --------------------------------------------------
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")  # "" = memory only
+
+
+def image_key(img, version):
+    """
+    Content address of a decoded RGB PIL image + pipeline version.
+    Hashes pixels, not file bytes, so re-encoded uploads still hit.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(version.encode("utf-8"))
+    h.update(f"{img.mode}:{img.size[0]}x{img.size[1]}".encode("utf-8"))
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+# --------------------------------------------------
+# Two-tier cache with single-flight
+# --------------------------------------------------
+class ResultCache:
+    """
+    LRU in memory, optionally backed by a SQLite file that survives
+    restarts. get_or_compute() coalesces concurrent identical requests
+    so only one of them runs inference.
+
+    get_or_compute() never touches SQLite on the event loop: disk
+    lookups run on a one-thread executor, and new results are written
+    behind on the same thread. get() / put() are the blocking versions.
+    """
+
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, db_path=RESULT_CACHE_DB):
+        self.maxsize = max(0, maxsize)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()       # the OrderedDict only
+        # SQLite calls; never taken on the event loop (get_or_compute
+        # goes through _io), so a slow commit can't stall memory hits
+        self._db_lock = threading.Lock()
+        self._inflight = {}
+
+        self._db = None
+        self._io = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+            # One thread: SQLite calls are serialised and writes land in order
+            self._io = ThreadPoolExecutor(max_workers=1,
+                                          thread_name_prefix="result-cache")
+
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+        }
+
+    # ---------- tiers ----------
+    def _get_memory(self, key):
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+        return None
+
+    def _put_memory(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _get_disk(self, key):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put_disk(self, key, value):
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)",
+                (key, json.dumps(value)),
+            )
+            self._db.commit()
+
+    def get(self, key):
+        value = self._get_memory(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value
+
+        value = self._get_disk(key)
+        if value is not None:
+            self.counters["disk_hits"] += 1
+            self._put_memory(key, value)
+            return value
+
+        return None
+
+    def put(self, key, value):
+        self._put_memory(key, value)
+        self._put_disk(key, value)
+
+    # ---------- single-flight ----------
+    async def get_or_compute(self, key, compute):
+        """
+        compute: zero-arg coroutine function producing the result.
+        """
+        value = self._get_memory(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            # Own task: a disconnecting first caller doesn't cancel the
+            # inference the coalesced callers are waiting on. The disk
+            # lookup is inside it, so it is single-flight too.
+            task = asyncio.ensure_future(self._load_or_compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def _load_or_compute(self, key, compute):
+        if self._io is not None:
+            loop = asyncio.get_running_loop()
+            value = await loop.run_in_executor(self._io, self._get_disk, key)
+            if value is not None:
+                self.counters["disk_hits"] += 1
+                self._put_memory(key, value)
+                return value
+
+        self.counters["misses"] += 1
+        value = await compute()
+        self._put_memory(key, value)
+        if self._io is not None:
+            # Write-behind: callers don't wait for the commit
+            self._io.submit(self._put_disk_logged, key, value)
+        return value
+
+    def _put_disk_logged(self, key, value):
+        try:
+            self._put_disk(key, value)
+        except Exception as e:
+            print("RESULT CACHE WRITE FAILED:", e)
+
+    def flush(self):
+        """
+        Blocks until queued disk writes are committed.
+        """
+        if self._io is not None:
+            self._io.submit(lambda: None).result()
+
+    def close(self):
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+            self._io = None
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self):
+        lookups = (
+            self.counters["memory_hits"]
+            + self.counters["disk_hits"]
+            + self.counters["misses"]
+        )
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        return {
+            **self.counters,
+            "size": len(self._lru),
+            "maxsize": self.maxsize,
+            "disk": self._db is not None,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,14 +1,12 @@
 import torch
-import open_clip
 from PIL import Image
 import sys
 
-# Load CLIP model
-model, _, preprocess = open_clip.create_model_and_transforms(
-    "ViT-B-32", pretrained="laion2b_s34b_b79k"
-)
-tokenizer = open_clip.get_tokenizer("ViT-B-32")
-model.eval()
+from ml_code.clip_registry import get_open_clip
+from ml_code.clip_text_cache import get_text_features
+
+CLIP_ARCH = "ViT-B-32"
+CLIP_PRETRAINED = "laion2b_s34b_b79k"
 
 # OPEN-SET DISEASE LIST (YOU CAN EXTEND THIS)
 DISEASES = [
@@ -28,18 +26,20 @@ DISEASES = [
     "healthy skin"
 ]
 
+TEXT_PROMPTS = [f"a clinical photograph of {disease}" for disease in DISEASES]
+
 def predict(image_path):
+    # Same weights as the serving pipeline; one instance per process
+    model, preprocess, tokenizer = get_open_clip(CLIP_ARCH, CLIP_PRETRAINED)
     image = preprocess(Image.open(image_path).convert("RGB")).unsqueeze(0)
 
-    texts = [f"a clinical photograph of {disease}" for disease in DISEASES]
-    text_tokens = tokenizer(texts)
+    text_features = get_text_features(
+        model, tokenizer, TEXT_PROMPTS, CLIP_ARCH, CLIP_PRETRAINED
+    )
 
     with torch.no_grad():
         image_features = model.encode_image(image)
-        text_features = model.encode_text(text_tokens)
-
         image_features /= image_features.norm(dim=-1, keepdim=True)
-        text_features /= text_features.norm(dim=-1, keepdim=True)
 
         similarity = (image_features @ text_features.T).softmax(dim=-1)
 
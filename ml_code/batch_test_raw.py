@@ -9,20 +9,10 @@ from config import RAW_IMAGES, MODELS_DIR, IMG_SIZE
 import warnings
 warnings.filterwarnings("ignore")
 
-# tensorflow imports for cnn & embedding extractor
+# tensorflow imports for cnn; RF/XGB score its calibrated probabilities
 import tensorflow as tf
 from tensorflow.keras.preprocessing.image import load_img, img_to_array
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import GlobalAveragePooling2D
-from tensorflow.keras.models import Model
-
-# Helper: build embedding extractor (MobileNetV2->globalpool)
-def build_emb_model():
-    base = MobileNetV2(weights="imagenet", include_top=False, input_shape=(IMG_SIZE[0], IMG_SIZE[1], 3))
-    gap = GlobalAveragePooling2D()(base.output)
-    model = Model(inputs=base.input, outputs=gap)
-    return model
+from ml_code.ensemble.features import ensemble_proba
 
 # Load available models (if present)
 def load_models():
@@ -74,14 +64,6 @@ def prep_for_cnn(img_path):
     arr = np.expand_dims(arr, axis=0)
     return arr
 
-# Preprocess image for embedding-based models
-def prep_for_emb(img_path):
-    img = load_img(img_path, target_size=IMG_SIZE)
-    arr = img_to_array(img)
-    arr = preprocess_input(arr)
-    arr = np.expand_dims(arr, axis=0)
-    return arr
-
 # Top-k helper
 def top_k_labels(probs, classes_map, k=3):
     idxs = np.argsort(probs)[-k:][::-1]
@@ -115,10 +97,11 @@ def main():
     if not models:
         raise SystemExit("No models found in MODELS_DIR. Run training scripts first.")
 
-    # build emb model only if rf/xgb present
-    emb_model = None
-    if "rf" in models or "xgb" in models:
-        emb_model = build_emb_model()
+    # RF/XGB features are the CNN's calibrated probabilities (what
+    # train_ensemble fits on), so one forward serves all three models
+    if "cnn" not in models and ("rf" in models or "xgb" in models):
+        raise SystemExit("RF/XGB need the CNN for their input probabilities.")
+    cnn = models["cnn"]["model"] if "cnn" in models else None
 
     out_csv = Path("batch_predictions_raw.csv")
     with out_csv.open("w", newline="", encoding="utf-8") as csvfile:
@@ -134,46 +117,32 @@ def main():
 
         for p in tqdm(image_paths):
             pstr = str(p)
+            try:
+                preds = cnn(prep_for_cnn(pstr), training=False).numpy()[0]
+            except Exception as e:
+                for name in ("cnn", "rf", "xgb"):
+                    if name in models:
+                        writer.writerow([pstr, name, "ERROR", str(e), ""])
+                continue
+
             # CNN
-            if "cnn" in models:
-                try:
-                    arr = prep_for_cnn(pstr)
-                    preds = models["cnn"]["model"].predict(arr, verbose=0)[0]
-                    idx = int(np.argmax(preds))
-                    classes_map = models["cnn"]["classes"]
-                    label = classes_map.get(str(idx), list(classes_map.values())[idx]) if classes_map else str(idx)
-                    top3 = top_k_labels(preds, classes_map)
-                    writer.writerow([pstr, "cnn", label, f"{float(preds[idx]):.6f}", top3])
-                except Exception as e:
-                    writer.writerow([pstr, "cnn", "ERROR", str(e), ""])
-
-            # RF
-            if "rf" in models:
-                try:
-                    arr = prep_for_emb(pstr)
-                    feat = emb_model.predict(arr, verbose=0)
-                    probs = models["rf"]["model"].predict_proba(feat)[0]
-                    idx = int(np.argmax(probs))
-                    classes_map = models["rf"]["classes"]
-                    label = classes_map[idx] if isinstance(classes_map, (list,tuple)) else str(idx)
-                    top3 = top_k_labels(probs, classes_map)
-                    writer.writerow([pstr, "rf", label, f"{float(probs[idx]):.6f}", top3])
-                except Exception as e:
-                    writer.writerow([pstr, "rf", "ERROR", str(e), ""])
-
-            # XGB
-            if "xgb" in models:
-                try:
-                    arr = prep_for_emb(pstr)
-                    feat = emb_model.predict(arr, verbose=0)
-                    probs = models["xgb"]["model"].predict_proba(feat)[0]
-                    idx = int(np.argmax(probs))
-                    classes_map = models["xgb"]["classes"]
-                    label = classes_map[idx] if isinstance(classes_map, (list,tuple)) else str(idx)
-                    top3 = top_k_labels(probs, classes_map)
-                    writer.writerow([pstr, "xgb", label, f"{float(probs[idx]):.6f}", top3])
-                except Exception as e:
-                    writer.writerow([pstr, "xgb", "ERROR", str(e), ""])
+            classes_map = models["cnn"]["classes"]
+            idx = int(np.argmax(preds))
+            label = classes_map.get(str(idx), list(classes_map.values())[idx]) if classes_map else str(idx)
+            top3 = top_k_labels(preds, classes_map)
+            writer.writerow([pstr, "cnn", label, f"{float(preds[idx]):.6f}", top3])
+
+            # RF / XGB on the CNN's calibrated probabilities; a model
+            # fitted on other features raises instead of writing ERROR rows
+            for name in ("rf", "xgb"):
+                if name not in models:
+                    continue
+                probs = ensemble_proba(models[name]["model"], preds[None])[0]
+                idx = int(np.argmax(probs))
+                classes_map = models[name]["classes"]
+                label = classes_map[idx] if isinstance(classes_map, (list,tuple)) else str(idx)
+                top3 = top_k_labels(probs, classes_map)
+                writer.writerow([pstr, name, label, f"{float(probs[idx]):.6f}", top3])
 
     print("Batch predictions finished. CSV:", out_csv.resolve())
 
@@ -0,0 +1,432 @@
+# ml_code/bench.py
+"""
+Latency / throughput / memory benchmark of the prediction entry points.
+
+    python -m ml_code.bench                            # all targets
+    python -m ml_code.bench --targets ensemble,vit --runs 100
+    python -m ml_code.bench --weights random --out bench.json
+    python -m ml_code.bench --compare before.json after.json
+
+Targets: ensemble.predict.predict_image, predict_super_ensemble.
+predict_from_pil, hybrid_predict.hybrid_predict, open_set.clip_predict.
+clip_predict and vit.vit_predict.vit_predict, fed with seeded synthetic
+images. Each target runs in a fresh interpreter, so startup and peak RSS
+are its own.
+
+--weights auto (default) loads the real weights where it can and
+otherwise builds the same architecture with random initialisation (a
+fresh clone only has Git LFS pointers and no CLIP downloads). --weights
+random never touches the real files; --weights real fails instead of
+falling back. Random weights measure compute, not accuracy: e.g. the
+near-uniform CNN makes hybrid_predict take its CLIP fallback every time.
+Which weights each model actually used is recorded in the JSON.
+"""
+import os
+
+# Before ml_code.config: no dataset / weights needed to import it
+os.environ.setdefault("SKIP_ASSET_CHECKS", "1")
+
+import argparse
+import importlib
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ml_code.config import (
+    ROOT, ARTIFACTS_DIR, IMG_SIZE, CLASSES_JSON,
+    CNN_BACKEND, CLIP_PRECISION, PARALLEL_BRANCHES, CNN_TTA,
+)
+
+# name -> (module, function, input kind, models it needs)
+TARGETS = {
+    "ensemble":       ("ml_code.ensemble.predict", "predict_image", "rgb", ("cnn", "clip")),
+    "super_ensemble": ("ml_code.predict_super_ensemble", "predict_from_pil", "pil", ("cnn",)),
+    "hybrid":         ("ml_code.hybrid_predict", "hybrid_predict", "pil", ("cnn", "openai_clip")),
+    "clip":           ("ml_code.open_set.clip_predict", "clip_predict", "rgb", ("clip",)),
+    "vit":            ("ml_code.vit.vit_predict", "vit_predict", "bgr", ("vit",)),
+}
+
+WEIGHT_MODES = ("auto", "real", "random")
+
+
+# ======================================================
+# Random-init models (same architectures, no files)
+# ======================================================
+def _num_classes():
+    with open(CLASSES_JSON) as f:
+        return len(json.load(f))
+
+
+def _random_cnn():
+    from tensorflow.keras.applications import MobileNetV2
+    from tensorflow.keras.layers import Dense, Dropout, GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+    from ml_code.cnn_backends import KerasCNN
+    from ml_code.runtime import configure_threads
+
+    configure_threads()
+    # train_cnn.build_model() without the ImageNet download
+    base = MobileNetV2(weights=None, include_top=False,
+                       input_shape=(IMG_SIZE[0], IMG_SIZE[1], 3))
+    x = GlobalAveragePooling2D()(base.output)
+    x = Dropout(0.3)(x)
+    x = Dense(128, activation="relu")(x)
+    x = Dropout(0.3)(x)
+    outputs = Dense(_num_classes(), activation="softmax")(x)
+    return KerasCNN(path=None, model=Model(inputs=base.input, outputs=outputs))
+
+
+def _random_open_clip():
+    import open_clip
+    from ml_code.clip_registry import register_instance
+    from ml_code.open_set.clip_predict import CLIP_ARCH, CLIP_PRETRAINED
+    from ml_code.open_set.precision import apply_precision
+    from ml_code.runtime import configure_threads
+
+    configure_threads()
+    variant = "int8" if CLIP_PRECISION == "int8" else "fp32"
+    model, _, preprocess = open_clip.create_model_and_transforms(
+        CLIP_ARCH, pretrained=None
+    )
+    model = apply_precision(model.eval(), variant)
+    bundle = (model, preprocess, open_clip.get_tokenizer(CLIP_ARCH))
+    # Other registry users in this process get the same instance
+    register_instance("open_clip", CLIP_ARCH, CLIP_PRETRAINED, bundle, variant)
+    return bundle
+
+
+def _random_openai_clip():
+    import clip
+    from clip.model import CLIP
+    from ml_code.clip_registry import register_instance
+    from ml_code.clip_zero_shot import device
+
+    # ViT-B/32 hyper-parameters, as clip.load() reads them from the weights
+    model = CLIP(
+        embed_dim=512, image_resolution=224, vision_layers=12,
+        vision_width=768, vision_patch_size=32, context_length=77,
+        vocab_size=49408, transformer_width=512, transformer_heads=8,
+        transformer_layers=12,
+    ).to(device).eval()
+    register_instance("openai", "ViT-B/32", "openai",
+                      (model, clip.clip._transform(224), clip.tokenize),
+                      device=device)
+
+
+def _random_vit():
+    import torch
+    from ml_code.runtime import configure_threads
+    from ml_code.vit.vit_model import ViTDiseaseClassifier, ViTUint8
+    from ml_code.vit.vit_predict import CLASSES, device
+
+    configure_threads()
+    model = ViTUint8(ViTDiseaseClassifier(len(CLASSES), pretrained=False))
+    return model.to(memory_format=torch.channels_last).to(device).eval()
+
+
+def _real_openai_clip():
+    from ml_code.clip_registry import get_openai_clip
+    from ml_code.clip_zero_shot import device
+
+    get_openai_clip("ViT-B/32", device=device)
+
+
+RANDOM = {
+    "cnn": _random_cnn,
+    "clip": _random_open_clip,
+    "openai_clip": _random_openai_clip,
+    "vit": _random_vit,
+}
+
+
+def _choose(name, real, random, weights, used):
+    if weights != "random":
+        try:
+            obj = real()
+            used[name] = "real"
+            return obj
+        except Exception as e:
+            if weights == "real":
+                raise
+            print(f"[bench] {name}: real weights unavailable "
+                  f"({type(e).__name__}: {e}), using random init", file=sys.stderr)
+    used[name] = "random"
+    return random()
+
+
+def install(names, weights):
+    """
+    Routes each model through _choose(): model_manager entries get an
+    override loader (still lazy + warmed), the openai CLIP registry entry
+    is resolved up front. Returns {name: "real" | "random"}, filled in
+    as models load.
+    """
+    from ml_code.model_manager import models
+
+    used = {}
+    for name in names:
+        if name == "openai_clip":
+            _choose(name, _real_openai_clip, RANDOM[name], weights, used)
+            continue
+
+        real = {}
+
+        def loader(name=name, real=real):
+            return _choose(name, real["loader"], RANDOM[name], weights, used)
+
+        real["loader"] = models.override(name, loader)
+    return used
+
+
+# ======================================================
+# Single target (runs in its own interpreter)
+# ======================================================
+def synthetic_images(kind, n=8, size=(512, 384), seed=0):
+    rng = np.random.default_rng(seed)
+    imgs = [rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+            for _ in range(n)]
+    if kind == "pil":
+        from PIL import Image
+        return [Image.fromarray(a) for a in imgs]
+    if kind == "bgr":
+        return [np.ascontiguousarray(a[..., ::-1]) for a in imgs]
+    return imgs
+
+
+def _percentiles(times_ms):
+    t = np.asarray(times_ms)
+    return {
+        "mean": round(float(t.mean()), 2),
+        **{f"p{q}": round(float(np.percentile(t, q)), 2) for q in (50, 90, 95, 99)},
+        "max": round(float(t.max()), 2),
+    }
+
+
+def _peak_rss_mb():
+    # Linux reports ru_maxrss in KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def probe(target, runs, warmup, weights, size, concurrency):
+    module, func, kind, needs = TARGETS[target]
+
+    t0 = time.perf_counter()
+    used = install(needs, weights)
+    fn = getattr(importlib.import_module(module), func)
+    imgs = synthetic_images(kind, size=size)
+    fn(imgs[0])   # loads + warms every model it touches
+    startup = time.perf_counter() - t0
+
+    for i in range(warmup):
+        fn(imgs[i % len(imgs)])
+
+    times = []
+    for i in range(runs):
+        t = time.perf_counter()
+        fn(imgs[i % len(imgs)])
+        times.append((time.perf_counter() - t) * 1000)
+
+    result = {
+        "target": target,
+        "function": f"{module}.{func}",
+        "weights": used,
+        "startup_s": round(startup, 2),
+        "runs": runs,
+        "latency_ms": _percentiles(times),
+        "throughput_ips": round(1000 * runs / sum(times), 2),
+    }
+
+    if concurrency > 1:
+        n = runs * concurrency
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            t = time.perf_counter()
+            list(pool.map(fn, (imgs[i % len(imgs)] for i in range(n))))
+            wall = time.perf_counter() - t
+        result["concurrent"] = {
+            "threads": concurrency,
+            "throughput_ips": round(n / wall, 2),
+        }
+
+    result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    result["versions"] = {
+        m: getattr(sys.modules[m], "__version__", None)
+        for m in ("numpy", "torch", "tensorflow", "open_clip", "clip",
+                  "timm", "onnxruntime")
+        if m in sys.modules
+    }
+    print(json.dumps(result))
+
+
+# ======================================================
+# Driver
+# ======================================================
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+
+def machine_info():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "CNN_BACKEND": CNN_BACKEND,
+            "CLIP_PRECISION": CLIP_PRECISION,
+            "PARALLEL_BRANCHES": PARALLEL_BRANCHES,
+            "CNN_TTA": CNN_TTA,
+        },
+    }
+
+
+def run(targets, runs=30, warmup=3, weights="auto", size=(512, 384),
+        concurrency=1, out=None):
+    env = dict(os.environ)
+    text_cache = None
+    if weights != "real":
+        # Text features of random-init CLIP must not land in the real cache
+        text_cache = tempfile.TemporaryDirectory(prefix="bench_clip_text_")
+        env["CLIP_TEXT_CACHE_DIR"] = text_cache.name
+
+    rows = []
+    try:
+        for target in targets:
+            print(f"[bench] {target} ...", flush=True)
+            proc = subprocess.run(
+                [sys.executable, "-m", "ml_code.bench", "--probe", target,
+                 "--runs", str(runs), "--warmup", str(warmup),
+                 "--weights", weights, "--size", f"{size[0]}x{size[1]}",
+                 "--concurrency", str(concurrency)],
+                env=env, cwd=ROOT, capture_output=True, text=True,
+            )
+            lines = proc.stdout.strip().splitlines()
+            if proc.returncode != 0 or not lines:
+                err = proc.stderr.strip().splitlines()[-1:] or ["no output"]
+                print(f"[bench] {target} failed: {err[0]}")
+                rows.append({"target": target, "error": err[0]})
+                continue
+            rows.append(json.loads(lines[-1]))
+    finally:
+        if text_cache is not None:
+            text_cache.cleanup()
+
+    report = {
+        "machine": machine_info(),
+        "settings": {"runs": runs, "warmup": warmup, "weights": weights,
+                     "image_size": list(size), "concurrency": concurrency},
+        "results": rows,
+    }
+
+    print_table(rows)
+    if out is None:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = ARTIFACTS_DIR / "bench" / f"bench_{stamp}.json"
+    out = os.fspath(out)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved: {out}")
+    return report
+
+
+def print_table(rows):
+    print(f"{'target':>15} {'weights':>8} {'start s':>8} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'img/s':>7} {'peak MB':>8}")
+    for r in rows:
+        if "error" in r:
+            print(f"{r['target']:>15}  failed: {r['error']}")
+            continue
+        kinds = set(r["weights"].values())
+        weights = kinds.pop() if len(kinds) == 1 else "mixed"
+        lat = r["latency_ms"]
+        print(f"{r['target']:>15} {weights:>8} {r['startup_s']:>8} "
+              f"{lat['p50']:>8} {lat['p95']:>8} {lat['p99']:>8} "
+              f"{r['throughput_ips']:>7} {r['peak_rss_mb']:>8}")
+
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = {r["target"]: r for r in json.load(f)["results"] if "error" not in r}
+    with open(new_path) as f:
+        new = {r["target"]: r for r in json.load(f)["results"] if "error" not in r}
+
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+
+    print(f"{'target':>15} {'p50 ms':>17} {'p95 ms':>17} {'img/s':>15} {'peak MB':>17}")
+    for target in base.keys() & new.keys():
+        a, b = base[target], new[target]
+        if a["weights"] != b["weights"]:
+            print(f"{target:>15}  (weights differ: {a['weights']} vs {b['weights']})")
+        cells = []
+        for get in (lambda r: r["latency_ms"]["p50"],
+                    lambda r: r["latency_ms"]["p95"],
+                    lambda r: r["throughput_ips"],
+                    lambda r: r["peak_rss_mb"]):
+            cells.append(f"{get(b):>8} {delta(get(a), get(b)):>8}")
+        print(f"{target:>15} " + " ".join(cells))
+
+
+def _parse_size(text):
+    w, h = (int(v) for v in text.lower().split("x"))
+    return w, h
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help=f"Comma-separated subset of: {', '.join(TARGETS)}")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--weights", choices=WEIGHT_MODES, default="auto")
+    parser.add_argument("--size", type=_parse_size, default=(512, 384),
+                        help="Synthetic input size WxH (resized by the pipeline)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Also measure throughput with this many threads")
+    parser.add_argument("--out", help="JSON report path "
+                        "(default artifacts/bench/bench_<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                        help="Compare two saved reports")
+    parser.add_argument("--probe", choices=list(TARGETS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.probe:
+        probe(args.probe, args.runs, args.warmup, args.weights, args.size,
+              args.concurrency)
+    else:
+        targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+        unknown = set(targets) - set(TARGETS)
+        if unknown:
+            parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+        run(targets, args.runs, args.warmup, args.weights, args.size,
+            args.concurrency, args.out)
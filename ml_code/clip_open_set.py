@@ -1,9 +1,15 @@
 import torch
-import clip
 from PIL import Image
 
+from ml_code.clip_registry import get_openai_clip
+from ml_code.clip_text_cache import get_text_features
+
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
+
+
+def _clip():
+    # Shared with clip_zero_shot.py, loaded on first use
+    return get_openai_clip("ViT-B/32", device=device)
 
 TEXT_PROMPTS = [
     "a photo of human skin",
@@ -14,18 +20,24 @@ TEXT_PROMPTS = [
     "an object or scenery photo",
 ]
 
-text_tokens = clip.tokenize(TEXT_PROMPTS).to(device)
+
+def _text_features():
+    # Normalised once, persisted under artifacts/clip_text/
+    model, _, tokenize = _clip()
+    return get_text_features(
+        model, tokenize, TEXT_PROMPTS, "ViT-B/32", "openai", device=device
+    )
 
 
 @torch.no_grad()
 def clip_open_set_score(image: Image.Image):
+    model, preprocess, _ = _clip()
     image_input = preprocess(image).unsqueeze(0).to(device)
 
     image_features = model.encode_image(image_input)
-    text_features = model.encode_text(text_tokens)
+    text_features = _text_features().to(image_features.dtype)
 
     image_features /= image_features.norm(dim=-1, keepdim=True)
-    text_features /= text_features.norm(dim=-1, keepdim=True)
 
     similarity = (image_features @ text_features.T).squeeze(0)
     probs = similarity.softmax(dim=0).cpu().numpy()
@@ -0,0 +1,182 @@
+# ml_code/clip_registry.py
+"""
+One shared CLIP instance per (library, architecture, weights).
+
+    from ml_code.clip_registry import get_open_clip, get_openai_clip
+
+Models are built lazily on first request, behind a per-key lock, and
+every later caller in the process gets the same object. Callers must
+treat the returned model as read-only (eval mode, no in-place edits).
+
+    python -m ml_code.clip_registry --report    # resident memory saved
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+
+import torch
+
+ClipBundle = namedtuple("ClipBundle", ["model", "preprocess", "tokenize"])
+
+_instances = {}
+_locks = {}
+_lock = threading.Lock()
+
+
+# ======================================================
+# Raw loaders (no sharing)
+# ======================================================
+def _load(key):
+    library, arch, weights, variant, device = key
+
+    if library == "open_clip":
+        import open_clip
+        from ml_code.open_set.precision import apply_precision
+
+        model, _, preprocess = open_clip.create_model_and_transforms(
+            arch, pretrained=weights, device=device
+        )
+        model.eval()
+        model = apply_precision(model, variant)
+        return ClipBundle(model, preprocess, open_clip.get_tokenizer(arch))
+
+    if library == "openai":
+        import clip
+
+        model, preprocess = clip.load(arch, device=device)
+        model.eval()
+        return ClipBundle(model, preprocess, clip.tokenize)
+
+    raise ValueError(f"Unknown CLIP library '{library}'")
+
+
+def _get(key):
+    bundle = _instances.get(key)
+    if bundle is not None:
+        return bundle
+
+    with _lock:
+        key_lock = _locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        bundle = _instances.get(key)
+        if bundle is None:
+            print("Loading CLIP:", "/".join(key[:3]), f"({key[3]}, {key[4]})")
+            bundle = _load(key)
+            _instances[key] = bundle
+        return bundle
+
+
+# ======================================================
+# Public API
+# ======================================================
+def get_open_clip(arch, pretrained, precision="fp32", device="cpu"):
+    """
+    open_clip model. precision="int8" is a separate (quantized) instance;
+    bf16 is an autocast mode and shares the fp32 weights.
+    """
+    variant = "int8" if precision == "int8" else "fp32"
+    return _get(("open_clip", arch, pretrained, variant, device))
+
+
+def get_openai_clip(arch, device="cpu"):
+    return _get(("openai", arch, "openai", "fp32", device))
+
+
+def register_instance(library, arch, weights, bundle, variant="fp32", device="cpu"):
+    """
+    Installs a prebuilt bundle (e.g. random-init weights for
+    python -m ml_code.bench) under the key normal callers ask for.
+    """
+    key = (library, arch, weights, variant, device)
+    with _lock:
+        if key in _instances:
+            raise RuntimeError(f"CLIP {'/'.join(key[:3])} is already loaded")
+        _instances[key] = ClipBundle(*bundle)
+
+
+def loaded():
+    return list(_instances)
+
+
+# ======================================================
+# Memory report
+# ======================================================
+# Which modules use which weights (before: one private copy each)
+CONSUMERS = {
+    "ml_code.open_set.clip_predict": ("open_clip", "ViT-B-32", "laion2b_s34b_b79k"),
+    "clip_open_set_predict":         ("open_clip", "ViT-B-32", "laion2b_s34b_b79k"),
+    "ml_code.clip_zero_shot":        ("openai", "ViT-B/32", "openai"),
+    "ml_code.clip_open_set":         ("openai", "ViT-B/32", "openai"),
+}
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _param_mb(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors) / 2**20
+
+
+def probe(shared):
+    """
+    Loads one CLIP per consumer module, either through the registry
+    (shared) or independently (the old per-module globals).
+    """
+    torch.set_num_threads(1)
+    before = _rss_mb()
+
+    bundles = []
+    for library, arch, weights in CONSUMERS.values():
+        key = (library, arch, weights, "fp32", "cpu")
+        bundles.append(_get(key) if shared else _load(key))
+
+    unique = {id(b.model): b.model for b in bundles}
+    print(json.dumps({
+        "shared": shared,
+        "instances": len(unique),
+        "weights_mb": round(sum(_param_mb(m) for m in unique.values()), 1),
+        "rss_delta_mb": round(_rss_mb() - before, 1),
+    }))
+
+
+def report():
+    rows = []
+    for mode in ("unshared", "shared"):
+        out = subprocess.run(
+            [sys.executable, "-m", "ml_code.clip_registry", "--probe", mode],
+            env=dict(os.environ), capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        rows.append(json.loads(out))
+
+    print(f"{'mode':>9} {'instances':>10} {'weights MB':>11} {'RSS +MB':>9}")
+    for r in rows:
+        mode = "shared" if r["shared"] else "unshared"
+        print(f"{mode:>9} {r['instances']:>10} {r['weights_mb']:>11} "
+              f"{r['rss_delta_mb']:>9}")
+    print(f"Resident memory saved: "
+          f"{rows[0]['rss_delta_mb'] - rows[1]['rss_delta_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--report", action="store_true")
+    parser.add_argument("--probe", choices=["shared", "unshared"],
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe == "shared")
+    else:
+        report()
@@ -0,0 +1,80 @@
+# ml_code/clip_text_cache.py
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+import torch
+
+from ml_code.config import CLIP_TEXT_CACHE_DIR
+
+# ======================================================
+# In-process cache: (model, pretrained, prompt hash, device) -> tensor
+# ======================================================
+_features = {}
+_lock = threading.Lock()
+
+
+def prompt_hash(prompts):
+    h = hashlib.sha1("\n".join(prompts).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _cache_path(model_name, pretrained, phash):
+    safe = lambda s: "".join(c if c.isalnum() else "-" for c in s)
+    return CLIP_TEXT_CACHE_DIR / f"{safe(model_name)}__{safe(pretrained)}__{phash}.npy"
+
+
+def _encode(model, tokenize, prompts, device):
+    tokens = tokenize(prompts).to(device)
+    with torch.no_grad():
+        feats = model.encode_text(tokens).float()
+        feats /= feats.norm(dim=-1, keepdim=True)
+    return feats.cpu().numpy()
+
+
+# ======================================================
+# Public API
+# ======================================================
+def get_text_features(model, tokenize, prompts, model_name, pretrained,
+                      device="cpu"):
+    """
+    L2-normalised text features for `prompts`, shape (len(prompts), D).
+
+    Text features only depend on the model weights and the prompt list,
+    so they are computed once, persisted as .npy under artifacts/ and
+    reused by every later request and process.
+    """
+    phash = prompt_hash(prompts)
+    key = (model_name, pretrained, phash, str(device))
+
+    feats = _features.get(key)
+    if feats is not None:
+        return feats
+
+    with _lock:
+        feats = _features.get(key)
+        if feats is not None:
+            return feats
+
+        path = _cache_path(model_name, pretrained, phash)
+
+        arr = None
+        if path.exists():
+            arr = np.load(path)
+            if arr.shape[0] != len(prompts):
+                arr = None
+
+        if arr is None:
+            arr = _encode(model, tokenize, prompts, device)
+            CLIP_TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, path)
+            print("Cached CLIP text features:", path)
+
+        feats = torch.from_numpy(arr).to(device)
+        _features[key] = feats
+        return feats
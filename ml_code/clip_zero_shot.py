@@ -1,13 +1,21 @@
+import itertools
+
+import numpy as np
 import torch
-import clip
 from PIL import Image
 
+from ml_code.clip_registry import get_openai_clip
+from ml_code.clip_text_cache import get_text_features
+from ml_code.preprocessing import decode_batch, buffer, clip_normalize
+from ml_code.config import IMG_SIZE
+
 # ---------------- Device ----------------
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
 # ---------------- Load CLIP ----------------
-model, preprocess = clip.load("ViT-B/32", device=device)
-model.eval()
+# Shared with clip_open_set.py, loaded on first use
+def _clip():
+    return get_openai_clip("ViT-B/32", device=device)
 
 # ---------------- Disease Space ----------------
 # EXACT disease names (mentor requirement)
@@ -35,37 +43,94 @@ text_prompts = [
     "a close-up skin lesion photo showing melanoma",
 ]
 
-text_tokens = clip.tokenize(text_prompts).to(device)
+
+def _text_features():
+    # Normalised once, persisted under artifacts/clip_text/
+    model, _, tokenize = _clip()
+    return get_text_features(
+        model, tokenize, text_prompts, "ViT-B/32", "openai", device=device
+    )
+
+
+# ---------------- Batched scoring ----------------
+ZERO_SHOT_CHUNK = 64
 
 
 @torch.no_grad()
-def clip_zero_shot_predict(image: Image.Image):
+def zero_shot_batch(images, chunk_size=ZERO_SHOT_CHUNK):
     """
-    Always returns the MOST visually similar disease.
+    images: list or any iterable (e.g. a generator of paths) of image
+    sources; consumed chunk_size at a time.
+
+    Returns (order, probs):
+        order (N, K) int   disease indices, most similar first
+        probs (N, K) float32, in ZERO_SHOT_DISEASES order
     """
+    model, _, _ = _clip()
+    text_features = _text_features()
 
-    image_input = preprocess(image).unsqueeze(0).to(device)
+    it = iter(images)
+    probs = []
+    while True:
+        chunk = list(itertools.islice(it, chunk_size))
+        if not chunk:
+            break
 
-    image_features = model.encode_image(image_input)
-    text_features = model.encode_text(text_tokens)
+        shape = (len(chunk), IMG_SIZE[1], IMG_SIZE[0], 3)
+        u8 = decode_batch(chunk, out=buffer("zs_decoded", shape, np.uint8),
+                          mode="clip")
+        x = clip_normalize(u8, out=buffer("zs_input", shape))
+        image_features = model.encode_image(torch.from_numpy(x).to(device))
 
-    image_features /= image_features.norm(dim=-1, keepdim=True)
-    text_features /= text_features.norm(dim=-1, keepdim=True)
+        image_features /= image_features.norm(dim=-1, keepdim=True)
+        similarity = image_features @ text_features.to(image_features.dtype).T
+        probs.append(similarity.float().softmax(dim=-1).cpu().numpy())
 
-    similarity = (image_features @ text_features.T).squeeze(0)
-    probs = similarity.softmax(dim=0).cpu().numpy()
+    if not probs:
+        k = len(ZERO_SHOT_DISEASES)
+        return np.empty((0, k), dtype=np.intp), np.empty((0, k), dtype=np.float32)
 
-    results = {
-        ZERO_SHOT_DISEASES[i]: float(probs[i])
-        for i in range(len(ZERO_SHOT_DISEASES))
-    }
+    probs = np.concatenate(probs)
+    return np.argsort(-probs, axis=1), probs
 
-    # Sort by confidence
-    sorted_results = dict(
-        sorted(results.items(), key=lambda x: x[1], reverse=True)
-    )
 
-    best_label = next(iter(sorted_results))
-    best_conf = sorted_results[best_label]
+def format_zero_shot(order, probs):
+    """
+    One row of zero_shot_batch() -> (best_label, best_conf, sorted dict).
+    """
+    sorted_results = {ZERO_SHOT_DISEASES[i]: float(probs[i]) for i in order}
+    best = ZERO_SHOT_DISEASES[order[0]]
+    return best, sorted_results[best], sorted_results
+
+
+def clip_zero_shot_predict(image: Image.Image):
+    """
+    Always returns the MOST visually similar disease.
+    """
+    order, probs = zero_shot_batch([image])
+    return format_zero_shot(order[0], probs[0])
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images_dir")
+    parser.add_argument("--out", default="zero_shot.npz")
+    parser.add_argument("--chunk-size", type=int, default=ZERO_SHOT_CHUNK)
+    args = parser.parse_args()
+
+    exts = (".jpg", ".jpeg", ".png")
+    paths = sorted(str(p) for p in Path(args.images_dir).rglob("*")
+                   if p.suffix.lower() in exts)
+
+    t0 = time.perf_counter()
+    order, probs = zero_shot_batch(paths, args.chunk_size)
+    secs = time.perf_counter() - t0
 
-    return best_label, best_conf, sorted_results
+    np.savez_compressed(args.out, paths=np.array(paths), order=order,
+                        probs=probs, diseases=np.array(ZERO_SHOT_DISEASES))
+    print(f"{len(paths)} images in {secs:.1f}s "
+          f"({len(paths) / max(secs, 1e-9):.1f} img/s) -> {args.out}")
@@ -0,0 +1,180 @@
+# ml_code/cnn_backends.py
+
+import threading
+
+import numpy as np
+
+from ml_code.config import CNN_MODEL, CNN_ONNX, CNN_TFLITE_INT8, CNN_BACKEND
+
+# Width of the MobileNetV2 GlobalAveragePooling2D output
+EMBEDDING_DIM = 1280
+
+
+def with_embedding(model):
+    """
+    Two-output view of the fine-tuned CNN: (softmax, pooled 1280-D
+    backbone features). Shares the model's layers and weights, so one
+    forward pass yields both.
+    """
+    from tensorflow.keras.layers import GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+
+    pooled = [l for l in model.layers if isinstance(l, GlobalAveragePooling2D)]
+    if not pooled:
+        raise ValueError("CNN has no GlobalAveragePooling2D layer")
+    return Model(inputs=model.inputs, outputs=[model.output, pooled[-1].output])
+
+
+def _no_embedding(path, script):
+    return RuntimeError(
+        f"{path} has no embedding output, re-run: python -m {script}"
+    )
+
+
+# ======================================================
+# Uniform CNN runtimes:
+#   predict(x)                -> probs
+#   predict_with_embedding(x) -> (probs, embeddings)
+# ======================================================
+class KerasCNN:
+    name = "keras"
+
+    def __init__(self, path=CNN_MODEL, model=None):
+        from tensorflow.keras.models import load_model
+
+        self.path = path
+        # model=: an already built Keras model (random-init benchmarks)
+        self.model = load_model(path, compile=False) if model is None else model
+        self.multi = with_embedding(self.model)
+
+    def predict(self, x, **kwargs):
+        # Direct call instead of Model.predict(): thread-safe and no
+        # per-call tf.data setup
+        return self.model(np.asarray(x, dtype="float32"), training=False).numpy()
+
+    def predict_with_embedding(self, x):
+        probs, emb = self.multi(np.asarray(x, dtype="float32"), training=False)
+        return probs.numpy(), emb.numpy()
+
+
+class OnnxCNN:
+    name = "onnx"
+
+    def __init__(self, path=CNN_ONNX, intra_op_threads=0):
+        import onnxruntime as ort
+
+        if not path.exists():
+            raise FileNotFoundError(
+                f"{path} not found, run: python -m ml_code.export_onnx"
+            )
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = intra_op_threads
+        opts.inter_op_num_threads = 1
+
+        self.path = path
+        self.session = ort.InferenceSession(
+            str(path), sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        # Exports from export_onnx.py carry (probs, embedding); older
+        # single-output files still serve predict()
+        self.output_names = [o.name for o in self.session.get_outputs()]
+
+    def predict(self, x, **kwargs):
+        x = np.ascontiguousarray(x, dtype="float32")
+        return self.session.run(self.output_names[:1], {self.input_name: x})[0]
+
+    def predict_with_embedding(self, x):
+        if len(self.output_names) < 2:
+            raise _no_embedding(self.path, "ml_code.export_onnx")
+        x = np.ascontiguousarray(x, dtype="float32")
+        probs, emb = self.session.run(self.output_names[:2], {self.input_name: x})
+        return probs, emb
+
+
+class TFLiteCNN:
+    """
+    INT8 TFLite model with float32 input/output (quantize/dequantize
+    ops are inside the graph). Inputs use the same scaling the model
+    was calibrated with.
+    """
+    name = "tflite"
+
+    def __init__(self, path=CNN_TFLITE_INT8, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        if not path.exists():
+            raise FileNotFoundError(
+                f"{path} not found, run: python -m ml_code.quantize_tflite"
+            )
+
+        self.path = path
+        self.interpreter = Interpreter(model_path=str(path), num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+
+        # The converter doesn't keep output order; tell them apart by width
+        self.output_index = self.embedding_index = None
+        for d in self.interpreter.get_output_details():
+            if d["shape"][-1] == EMBEDDING_DIM:
+                self.embedding_index = d["index"]
+            else:
+                self.output_index = d["index"]
+        self._batch = 1
+        # An Interpreter is not thread-safe
+        self._lock = threading.Lock()
+
+    def _invoke(self, x, indices):
+        x = np.ascontiguousarray(x, dtype="float32")
+
+        with self._lock:
+            if x.shape[0] != self._batch:
+                self.interpreter.resize_tensor_input(self.input_index, list(x.shape))
+                self.interpreter.allocate_tensors()
+                self._batch = x.shape[0]
+
+            self.interpreter.set_tensor(self.input_index, x)
+            self.interpreter.invoke()
+            return [self.interpreter.get_tensor(i).copy() for i in indices]
+
+    def predict(self, x, **kwargs):
+        return self._invoke(x, [self.output_index])[0]
+
+    def predict_with_embedding(self, x):
+        if self.embedding_index is None:
+            raise _no_embedding(self.path, "ml_code.quantize_tflite")
+        probs, emb = self._invoke(x, [self.output_index, self.embedding_index])
+        return probs, emb
+
+
+BACKENDS = {
+    "keras": KerasCNN,
+    "onnx": OnnxCNN,
+    "tflite": TFLiteCNN,
+}
+
+
+def cnn_model_path(backend=CNN_BACKEND):
+    paths = {"keras": CNN_MODEL, "onnx": CNN_ONNX, "tflite": CNN_TFLITE_INT8}
+    return paths.get(backend, CNN_MODEL)
+
+
+def load_cnn(backend=CNN_BACKEND):
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown CNN_BACKEND '{backend}', expected one of {sorted(BACKENDS)}"
+        )
+
+    from ml_code.runtime import configure_threads
+    budget = configure_threads()
+
+    if backend == "onnx":
+        return OnnxCNN(intra_op_threads=budget["tf_intra"])
+    if backend == "tflite":
+        return TFLiteCNN(num_threads=budget["tf_intra"])
+    return BACKENDS[backend]()
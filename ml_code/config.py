@@ -29,6 +29,9 @@ VAL_DIR   = DATA_DIR / "val"
 ARTIFACTS_DIR  = ROOT / "artifacts"
 MODELS_DIR     = ARTIFACTS_DIR / "models"
 EMBEDDINGS_DIR = ARTIFACTS_DIR / "embeddings"
+CLIP_TEXT_CACHE_DIR = Path(
+    os.getenv("CLIP_TEXT_CACHE_DIR", str(ARTIFACTS_DIR / "clip_text"))
+)
 
 # =========================
 # Models
@@ -36,6 +39,24 @@ EMBEDDINGS_DIR = ARTIFACTS_DIR / "embeddings"
 CNN_MODEL = MODELS_DIR / "cnn_balanced_finetuned.h5"
 CLIP_PTH  = MODELS_DIR / "skinclip_finetuned.pth"
 
+# ONNX export of CNN_MODEL (python -m ml_code.export_onnx)
+CNN_ONNX  = MODELS_DIR / "cnn_balanced_finetuned.onnx"
+
+# INT8 TFLite build of CNN_MODEL (python -m ml_code.quantize_tflite)
+CNN_TFLITE_INT8 = MODELS_DIR / "cnn_balanced_finetuned_int8.tflite"
+
+# CNN inference runtime: "keras" (TensorFlow), "onnx" (ONNX Runtime CPU)
+# or "tflite" (INT8 TFLite)
+CNN_BACKEND = os.getenv("CNN_BACKEND", "keras")
+
+# ViT (vit/vit_train.py) and its TorchScript export (python -m ml_code.vit.export_vit)
+VIT_MODEL = MODELS_DIR / "vit_model.pth"
+VIT_TORCHSCRIPT = MODELS_DIR / "vit_model.ts"
+
+# Written by ensemble/train_ensemble.py
+RF_MODEL  = MODELS_DIR / "rf_ensemble.joblib"
+XGB_MODEL = MODELS_DIR / "xgb_ensemble.joblib"
+
 # Calibration
 TEMPERATURE_NPY = MODELS_DIR / "temperature.npy"
 
@@ -48,8 +69,19 @@ CLASSES_JOBLIB = MODELS_DIR / "classes.joblib"
 # =========================
 # Embeddings (for ensemble)
 # =========================
-TRAIN_EMB = EMBEDDINGS_DIR / "train_embeddings.pkl"
-VAL_EMB   = EMBEDDINGS_DIR / "val_embeddings.pkl"
+# Sharded, memory-mapped stores (ml_code.embedding_store); the old
+# *.pkl / *.joblib files convert with
+#   python -m ml_code.embedding_store convert --all
+TRAIN_EMB   = EMBEDDINGS_DIR / "train_embeddings"
+VAL_EMB     = EMBEDDINGS_DIR / "val_embeddings"
+TRAIN_PROBS = EMBEDDINGS_DIR / "train_probs"
+VAL_PROBS   = EMBEDDINGS_DIR / "val_probs"
+# ImageNet MobileNetV2 features ([-1, 1] input), not the fine-tuned CNN's
+TRAIN_EMB_IMAGENET = EMBEDDINGS_DIR / "train_embeddings_imagenet"
+VAL_EMB_IMAGENET   = EMBEDDINGS_DIR / "val_embeddings_imagenet"
+
+# On-disk dtype of embedding shards ("float16" halves size / page-in)
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float16")
 
 # =========================
 # Training / inference params
@@ -58,6 +90,36 @@ IMG_SIZE     = (224, 224)
 BATCH_SIZE  = 16
 RANDOM_SEED = 42
 
+# Offline embedding extraction (extract_embeddings.py): images per
+# forward and decode threads (0 = let tf.data autotune)
+EXTRACT_BATCH_SIZE = int(os.getenv("EXTRACT_BATCH_SIZE", "64"))
+EXTRACT_WORKERS    = int(os.getenv("EXTRACT_WORKERS", "0"))
+
+# =========================
+# Runtime / threading
+# =========================
+# Run the CNN and CLIP branches of ensemble.predict concurrently
+PARALLEL_BRANCHES = os.getenv("PARALLEL_BRANCHES", "1") == "1"
+
+# Default for test-time augmentation of low-confidence CNN predictions
+# (ml_code.tta); /predict?tta=... overrides per request
+CNN_TTA = os.getenv("CNN_TTA", "0") == "1"
+
+# open_clip image encoder precision: "fp32", "int8" (dynamic quantized
+# Linear layers) or "bf16" (CPU autocast, falls back to fp32 if unsupported)
+CLIP_PRECISION = os.getenv("CLIP_PRECISION", "fp32")
+
+# Per-framework thread budgets (0 = derive from core count)
+TF_INTRA_OP_THREADS = int(os.getenv("TF_INTRA_OP_THREADS", "0"))
+TF_INTER_OP_THREADS = int(os.getenv("TF_INTER_OP_THREADS", "0"))
+TORCH_NUM_THREADS   = int(os.getenv("TORCH_NUM_THREADS", "0"))
+
+# Written by python -m ml_code.tune_runtime; used when the values above
+# are 0 and the file was tuned on a matching machine/backend
+RUNTIME_TUNING_JSON = Path(
+    os.getenv("RUNTIME_TUNING_JSON", str(ARTIFACTS_DIR / "runtime_tuning.json"))
+)
+
 # =========================
 # (Optional) YOLO placeholders
 # =========================
@@ -67,12 +129,17 @@ YOLO_MODEL_PTH  = YOLO_DIR / "yolo_lesion.pt"
 # =========================
 # Sanity checks (fail fast)
 # =========================
-assert ROOT.exists(), f"ROOT not found: {ROOT}"
-assert TRAIN_DIR.exists(), f"TRAIN_DIR not found: {TRAIN_DIR}"
-assert VAL_DIR.exists(), f"VAL_DIR not found: {VAL_DIR}"
-assert MODELS_DIR.exists(), f"MODELS_DIR not found: {MODELS_DIR}"
-assert CNN_MODEL.exists(), f"CNN model not found: {CNN_MODEL}"
-assert TEMPERATURE_NPY.exists(), f"Temperature file not found: {TEMPERATURE_NPY}"
+# SKIP_ASSET_CHECKS=1 imports without the dataset / weights
+# (python -m ml_code.bench on a fresh clone)
+SKIP_ASSET_CHECKS = os.getenv("SKIP_ASSET_CHECKS", "0") == "1"
+
+if not SKIP_ASSET_CHECKS:
+    assert ROOT.exists(), f"ROOT not found: {ROOT}"
+    assert TRAIN_DIR.exists(), f"TRAIN_DIR not found: {TRAIN_DIR}"
+    assert VAL_DIR.exists(), f"VAL_DIR not found: {VAL_DIR}"
+    assert MODELS_DIR.exists(), f"MODELS_DIR not found: {MODELS_DIR}"
+    assert CNN_MODEL.exists(), f"CNN model not found: {CNN_MODEL}"
+    assert TEMPERATURE_NPY.exists(), f"Temperature file not found: {TEMPERATURE_NPY}"
 
 # =========================
 # Public exports
@@ -80,10 +147,17 @@ assert TEMPERATURE_NPY.exists(), f"Temperature file not found: {TEMPERATURE_NPY}
 __all__ = [
     "ROOT",
     "DATA_DIR", "TRAIN_DIR", "VAL_DIR",
-    "ARTIFACTS_DIR", "MODELS_DIR", "EMBEDDINGS_DIR",
-    "CNN_MODEL", "CLIP_PTH", "TEMPERATURE_NPY",
+    "ARTIFACTS_DIR", "MODELS_DIR", "EMBEDDINGS_DIR", "CLIP_TEXT_CACHE_DIR",
+    "CNN_MODEL", "CNN_ONNX", "CNN_TFLITE_INT8", "CNN_BACKEND",
+    "CLIP_PTH", "VIT_MODEL", "VIT_TORCHSCRIPT",
+    "RF_MODEL", "XGB_MODEL", "TEMPERATURE_NPY",
     "CLASSES_JSON", "CLASSES_JOBLIB",
-    "TRAIN_EMB", "VAL_EMB",
+    "TRAIN_EMB", "VAL_EMB", "TRAIN_PROBS", "VAL_PROBS", "EMBEDDING_DTYPE",
+    "TRAIN_EMB_IMAGENET", "VAL_EMB_IMAGENET",
     "IMG_SIZE", "BATCH_SIZE", "RANDOM_SEED",
+    "EXTRACT_BATCH_SIZE", "EXTRACT_WORKERS",
+    "PARALLEL_BRANCHES", "CNN_TTA", "CLIP_PRECISION",
+    "TF_INTRA_OP_THREADS", "TF_INTER_OP_THREADS", "TORCH_NUM_THREADS",
+    "RUNTIME_TUNING_JSON", "SKIP_ASSET_CHECKS",
     "YOLO_DIR", "YOLO_MODEL_PTH",
 ]
\ No newline at end of file
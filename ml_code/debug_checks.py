@@ -18,7 +18,7 @@ print("DATA_DIR:", DATA_DIR.resolve())
 # 1) Show classes saved by different files
 classes_json = MODELS_DIR / "classes.json"
 classes_job = MODELS_DIR / "classes.joblib"
-emb_train = EMB_DIR / "train_embeddings.pkl"
+emb_train = EMB_DIR / "train_embeddings"
 
 if classes_json.exists():
     print("\nclasses.json contents (index->label):")
@@ -28,10 +28,11 @@ if classes_job.exists():
     print("\nclasses.joblib contents (list):")
     print(joblib.load(classes_job))
 
-if emb_train.exists():
-    d = joblib.load(str(emb_train))
-    print("\ntrain_embeddings.pkl classes from embeddings:", d.get("classes")[:10])
-    print("train embeddings size:", d.get("feats").shape)
+if (emb_train / "index.json").exists():
+    from ml_code.embedding_store import EmbeddingStore
+    store = EmbeddingStore(emb_train)   # memory-mapped, nothing loaded
+    print("\ntrain_embeddings classes from embeddings:", store.classes[:10])
+    print("train embeddings size:", store.shape, store.dtype)
 
 # 2) Check class folder counts
 print("\nDataset class counts (train):")
@@ -41,12 +42,9 @@ for cls in sorted([d for d in (DATA_DIR/"train").iterdir() if d.is_dir()]):
 
 # 3) Quick test: run model prediction on a few *training* images and see whether they predict correctly.
 # Use predict.py logic but simplified for speed.
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import GlobalAveragePooling2D
-from tensorflow.keras.models import Model
 import tensorflow as tf
 import joblib
+from ml_code.ensemble.features import ensemble_proba
 
 def load_models():
     cnn = None
@@ -64,12 +62,7 @@ def load_models():
     return cnn, rf, xgb
 
 cnn, rf, xgb = load_models()
-# embedding model
-emb_model = None
-if rf is not None or xgb is not None:
-    base = MobileNetV2(weights="imagenet", include_top=False, input_shape=(IMG_SIZE[0],IMG_SIZE[1],3))
-    gap = GlobalAveragePooling2D()(base.output)
-    emb_model = Model(inputs=base.input, outputs=gap)
+# RF/XGB score the CNN's calibrated probabilities (their training input)
 
 # sample a few images from each class
 print("\nSample predictions on few train images:")
@@ -78,21 +71,16 @@ for cls_dir in sorted((DATA_DIR/"train").iterdir()):
     if not imgs: continue
     sample = random.choice(imgs)
     print("\nClass folder:", cls_dir.name, "sample:", sample.name)
-    # CNN
     if cnn is not None:
         img = load_img(str(sample), target_size=IMG_SIZE)
         arr = img_to_array(img)/255.0
-        pred = cnn.predict(np.expand_dims(arr,0))[0]
+        pred = cnn(np.expand_dims(arr,0), training=False).numpy()[0]
+        # CNN
         print("  CNN top:", np.argmax(pred), f"{max(pred):.3f}")
-    # RF/XGB
-    if emb_model is not None:
-        img = load_img(str(sample), target_size=IMG_SIZE)
-        arr = img_to_array(img)
-        arr = preprocess_input(arr)
-        feat = emb_model.predict(np.expand_dims(arr,0), verbose=0)
+        # RF/XGB
         if rf is not None:
-            p = rf.predict_proba(feat)[0]; print("  RF top:", np.argmax(p), f"{max(p):.3f}")
+            p = ensemble_proba(rf, pred[None])[0]; print("  RF top:", np.argmax(p), f"{max(p):.3f}")
         if xgb is not None:
-            p = xgb.predict_proba(feat)[0]; print("  XGB top:", np.argmax(p), f"{max(p):.3f}")
+            p = ensemble_proba(xgb, pred[None])[0]; print("  XGB top:", np.argmax(p), f"{max(p):.3f}")
 
 print("\nDone quick checks.")
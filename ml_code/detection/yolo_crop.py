@@ -1,37 +1,175 @@
-import cv2
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
 import numpy as np
-from ultralytics import YOLO
 
-YOLO_MODEL_PATH = "ml_code/detection/yolo_lesion.pt"
+from ml_code.config import YOLO_MODEL_PTH
 
-yolo = YOLO(YOLO_MODEL_PATH)
+YOLO_MODEL_PATH = str(YOLO_MODEL_PTH)
+YOLO_CONF = 0.25
 
-def crop_lesion(image_path):
-    img = cv2.imread(image_path)
+# Boxes remembered per image hash, so repeated crop_batch() calls on the
+# same image run YOLO once (0 disables). Only yolo_detect.py crops today;
+# the CNN / CLIP / ViT serving paths score the full image.
+YOLO_CROP_CACHE_SIZE = int(os.getenv("YOLO_CROP_CACHE_SIZE", "256"))
 
-    if img is None:
-        raise ValueError("Image could not be loaded")
+_models = {}
+_load_lock = threading.Lock()
+
+
+# --------------------------------------------------
+# Lazy model loading
+# --------------------------------------------------
+def load_yolo(path=YOLO_MODEL_PATH):
+    model = _models.get(path)
+    if model is None:
+        with _load_lock:
+            model = _models.get(path)
+            if model is None:
+                from ultralytics import YOLO
+                model = _models[path] = YOLO(path)
+    return model
+
+
+# --------------------------------------------------
+# Box cache (image hash -> box)
+# --------------------------------------------------
+class BoxCache:
+    def __init__(self, maxsize=YOLO_CROP_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._boxes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(img, model_path, conf):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{model_path}|{conf}|{img.shape}".encode())
+        h.update(np.ascontiguousarray(img).data)
+        return h.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            box = self._boxes.get(key)
+            if box is not None:
+                self._boxes.move_to_end(key)
+            return box
+
+    def put(self, key, box):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._boxes[key] = box
+            self._boxes.move_to_end(key)
+            while len(self._boxes) > self.maxsize:
+                self._boxes.popitem(last=False)
+
+
+box_cache = BoxCache()
 
-    results = yolo(img, conf=0.25, verbose=False)[0]
 
-    if results.boxes is None or len(results.boxes) == 0:
-        # Fallback: return original image
-        return img
+# --------------------------------------------------
+# Vectorised box selection
+# --------------------------------------------------
+def largest_boxes(boxes_per_image, shapes):
+    """
+    boxes_per_image: [(k_i, 4) xyxy float arrays], shapes: [(h, w, ...)]
+    Returns (N, 4) int boxes clipped to each image, -1 rows where an
+    image has no detection.
+    """
+    n = len(boxes_per_image)
+    out = np.full((n, 4), -1, dtype=np.int64)
 
-    # Take the largest box (safest for lesions)
-    boxes = results.boxes.xyxy.cpu().numpy()
+    counts = np.array([len(b) for b in boxes_per_image])
+    if counts.sum() == 0:
+        return out
+
+    boxes = np.concatenate([b for b in boxes_per_image if len(b)]).reshape(-1, 4)
+    owner = np.repeat(np.arange(n), counts)
     areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
-    box = boxes[areas.argmax()]
 
-    x1, y1, x2, y2 = map(int, box)
+    # Sort by (image, -area); the first row of each image is its largest
+    order = np.lexsort((-areas, owner))
+    first = np.unique(owner[order], return_index=True)
+    imgs, rows = first[0], order[first[1]]
+
+    hw = np.array([s[:2] for s in shapes])[imgs]
+    best = boxes[rows].astype(np.int64)
+    best[:, [0, 2]] = np.clip(best[:, [0, 2]], 0, hw[:, 1:2])
+    best[:, [1, 3]] = np.clip(best[:, [1, 3]], 0, hw[:, 0:1])
+    out[imgs] = best
+    return out
+
+
+# --------------------------------------------------
+# Batched detection + zero-copy crops
+# --------------------------------------------------
+def lesion_boxes(imgs, model_path=YOLO_MODEL_PATH, conf=YOLO_CONF, cache=True):
+    """
+    imgs: list of (H, W, 3) uint8 arrays in BGR (cv2) order.
+    Returns (N, 4) int xyxy boxes, -1 rows where nothing was found.
+    Only cache misses go through YOLO, as one batched call.
+    """
+    imgs = list(imgs)
+    out = np.full((len(imgs), 4), -1, dtype=np.int64)
+
+    keys = [None] * len(imgs)
+    todo = []
+    for i, img in enumerate(imgs):
+        if cache and box_cache.maxsize > 0:
+            keys[i] = box_cache.key(img, model_path, conf)
+            box = box_cache.get(keys[i])
+            if box is not None:
+                out[i] = box
+                continue
+        todo.append(i)
+
+    if todo:
+        results = load_yolo(model_path)(
+            [imgs[i] for i in todo], conf=conf, verbose=False
+        )
+        boxes = [
+            r.boxes.xyxy.cpu().numpy() if r.boxes is not None
+            else np.empty((0, 4), dtype=np.float32)
+            for r in results
+        ]
+        found = largest_boxes(boxes, [imgs[i].shape for i in todo])
+        for i, box in zip(todo, found):
+            out[i] = box
+            if keys[i] is not None:
+                box_cache.put(keys[i], box)
 
-    h, w, _ = img.shape
-    x1, y1 = max(0, x1), max(0, y1)
-    x2, y2 = min(w, x2), min(h, y2)
+    return out
 
-    crop = img[y1:y2, x1:x2]
 
-    if crop.size == 0:
-        return img
+def crop_batch(imgs, min_size=1, **kwargs):
+    """
+    Largest-lesion crop per image as a view into the caller's array
+    (no pixel copy), or None when nothing (big enough) was detected.
+    """
+    imgs = list(imgs)
+    crops = []
+    for img, (x1, y1, x2, y2) in zip(imgs, lesion_boxes(imgs, **kwargs)):
+        if x1 < 0 or y2 - y1 < min_size or x2 - x1 < min_size:
+            crops.append(None)
+        else:
+            crops.append(img[y1:y2, x1:x2])
+    return crops
+
+
+def crop_lesion(image):
+    """
+    image: path or BGR array. Falls back to the whole image.
+    """
+    if isinstance(image, (str, os.PathLike)):
+        import cv2
+        img = cv2.imread(str(image))
+    else:
+        img = image
+
+    if img is None:
+        raise ValueError("Image could not be loaded")
 
-    return crop
+    crop = crop_batch([img])[0]
+    return img if crop is None else crop
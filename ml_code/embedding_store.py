@@ -0,0 +1,389 @@
+# ml_code/embedding_store.py
+"""
+Sharded, memory-mapped store for embeddings / probabilities.
+
+    store = EmbeddingStore.create(TRAIN_EMB, classes, dtype="float16")
+    store.append(feats, labels, paths)          # one or more new shards
+
+    store = EmbeddingStore(TRAIN_EMB)           # nothing read yet
+    x = store[1000:2000]                        # only those rows paged in
+    X, y = store.load()                         # everything, as float32
+
+    python -m ml_code.embedding_store convert --all   # old pickles -> stores
+    python -m ml_code.embedding_store info artifacts/embeddings/train_embeddings
+
+Layout of a store directory:
+
+    index.json            classes, dtype, dim, shard list (+ paths per shard)
+    00000.npy             (rows, dim) features, opened with mmap_mode="r"
+    00000.labels.npy      (rows,) int32 labels
+    manifest.json         per-file size / mtime / hash (ml_code.incremental)
+
+Shards are written to a temporary name and renamed, and index.json is
+replaced last, so readers never see a half-written shard.
+"""
+import argparse
+import json
+import os
+import shutil
+import weakref
+from pathlib import Path
+
+import numpy as np
+
+from ml_code.config import (
+    EMBEDDINGS_DIR, EMBEDDING_DTYPE, CLASSES_JSON,
+    TRAIN_EMB, VAL_EMB, TRAIN_PROBS, VAL_PROBS,
+)
+
+INDEX = "index.json"
+FORMAT_VERSION = 1
+SHARD_ROWS = 8192
+
+_FP16_MAX = float(np.finfo(np.float16).max)
+
+# Every open store in this process, so an overwrite can unmap them first
+_open_stores = weakref.WeakSet()
+
+
+def _write_atomic(path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+# ======================================================
+# Store
+# ======================================================
+class EmbeddingStore:
+    """
+    Read side is lazy: shards are memory-mapped on first access and
+    rows are copied out only for the slice asked for.
+    """
+
+    def __init__(self, root, mmap_mode="r"):
+        self.root = Path(root)
+        self.mmap_mode = mmap_mode
+        index_path = self.root / INDEX
+        if not index_path.exists():
+            raise FileNotFoundError(
+                f"No embedding store at {self.root}. Convert old pickles with "
+                f"python -m ml_code.embedding_store convert --all"
+            )
+        with open(index_path) as f:
+            self.index = json.load(f)
+        if self.index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported store version in {index_path}")
+        self._shards = {}
+        self._labels = {}
+        _open_stores.add(self)
+
+    @classmethod
+    def create(cls, root, classes, dtype=EMBEDDING_DTYPE, overwrite=False, meta=None):
+        root = Path(root)
+        if (root / INDEX).exists():
+            if not overwrite:
+                raise FileExistsError(f"Embedding store already exists: {root}")
+            _close_all(root)
+            shutil.rmtree(root)
+        root.mkdir(parents=True, exist_ok=True)
+
+        index = {
+            "version": FORMAT_VERSION,
+            "dtype": np.dtype(dtype).name,
+            "dim": None,
+            "classes": list(classes),
+            "meta": dict(meta or {}),
+            "shards": [],
+        }
+        _write_atomic(root / INDEX, lambda p: p.write_text(json.dumps(index)))
+        return cls(root)
+
+    # ---------------- metadata ----------------
+    @property
+    def classes(self):
+        return self.index["classes"]
+
+    @property
+    def dtype(self):
+        return np.dtype(self.index["dtype"])
+
+    @property
+    def dim(self):
+        return self.index["dim"]
+
+    @property
+    def meta(self):
+        return self.index.get("meta", {})
+
+    @property
+    def shape(self):
+        return (len(self), self.dim or 0)
+
+    def __len__(self):
+        return sum(s["rows"] for s in self.index["shards"])
+
+    @property
+    def paths(self):
+        """
+        All row paths, or None when the store was built without them.
+        """
+        shards = self.index["shards"]
+        if any(s.get("paths") is None for s in shards):
+            return None
+        return [p for s in shards for p in s["paths"]]
+
+    @property
+    def labels(self):
+        n = len(self.index["shards"])
+        if n == 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.concatenate([self._shard_labels(i) for i in range(n)])
+
+    # ---------------- reading ----------------
+    def _shard(self, i):
+        arr = self._shards.get(i)
+        if arr is None:
+            name = self.index["shards"][i]["file"]
+            arr = self._shards[i] = np.load(self.root / name, mmap_mode=self.mmap_mode)
+        return arr
+
+    def _shard_labels(self, i):
+        arr = self._labels.get(i)
+        if arr is None:
+            name = self.index["shards"][i]["labels"]
+            arr = self._labels[i] = np.load(self.root / name, mmap_mode=self.mmap_mode)
+        return arr
+
+    def close(self):
+        """
+        Drops this object's memory maps (they reopen lazily on the next
+        read). Windows will not rename or delete a mapped file, so close
+        a store before replacing its directory.
+        """
+        self._shards.clear()
+        self._labels.clear()
+
+    def _offsets(self):
+        rows = [s["rows"] for s in self.index["shards"]]
+        return np.concatenate([[0], np.cumsum(rows)]).astype(np.int64)
+
+    def take(self, rows, with_labels=False):
+        """
+        Rows by (global) index, in the order given, in the stored dtype.
+        """
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        n = len(self)
+        if rows.size and (rows.min() < -n or rows.max() >= n):
+            raise IndexError(f"row index out of range for store of {n} rows")
+        rows = np.where(rows < 0, rows + n, rows)
+
+        offsets = self._offsets()
+        owner = np.searchsorted(offsets, rows, side="right") - 1
+        out = np.empty((rows.size, self.dim or 0), dtype=self.dtype)
+        labels = np.empty(rows.size, dtype=np.int32)
+
+        for i in np.unique(owner):
+            mask = owner == i
+            local = rows[mask] - offsets[i]
+            out[mask] = self._shard(i)[local]
+            if with_labels:
+                labels[mask] = self._shard_labels(i)[local]
+        return (out, labels) if with_labels else out
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.take([key])[0]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self._contiguous(start, stop)
+            return self.take(np.arange(start, stop, step))
+        return self.take(key)
+
+    def _contiguous(self, start, stop):
+        # Plain slices of each overlapping shard: no index arrays
+        parts = []
+        offsets = self._offsets()
+        for i in range(len(self.index["shards"])):
+            lo, hi = max(start, offsets[i]), min(stop, offsets[i + 1])
+            if lo < hi:
+                parts.append(self._shard(i)[lo - offsets[i]:hi - offsets[i]])
+        if not parts:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return np.concatenate(parts)
+
+    def iter_batches(self, batch_rows=SHARD_ROWS, dtype=None):
+        """
+        Yields (feats, labels) chunks in row order, one shard slice at a
+        time; peak memory is one chunk.
+        """
+        for i in range(len(self.index["shards"])):
+            feats, labels = self._shard(i), self._shard_labels(i)
+            for lo in range(0, len(feats), batch_rows):
+                x = np.asarray(feats[lo:lo + batch_rows])
+                yield (x if dtype is None else x.astype(dtype)), \
+                    np.asarray(labels[lo:lo + batch_rows])
+
+    def load(self, dtype=np.float32):
+        """
+        (X, y) fully in memory, e.g. for sklearn / xgboost fitting.
+        """
+        X = self[:].astype(dtype, copy=False)
+        return X, self.labels.astype(np.int64)
+
+    # ---------------- writing ----------------
+    def append(self, feats, labels, paths=None, shard_rows=SHARD_ROWS):
+        """
+        Adds rows as new shard(s); existing shards are never rewritten.
+        """
+        feats = np.asarray(feats)
+        labels = np.asarray(labels, dtype=np.int32).reshape(-1)
+        if feats.ndim != 2 or len(feats) != len(labels):
+            raise ValueError(
+                f"Expected (N, D) features and N labels, got {feats.shape} "
+                f"and {labels.shape}"
+            )
+        if paths is not None and len(paths) != len(feats):
+            raise ValueError(f"{len(paths)} paths for {len(feats)} rows")
+        if self.dim is not None and feats.shape[1] != self.dim:
+            raise ValueError(f"Store dim is {self.dim}, got {feats.shape[1]}")
+        if len(self):
+            # All rows have paths or none do; self.paths is None otherwise
+            has_paths = self.paths is not None
+            if paths is None and has_paths:
+                raise ValueError("Store has paths for every row; pass paths=")
+            if paths is not None and not has_paths:
+                raise ValueError("Store was built without paths; append without paths=")
+        if len(feats) == 0:
+            return
+
+        if self.dtype == np.float16 and np.abs(feats).max() > _FP16_MAX:
+            raise ValueError("Values exceed the float16 range; use dtype=float32")
+        feats = feats.astype(self.dtype, copy=False)
+
+        index = dict(self.index, shards=list(self.index["shards"]))
+        index["dim"] = int(feats.shape[1])
+        next_id = max((int(s["file"][:5]) for s in index["shards"]), default=-1) + 1
+
+        for lo in range(0, len(feats), shard_rows):
+            hi = min(lo + shard_rows, len(feats))
+            name = f"{next_id:05d}"
+            next_id += 1
+            _write_atomic(self.root / f"{name}.npy",
+                          lambda p: _save_npy(p, feats[lo:hi]))
+            _write_atomic(self.root / f"{name}.labels.npy",
+                          lambda p: _save_npy(p, labels[lo:hi]))
+            index["shards"].append({
+                "file": f"{name}.npy",
+                "labels": f"{name}.labels.npy",
+                "rows": hi - lo,
+                "paths": None if paths is None else [str(p) for p in paths[lo:hi]],
+            })
+
+        _write_atomic(self.root / INDEX, lambda p: p.write_text(json.dumps(index)))
+        self.index = index
+
+
+def _close_all(root):
+    # Windows cannot delete a mapped file; unmap every open view first
+    root = Path(root).resolve()
+    for store in list(_open_stores):
+        if store.root.resolve() == root:
+            store.close()
+
+
+def _save_npy(path, arr):
+    # np.save on a path appends ".npy"; write through a file handle
+    with open(path, "wb") as f:
+        np.save(f, np.ascontiguousarray(arr))
+
+
+def open_store(root, mmap_mode="r"):
+    return EmbeddingStore(root, mmap_mode=mmap_mode)
+
+
+# ======================================================
+# Conversion from the old pickles
+# ======================================================
+# old file -> (store, default dtype); probabilities stay float32
+LEGACY = {
+    EMBEDDINGS_DIR / "train_embeddings.pkl": (TRAIN_EMB, EMBEDDING_DTYPE),
+    EMBEDDINGS_DIR / "val_embeddings.pkl":   (VAL_EMB, EMBEDDING_DTYPE),
+    EMBEDDINGS_DIR / "train_probs.joblib":   (TRAIN_PROBS, "float32"),
+    EMBEDDINGS_DIR / "val_probs.joblib":     (VAL_PROBS, "float32"),
+}
+
+
+def convert(src, dst, dtype=EMBEDDING_DTYPE, overwrite=False):
+    """
+    Accepts both pickle layouts written so far:
+      {"paths", "labels", "feats", "classes"}   (extract_embeddings.py)
+      (X, y)                                    (extract_probs.py, older copies)
+    """
+    import joblib
+
+    data = joblib.load(src)
+    if isinstance(data, dict):
+        feats, labels = data["feats"], data["labels"]
+        paths, classes = data.get("paths"), list(data.get("classes", []))
+    else:
+        feats, labels = data
+        paths, classes = None, []
+        # Class names are not in the tuple pickles; take them from training
+        if CLASSES_JSON.exists():
+            with open(CLASSES_JSON) as f:
+                mapping = json.load(f)
+            classes = sorted(mapping, key=mapping.get)
+
+    store = EmbeddingStore.create(dst, classes, dtype=dtype, overwrite=overwrite,
+                                  meta={"converted_from": Path(src).name})
+    store.append(np.asarray(feats), np.asarray(labels), paths)
+    print(f"{src} -> {dst}: {store.shape} {store.dtype}")
+    return store
+
+
+def info(root):
+    store = EmbeddingStore(root)
+    size = sum(f.stat().st_size for f in store.root.iterdir() if f.is_file())
+    print(f"{store.root}")
+    print(f"  rows x dim : {store.shape}  ({store.dtype})")
+    print(f"  shards     : {len(store.index['shards'])}")
+    print(f"  classes    : {store.classes}")
+    print(f"  paths      : {'yes' if store.paths is not None else 'no'}")
+    print(f"  on disk    : {size / 2**20:.1f} MB")
+    if store.meta:
+        print(f"  meta       : {store.meta}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("convert", help="joblib pickle -> store")
+    p.add_argument("src", nargs="?")
+    p.add_argument("dst", nargs="?")
+    p.add_argument("--all", action="store_true",
+                   help="Convert every known pickle in EMBEDDINGS_DIR")
+    p.add_argument("--dtype", default=None,
+                   help=f"float16 / float32 (default {EMBEDDING_DTYPE} for "
+                        f"embeddings, float32 for probabilities)")
+    p.add_argument("--overwrite", action="store_true")
+
+    p = sub.add_parser("info", help="Summarise a store")
+    p.add_argument("root")
+
+    args = parser.parse_args()
+
+    if args.cmd == "info":
+        info(args.root)
+    elif args.all:
+        found = [(src, dst, dtype) for src, (dst, dtype) in LEGACY.items() if src.exists()]
+        if not found:
+            raise SystemExit(f"No legacy pickles in {EMBEDDINGS_DIR}")
+        for src, dst, dtype in found:
+            convert(src, dst, args.dtype or dtype, args.overwrite)
+    elif args.src and args.dst:
+        convert(args.src, args.dst, args.dtype or EMBEDDING_DTYPE, args.overwrite)
+    else:
+        parser.error("convert needs SRC DST or --all")
@@ -1,39 +1,61 @@
+import argparse
+
 import numpy as np
-import joblib
 from pathlib import Path
 import tensorflow as tf
 from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 
 from ml_code.config import (
-    TRAIN_DIR, VAL_DIR, IMG_SIZE, BATCH_SIZE,
-    CNN_MODEL, TEMPERATURE_NPY, EMBEDDINGS_DIR
+    TRAIN_DIR, VAL_DIR,
+    CNN_MODEL, TEMPERATURE_NPY, EMBEDDINGS_DIR, TRAIN_PROBS, VAL_PROBS,
+    EXTRACT_BATCH_SIZE, EXTRACT_WORKERS,
 )
+from ml_code.extract_embeddings import get_paths_and_labels, run_batches
+from ml_code.incremental import update_store, file_version
+from ml_code.ensemble.features import calibrate
 
 EMBEDDINGS_DIR.mkdir(parents=True, exist_ok=True)
 
-# Load model and temperature
-model = load_model(CNN_MODEL, compile=False)
+# Temperature now, model on first use (an incremental run with nothing
+# new never loads it)
 T = float(np.load(TEMPERATURE_NPY))
+model = None
+
+def calibrated_probs(paths, batch_size=EXTRACT_BATCH_SIZE, workers=EXTRACT_WORKERS,
+                     desc="probs"):
+    global model
+    if model is None:
+        model = load_model(CNN_MODEL, compile=False)
+
+    @tf.function(reduce_retracing=True)
+    def forward(imgs):
+        return model(tf.cast(imgs, tf.float32) / 255.0, training=False)
 
-def softmax(x):
-    e = np.exp(x - np.max(x, axis=1, keepdims=True))
-    return e / e.sum(axis=1, keepdims=True)
-
-def extract(dir_path, out_path):
-    gen = ImageDataGenerator(rescale=1./255)
-    data = gen.flow_from_directory(
-        dir_path,
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode="categorical",
-        shuffle=False,
+    probs, ok = run_batches(paths, forward, batch_size, workers, desc)
+    # Same rows serving builds (ensemble.features)
+    return calibrate(probs, T), ok
+
+def extract(dir_path, out_path, incremental=False,
+            batch_size=EXTRACT_BATCH_SIZE, workers=EXTRACT_WORKERS):
+    paths, labels, classes = get_paths_and_labels(Path(dir_path))
+    # Probabilities stay float32: RF / XGB split on small differences
+    update_store(
+        out_path, paths, labels, classes,
+        model_version=file_version(CNN_MODEL, f"probs:T={T}"),
+        compute=lambda todo: calibrated_probs(todo, batch_size, workers,
+                                              desc=Path(dir_path).name),
+        dtype="float32", incremental=incremental,
     )
-    probs = model.predict(data, verbose=1)
-    logits = np.log(np.clip(probs, 1e-8, 1.0))
-    calibrated = softmax(logits / T)
-    joblib.dump((calibrated, data.classes), out_path)
     print(f"Saved: {out_path}")
 
-extract(TRAIN_DIR, EMBEDDINGS_DIR / "train_probs.joblib")
-extract(VAL_DIR,   EMBEDDINGS_DIR / "val_probs.joblib")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=EXTRACT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS,
+                        help="Decode threads (0 = autotune)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only score new / changed images, drop deleted ones")
+    args = parser.parse_args()
+
+    extract(TRAIN_DIR, TRAIN_PROBS, args.incremental, args.batch_size, args.workers)
+    extract(VAL_DIR,   VAL_PROBS,   args.incremental, args.batch_size, args.workers)
@@ -0,0 +1,56 @@
+# ml_code/ensemble/features.py
+"""
+Input rows for the RF / XGB ensemble.
+
+train_ensemble.py fits both on the TRAIN_PROBS store: the CNN's
+temperature-calibrated class probabilities (extract_probs.py), not the
+pooled 1280-D embedding. Every caller that scores RF / XGB builds its
+rows here, and a model fitted on anything else is an error.
+"""
+import threading
+
+import numpy as np
+
+from ml_code.config import TEMPERATURE_NPY
+
+_T = None
+_lock = threading.Lock()
+
+
+def calibrate(probs, T):
+    logits = np.log(np.clip(probs, 1e-8, 1.0)) / T
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def temperature():
+    global _T
+    with _lock:
+        if _T is None:
+            _T = float(np.load(TEMPERATURE_NPY))
+    return _T
+
+
+def ensemble_features(cnn_probs, T=None):
+    """
+    (N, n_classes) CNN softmax -> (N, n_classes) float32 RF / XGB rows.
+    """
+    probs = np.asarray(cnn_probs, dtype=np.float64).reshape(len(cnn_probs), -1)
+    return calibrate(probs, temperature() if T is None else T).astype(np.float32)
+
+
+def ensemble_proba(model, cnn_probs, T=None):
+    """
+    predict_proba on the calibrated CNN probabilities. Raises when the
+    model expects a different feature width (e.g. one fitted on
+    embeddings) instead of silently scoring the wrong input.
+    """
+    X = ensemble_features(cnn_probs, T)
+    expected = getattr(model, "n_features_in_", None)
+    if expected is not None and expected != X.shape[1]:
+        raise ValueError(
+            f"{type(model).__name__} expects {expected} features, got "
+            f"{X.shape[1]} calibrated CNN probabilities; retrain with "
+            f"python -m ml_code.ensemble.train_ensemble"
+        )
+    return model.predict_proba(X)
@@ -1,26 +1,48 @@
 import json
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 
 from ml_code.config import (
-    CNN_MODEL,
+    CNN_BACKEND,
     CLASSES_JSON,
-    IMG_SIZE
+    PARALLEL_BRANCHES,
+    CNN_TTA,
 )
 
-from ml_code.open_set.clip_predict import clip_predict
-from ml_code.hybrid.decision import hybrid_decision
+from ml_code.preprocessing import (
+    load_image,
+    as_uint8_batch,
+    buffer,
+    cnn_normalize,
+)
+from ml_code.cnn_backends import cnn_model_path
+from ml_code.open_set.clip_predict import (
+    clip_predict_batch,
+    CLIP_ARCH,
+    CLIP_PRETRAINED,
+    CLIP_PRECISION,
+    TEXT_PROMPTS,
+)
+from ml_code.clip_text_cache import prompt_hash
+from ml_code.hybrid.decision import hybrid_decision, CNN_CONF_THRESHOLD
+from ml_code.tta import tta_probs
+from ml_code.model_manager import models
+from ml_code.metrics import stage_timer, BATCH_SIZE, PREDICTIONS, TTA_IMAGES
+
+
+# CLIP runs here while the calling thread runs the CNN
+_branch_pool = ThreadPoolExecutor(
+    max_workers=max(2, (os.cpu_count() or 1)),
+    thread_name_prefix="clip-branch",
+)
 
 
 # -----------------------------
-# Load CNN + classes (ONCE)
+# Classes (models load lazily via ml_code.model_manager)
 # -----------------------------
-print("Loading CNN model...")
-cnn_model = load_model(CNN_MODEL, compile=False)
-
 print("Loading class mappings...")
 with open(CLASSES_JSON) as f:
     class_map = json.load(f)
@@ -28,36 +50,77 @@ inv_class_map = {v: k for k, v in class_map.items()}
 
 
 # -----------------------------
-# CNN prediction
+# Pipeline version (for result caching)
 # -----------------------------
-def cnn_predict(img_path):
-    img = image.load_img(img_path, target_size=IMG_SIZE)
-    x = image.img_to_array(img)
-    x = np.expand_dims(x, axis=0)
-    x = preprocess_input(x)
-
-    preds = cnn_model.predict(x)[0]
-    idx = int(np.argmax(preds))
-    conf = float(preds[idx])
-
-    return {
-        "label": inv_class_map[idx],
-        "confidence": conf
-    }
+def pipeline_version():
+    """
+    Changes whenever the weights, CLIP prompts or decision threshold
+    change, so cached predictions are never served for another model.
+    """
+    path = cnn_model_path()
+    st = os.stat(path)
+    return "|".join([
+        f"cnn:{CNN_BACKEND}:{path.name}:{st.st_size}:{int(st.st_mtime)}:unit",
+        f"clip:{CLIP_ARCH}:{CLIP_PRETRAINED}:{CLIP_PRECISION}:"
+        f"{prompt_hash(TEXT_PROMPTS)}",
+        f"threshold:{CNN_CONF_THRESHOLD}",
+    ])
 
 
 # -----------------------------
-# FULL PIPELINE
+# CNN prediction
 # -----------------------------
-def predict_image(img_path):
-    # 1. CNN prediction
-    cnn_result = cnn_predict(img_path)
+def cnn_probs_batch(imgs, tta=False, model=None):
+    """
+    imgs: list of sources / PIL images (NEAREST-resized here), or an
+    (N, 224, 224, 3) uint8 batch already resized that way.
+    tta: re-score images below CNN_CONF_THRESHOLD with the mean over
+    flips / rotations / crops (ml_code.tta), in one extra forward.
+    model: a ml_code.cnn_backends runtime, default the served one
+    (quantize_tflite / export_onnx evaluate their models through here).
+    Returns (N, num_classes) probabilities.
+    """
+    model = model or models.get("cnn")
+
+    with stage_timer("cnn_preprocess"):
+        u8 = as_uint8_batch(imgs)
+        x = cnn_normalize(u8, out=buffer("cnn_input", u8.shape))
+
+    # Keras, ONNX Runtime or TFLite, see ml_code.cnn_backends
+    with stage_timer("cnn_forward"):
+        preds = model.predict(x)
+
+    if tta:
+        with stage_timer("cnn_tta"):
+            preds, fired = tta_probs(model, u8, preds, cnn_normalize)
+        TTA_IMAGES.inc(int(fired.sum()))
+    return preds
+
+
+def cnn_predict_batch(imgs, tta=False):
+    preds = cnn_probs_batch(imgs, tta)
+
+    results = []
+    for p in preds:
+        idx = int(np.argmax(p))
+        results.append({
+            "label": inv_class_map[idx],
+            "confidence": float(p[idx])
+        })
+    return results
+
+
+def cnn_predict(img):
+    return cnn_predict_batch([img])[0]
 
-    # 2. CLIP open-set prediction
-    clip_result = clip_predict(img_path)
 
-    # 3. Hybrid decision
-    final = hybrid_decision(cnn_result, clip_result)
+# -----------------------------
+# Hybrid output formatting
+# -----------------------------
+def _combine(cnn_result, clip_result):
+    with stage_timer("hybrid_decision"):
+        final = hybrid_decision(cnn_result, clip_result)
+    PREDICTIONS.inc(source=final["source"])
 
     # --------------------------------------------------
     # Confidence source control (NO UI logic here)
@@ -77,10 +140,110 @@ def predict_image(img_path):
     }
 
 
+# -----------------------------
+# FULL PIPELINE
+# -----------------------------
+def _run_branches(imgs, parallel, tta=False):
+    if not parallel:
+        return cnn_predict_batch(imgs, tta), clip_predict_batch(imgs)
+
+    # TF and PyTorch release the GIL in their kernels, so the two
+    # branches overlap; wall time ~ the slower branch
+    clip_future = _branch_pool.submit(clip_predict_batch, imgs)
+    try:
+        cnn_results = cnn_predict_batch(imgs, tta)
+    finally:
+        clip_results = clip_future.result()
+    return cnn_results, clip_results
+
+
+def predict_image(img, parallel=PARALLEL_BRANCHES, tta=CNN_TTA):
+    """
+    img: path, raw bytes, PIL image or RGB uint8 ndarray.
+    Decoded once here; each branch resizes the decoded image the way
+    its model was trained (ml_code.preprocessing.RESIZE_MODES).
+    """
+    return predict_batch([img], parallel=parallel, tta=tta)[0]
+
+
+def predict_batch(imgs, parallel=PARALLEL_BRANCHES, tta=CNN_TTA):
+    """
+    Batched predict_image(): one CNN forward and one CLIP
+    forward for the whole list. Results keep input order.
+    """
+    imgs = list(imgs)
+    if not imgs:
+        return []
+    with stage_timer("decode"):
+        decoded = [load_image(img) for img in imgs]
+    BATCH_SIZE.observe(len(imgs))
+
+    # 1. CNN prediction + 2. CLIP open-set prediction
+    cnn_results, clip_results = _run_branches(decoded, parallel, tta)
+
+    # 3. Hybrid decision
+    return [_combine(c, k) for c, k in zip(cnn_results, clip_results)]
+
+
+# -----------------------------
+# Latency measurement
+# -----------------------------
+def bench_latency(img, runs=20, parallel=PARALLEL_BRANCHES):
+    img = load_image(img)
+    predict_image(img, parallel=parallel)  # warm-up
+
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        predict_image(img, parallel=parallel)
+        times.append((time.perf_counter() - t0) * 1000)
+
+    return {
+        "mode": "parallel" if parallel else "sequential",
+        "p50_ms": round(float(np.percentile(times, 50)), 2),
+        "p95_ms": round(float(np.percentile(times, 95)), 2),
+    }
+
+
 # -----------------------------
 # CLI support
 # -----------------------------
+def _compare(img, runs):
+    """
+    Before/after: each mode in a fresh process, because thread
+    budgets are fixed once TF initialises.
+    """
+    import subprocess
+
+    for flag in ("0", "1"):
+        env = dict(os.environ, PARALLEL_BRANCHES=flag)
+        subprocess.run(
+            [sys.executable, "-m", "ml_code.ensemble.predict", img,
+             "--bench", str(runs)],
+            env=env,
+            check=True,
+        )
+
+
 if __name__ == "__main__":
-    img = sys.argv[1]
-    result = predict_image(img)
-    print(json.dumps(result, indent=2))
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("img", help="Path to image")
+    parser.add_argument("--bench", type=int, default=0,
+                        help="Measure latency over N runs")
+    parser.add_argument("--compare", action="store_true",
+                        help="Sequential vs parallel branches, N=--bench")
+    parser.add_argument("--tta", action="store_true",
+                        help="Test-time augmentation for low-confidence CNN")
+    args = parser.parse_args()
+
+    if args.compare:
+        _compare(args.img, args.bench or 20)
+    elif args.bench:
+        from ml_code.runtime import thread_budget
+        print(json.dumps({**bench_latency(args.img, args.bench),
+                          "threads": thread_budget()}))
+    else:
+        result = predict_image(args.img, tta=args.tta or CNN_TTA)
+        print(json.dumps(result, indent=2))
@@ -5,12 +5,13 @@ from sklearn.ensemble import RandomForestClassifier
 from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score
 
-from ml_code.config import EMBEDDINGS_DIR, MODELS_DIR
+from ml_code.config import MODELS_DIR, TRAIN_PROBS, VAL_PROBS
+from ml_code.embedding_store import EmbeddingStore
 
 MODELS_DIR.mkdir(parents=True, exist_ok=True)
 
-X_train, y_train = joblib.load(EMBEDDINGS_DIR / "train_probs.joblib")
-X_val,   y_val   = joblib.load(EMBEDDINGS_DIR / "val_probs.joblib")
+X_train, y_train = EmbeddingStore(TRAIN_PROBS).load()
+X_val,   y_val   = EmbeddingStore(VAL_PROBS).load()
 
 # Random Forest
 rf = RandomForestClassifier(
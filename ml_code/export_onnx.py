@@ -0,0 +1,159 @@
+# ml_code/export_onnx.py
+"""
+Export the Keras CNN to ONNX and compare the two serving backends.
+
+    python -m ml_code.export_onnx              # write config.CNN_ONNX
+    python -m ml_code.export_onnx --check      # parity on VAL_DIR
+    python -m ml_code.export_onnx --report     # startup / RSS / latency
+
+Serve with CNN_BACKEND=onnx once the parity check passes.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from ml_code.config import CNN_MODEL, CNN_ONNX, VAL_DIR, IMG_SIZE
+from ml_code.preprocessing import decode_batch
+
+
+# ======================================================
+# Export
+# ======================================================
+def export(opset=13):
+    import tensorflow as tf
+    import tf2onnx
+    from ml_code.cnn_backends import with_embedding
+
+    # Outputs: (probs, 1280-D embedding), see cnn_backends.OnnxCNN
+    model = with_embedding(tf.keras.models.load_model(CNN_MODEL, compile=False))
+    spec = (tf.TensorSpec((None, IMG_SIZE[0], IMG_SIZE[1], 3), tf.float32,
+                          name="input"),)
+
+    tf2onnx.convert.from_keras(
+        model, input_signature=spec, opset=opset, output_path=str(CNN_ONNX)
+    )
+    print("Saved ONNX model:", CNN_ONNX)
+
+
+# ======================================================
+# Parity check (Keras vs ONNX Runtime)
+# ======================================================
+def iter_val_batches(limit, batch_size=32):
+    exts = (".jpg", ".jpeg", ".png")
+    paths = sorted(p for p in VAL_DIR.rglob("*") if p.suffix.lower() in exts)
+    paths = paths[:limit] if limit else paths
+
+    for i in range(0, len(paths), batch_size):
+        yield decode_batch(paths[i:i + batch_size])
+
+
+def check_parity(limit=0, atol=1e-4):
+    from ml_code.cnn_backends import KerasCNN, OnnxCNN
+
+    keras_cnn = KerasCNN()
+    onnx_cnn = OnnxCNN()
+
+    n = agree = 0
+    max_diff = 0.0
+    # Through the serving path (cnn_normalize + forward)
+    from ml_code.ensemble.predict import cnn_probs_batch
+
+    for x in iter_val_batches(limit):
+        a = cnn_probs_batch(x, model=keras_cnn)
+        b = cnn_probs_batch(x, model=onnx_cnn)
+        max_diff = max(max_diff, float(np.abs(a - b).max()))
+        agree += int((a.argmax(1) == b.argmax(1)).sum())
+        n += len(x)
+
+    if n == 0:
+        raise SystemExit(f"No validation images under {VAL_DIR}")
+
+    print(f"Images: {n}")
+    print(f"Top-1 agreement: {agree / n:.4%}")
+    print(f"Max |keras - onnx| prob: {max_diff:.2e} (atol {atol})")
+
+    ok = agree == n and max_diff <= atol
+    print("PARITY OK" if ok else "PARITY FAILED")
+    return ok
+
+
+# ======================================================
+# Startup / RSS / latency report
+# ======================================================
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def probe(backend, runs=50):
+    """
+    Runs inside a fresh interpreter so one backend's imports don't
+    inflate the other's numbers.
+    """
+    t0 = time.perf_counter()
+    from ml_code.cnn_backends import load_cnn
+    model = load_cnn(backend)
+    x = np.zeros((1, IMG_SIZE[0], IMG_SIZE[1], 3), dtype="float32")
+    model.predict(x)
+    startup = time.perf_counter() - t0
+
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        model.predict(x)
+        times.append((time.perf_counter() - t) * 1000)
+
+    print(json.dumps({
+        "backend": backend,
+        "startup_s": round(startup, 2),
+        "rss_mb": round(_rss_mb(), 1),
+        "p50_ms": round(float(np.percentile(times, 50)), 2),
+        "p95_ms": round(float(np.percentile(times, 95)), 2),
+        "tensorflow_imported": "tensorflow" in sys.modules,
+    }))
+
+
+def report(runs=50, backends=("keras", "onnx")):
+    print(f"{'backend':>8} {'startup s':>10} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for backend in backends:
+        out = subprocess.run(
+            [sys.executable, "-m", "ml_code.export_onnx",
+             "--probe", backend, "--runs", str(runs)],
+            env=dict(os.environ, CNN_BACKEND=backend),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(f"{r['backend']:>8} {r['startup_s']:>10} {r['rss_mb']:>8} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true",
+                        help="Compare Keras and ONNX outputs on VAL_DIR")
+    parser.add_argument("--limit", type=int, default=0,
+                        help="Max validation images for --check (0 = all)")
+    parser.add_argument("--report", action="store_true",
+                        help="Startup time, RSS and latency per backend")
+    parser.add_argument("--probe", choices=["keras", "onnx", "tflite"],
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--opset", type=int, default=13)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.runs)
+    elif args.check:
+        sys.exit(0 if check_parity(args.limit) else 1)
+    elif args.report:
+        report(args.runs)
+    else:
+        export(args.opset)
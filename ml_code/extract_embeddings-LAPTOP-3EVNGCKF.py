@@ -1,16 +1,20 @@
 # ml_code/extract_embeddings.py
 
+import argparse
+
 import numpy as np
-import joblib
 from pathlib import Path
-from tqdm import tqdm
-from PIL import Image
 
 import tensorflow as tf
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 
-from ml_code.config import TRAIN_DIR, VAL_DIR, EMBEDDINGS_DIR, IMG_SIZE
+from ml_code.config import (
+    TRAIN_DIR, VAL_DIR, EMBEDDINGS_DIR, IMG_SIZE,
+    EXTRACT_BATCH_SIZE, EXTRACT_WORKERS, EMBEDDING_DTYPE,
+    TRAIN_EMB_IMAGENET, VAL_EMB_IMAGENET,
+)
+from ml_code.extract_embeddings import run_batches
+from ml_code.embedding_store import EmbeddingStore
 
 # -------------------------------
 # Model: MobileNetV2 as feature extractor
@@ -23,61 +27,60 @@ base_model = MobileNetV2(
 )
 
 # -------------------------------
-# Utility: load and preprocess image
+# Batched forward: uint8 -> [-1, 1] (mobilenet_v2.preprocess_input)
 # -------------------------------
-def load_image(path):
-    img = Image.open(path).convert("RGB")
-    img = img.resize(IMG_SIZE)
-    arr = np.array(img)
-    arr = np.expand_dims(arr, axis=0)
-    arr = preprocess_input(arr)
-    return arr
+@tf.function(reduce_retracing=True)
+def embed(imgs):
+    return base_model(tf.cast(imgs, tf.float32) / 127.5 - 1.0, training=False)
 
 
 # -------------------------------
 # Extract embeddings from a directory
 # -------------------------------
-def extract_from_dir(root_dir):
-    features = []
+def extract_from_dir(root_dir, batch_size=EXTRACT_BATCH_SIZE, workers=EXTRACT_WORKERS):
+    paths = []
     labels = []
 
     class_names = sorted([d.name for d in root_dir.iterdir() if d.is_dir()])
 
     for idx, class_name in enumerate(class_names):
-        class_dir = root_dir / class_name
-        image_files = list(class_dir.glob("*"))
-
-        for img_path in tqdm(image_files, desc=f"Processing {class_name}"):
-            try:
-                img_arr = load_image(img_path)
-                emb = base_model.predict(img_arr, verbose=0)[0]
-                features.append(emb)
-                labels.append(idx)
-            except Exception as e:
-                print(f"Skipping {img_path}: {e}")
+        image_files = sorted(p for p in (root_dir / class_name).glob("*") if p.is_file())
+        paths.extend(image_files)
+        labels.extend([idx] * len(image_files))
 
-    return np.array(features), np.array(labels), class_names
+    # Decoded on `workers` threads, batched forwards; unreadable files skipped
+    features, ok = run_batches(paths, embed, batch_size, workers, desc=root_dir.name)
+    return features, np.array(labels)[ok], class_names
 
 
 # -------------------------------
 # Main execution
 # -------------------------------
-def main():
+def main(batch_size=EXTRACT_BATCH_SIZE, workers=EXTRACT_WORKERS):
     EMBEDDINGS_DIR.mkdir(parents=True, exist_ok=True)
 
     print("Extracting TRAIN embeddings...")
-    X_train, y_train, class_names = extract_from_dir(TRAIN_DIR)
+    X_train, y_train, class_names = extract_from_dir(TRAIN_DIR, batch_size, workers)
 
     print("Extracting VAL embeddings...")
-    X_val, y_val, _ = extract_from_dir(VAL_DIR)
+    X_val, y_val, _ = extract_from_dir(VAL_DIR, batch_size, workers)
 
-    # Save embeddings
-    joblib.dump((X_train, y_train), EMBEDDINGS_DIR / "train_embeddings.pkl")
-    joblib.dump((X_val, y_val), EMBEDDINGS_DIR / "val_embeddings.pkl")
+    # Save embeddings (memory-mapped float16 shards). Own stores: these
+    # are ImageNet features, not the fine-tuned CNN's TRAIN_EMB / VAL_EMB
+    for root, X, y in ((TRAIN_EMB_IMAGENET, X_train, y_train),
+                       (VAL_EMB_IMAGENET, X_val, y_val)):
+        store = EmbeddingStore.create(root, class_names, dtype=EMBEDDING_DTYPE,
+                                      overwrite=True)
+        store.append(X, y)
 
-    print("Embeddings saved to:", EMBEDDINGS_DIR)
+    print("Embeddings saved to:", TRAIN_EMB_IMAGENET, VAL_EMB_IMAGENET)
     print("Classes:", class_names)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=EXTRACT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS,
+                        help="Decode threads (0 = autotune)")
+    args = parser.parse_args()
+    main(args.batch_size, args.workers)
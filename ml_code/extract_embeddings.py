@@ -1,14 +1,19 @@
 # extract_embeddings.py
-import joblib
+import argparse
+import time
+
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import GlobalAveragePooling2D
-from tensorflow.keras.models import Model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-from config import DATA_DIR, EMB_DIR, IMG_SIZE
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+from ml_code.config import (
+    DATA_DIR, EMBEDDINGS_DIR as EMB_DIR, IMG_SIZE, CNN_MODEL,
+    EXTRACT_BATCH_SIZE, EXTRACT_WORKERS, EMBEDDING_DTYPE,
+)
+from ml_code.cnn_backends import with_embedding
+from ml_code.preprocessing import decode
+from ml_code.incremental import update_store, file_version
 
 EMB_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -25,23 +30,88 @@ def get_paths_and_labels(root_dir: Path):
     return paths, labels, classes
 
 def load_embedding_model():
-    base = MobileNetV2(weights="imagenet", include_top=False, input_shape=(IMG_SIZE[0], IMG_SIZE[1], 3))
-    gap = GlobalAveragePooling2D()(base.output)
-    model = Model(inputs=base.input, outputs=gap)
-    return model
-
-def extract(paths, model):
-    feats = []
-    for p in tqdm(paths):
-        img = load_img(p, target_size=IMG_SIZE)
-        arr = img_to_array(img)
-        arr = preprocess_input(arr)
-        arr = np.expand_dims(arr, axis=0)
-        v = model.predict(arr, verbose=0)[0]
-        feats.append(v)
-    return np.array(feats)
+    # Pooled backbone of the fine-tuned CNN: the same features serving
+    # gets from its single (probs, embedding) forward pass
+    return with_embedding(load_model(CNN_MODEL, compile=False))
+
+def image_dataset(paths, batch_size=EXTRACT_BATCH_SIZE, workers=EXTRACT_WORKERS):
+    """
+    paths -> prefetched batches of ((N, H, W, 3) uint8, (N,) ok flags).
+    Decode + resize is ml_code.preprocessing.decode (same pixels as
+    serving), run on `workers` threads; PIL releases the GIL while it
+    decodes. Unreadable files come back as ok=False instead of stopping
+    the run.
+    """
+    shape = (IMG_SIZE[1], IMG_SIZE[0], 3)
+
+    def _load(path):
+        try:
+            return decode(path.decode()), True
+        except Exception as e:
+            print(f"Skipping {path.decode()}: {e}")
+            return np.zeros(shape, dtype=np.uint8), False
+
+    def _map(path):
+        img, ok = tf.numpy_function(_load, [path], (tf.uint8, tf.bool))
+        img.set_shape(shape)
+        ok.set_shape(())
+        return img, ok
+
+    ds = tf.data.Dataset.from_tensor_slices([str(p) for p in paths])
+    ds = ds.map(_map, num_parallel_calls=workers or tf.data.AUTOTUNE,
+                deterministic=True)
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def run_batches(paths, forward, batch_size=EXTRACT_BATCH_SIZE,
+                workers=EXTRACT_WORKERS, desc="extract"):
+    """
+    forward: uint8 batch tensor -> (N, D) features. Returns (feats, ok)
+    where feats only has rows for readable images and ok masks `paths`.
+    """
+    feats, oks = [], []
+    t0 = time.perf_counter()
+    n_batches = -(-len(paths) // batch_size)
+    for imgs, ok in tqdm(image_dataset(paths, batch_size, workers),
+                         total=n_batches, desc=desc):
+        ok = ok.numpy()
+        feats.append(forward(imgs).numpy()[ok])
+        oks.append(ok)
+    dt = time.perf_counter() - t0
+
+    ok = np.concatenate(oks) if oks else np.zeros(0, dtype=bool)
+    print(f"{desc}: {len(paths)} images in {dt:.1f}s "
+          f"({len(paths) / max(dt, 1e-9):.1f} img/s)")
+    return (np.concatenate(feats) if feats else np.zeros((0, 0), np.float32)), ok
+
+def extract(paths, model, batch_size=EXTRACT_BATCH_SIZE, workers=EXTRACT_WORKERS,
+            desc="extract"):
+    @tf.function(reduce_retracing=True)
+    def forward(imgs):
+        _, v = model(tf.cast(imgs, tf.float32) / 255.0, training=False)
+        return v
+
+    return run_batches(paths, forward, batch_size, workers, desc)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=EXTRACT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS,
+                        help="Decode threads (0 = autotune)")
+    parser.add_argument("--dtype", default=EMBEDDING_DTYPE,
+                        help="Stored dtype: float16 (default) or float32")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed new / changed images, drop deleted ones")
+    args = parser.parse_args()
+
+    model = None  # loaded once, shared by both splits, only if needed
+
+    def compute(paths, desc):
+        global model
+        if model is None:
+            model = load_embedding_model()
+        return extract(paths, model, args.batch_size, args.workers, desc=desc)
+
+    version = file_version(CNN_MODEL, "embedding")
     for split in ["train", "val"]:
         root = DATA_DIR / split
         if not root.exists():
@@ -51,9 +121,11 @@ if __name__ == "__main__":
             print(f"No images in {root}, skipping")
             continue
         print(f"{split}: found {len(paths)} images, {len(classes)} classes")
-        model = load_embedding_model()
-        feats = extract(paths, model)
-        joblib.dump({"paths": paths, "labels": labels, "feats": feats, "classes": classes},
-                    EMB_DIR / f"{split}_embeddings.pkl")
-        print(f"Saved {EMB_DIR / (split + '_embeddings.pkl')}")
+        out = EMB_DIR / f"{split}_embeddings"
+        store = update_store(
+            out, paths, labels, classes, version,
+            compute=lambda todo, split=split: compute(todo, split),
+            dtype=args.dtype, incremental=args.incremental,
+        )
+        print(f"Saved {out} {store.shape} {store.dtype}")
     print("Embedding extraction finished.")
@@ -1,7 +1,7 @@
 from PIL import Image
 
 from ml_code.predict_super_ensemble import predict_from_pil
-from ml_code.clip_zero_shot import clip_zero_shot_predict
+from ml_code.clip_zero_shot import zero_shot_batch, format_zero_shot
 
 CNN_CONF_THRESHOLD = 0.30  # Lowered for web images
 
@@ -11,7 +11,29 @@ def hybrid_predict(image: Image.Image):
     Always predicts an exact disease name.
     Uses hierarchy to prevent catastrophic errors.
     """
+    return hybrid_predict_batch([image])[0]
 
+
+def hybrid_predict_batch(images):
+    """
+    hybrid_predict() for many images: the CLIP fallback for every
+    low-confidence image runs as one batched zero-shot pass.
+    """
+    images = list(images)
+    results = [_cnn_decision(image) for image in images]
+
+    fallback = [i for i, r in enumerate(results) if r is None]
+    if fallback:
+        order, probs = zero_shot_batch(images[i] for i in fallback)
+        for i, o, p in zip(fallback, order, probs):
+            results[i] = _zero_shot_result(o, p)
+    return results
+
+
+def _cnn_decision(image):
+    """
+    CNN result dict, or None when the CLIP fallback should decide.
+    """
     # ---------------- CNN FIRST ----------------
     cnn_result = predict_from_pil(image)
     cnn_label = cnn_result["label"]
@@ -37,8 +59,12 @@ def hybrid_predict(image: Image.Image):
             "top_probs": cnn_probs,
         }
 
+    return None
+
+
+def _zero_shot_result(order, probs):
     # ---------------- CLIP SIMILARITY FALLBACK ----------------
-    zs_label, zs_conf, zs_probs = clip_zero_shot_predict(image)
+    zs_label, zs_conf, zs_probs = format_zero_shot(order, probs)
 
     return {
         "label": zs_label,
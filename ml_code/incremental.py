@@ -0,0 +1,199 @@
+# ml_code/incremental.py
+"""
+Incremental (re)extraction into an ml_code.embedding_store.
+
+Next to each store, manifest.json records the following for every row:
+    path -> size, mtime_ns, content hash
+It also records the model version that produced the rows. update_store()
+sorts the current file list into:
+
+    kept      same size + mtime, or same content after a touch
+    todo      new files, and files whose content changed
+    deleted   in the manifest, gone from disk
+
+Only `todo` goes through the model. If nothing was changed or deleted,
+the new rows are appended as a new shard. Otherwise (or when `dtype`
+differs from the stored one) the store is rewritten from its kept rows
+(a memory-mapped copy, no model) plus the new rows. A different model
+version or class list means a full rebuild.
+"""
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ml_code.embedding_store import EmbeddingStore, SHARD_ROWS, INDEX
+
+MANIFEST = "manifest.json"
+
+
+def file_version(path, tag=""):
+    """
+    Cheap identity of a weights file (same idea as ensemble.predict.
+    pipeline_version): name, size, mtime and what the rows are.
+    """
+    st = os.stat(path)
+    return f"{Path(path).name}:{st.st_size}:{int(st.st_mtime)}:{tag}"
+
+
+def content_hash(path, chunk=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _load_previous(root, classes, model_version):
+    """
+    (store, manifest files) when the previous run can be reused, else None.
+    """
+    root = Path(root)
+    if not (root / INDEX).exists() or not (root / MANIFEST).exists():
+        print(f"{root.name}: no previous store/manifest, full extraction")
+        return None
+
+    with open(root / MANIFEST) as f:
+        manifest = json.load(f)
+    store = EmbeddingStore(root)
+
+    reason = None
+    if manifest.get("model_version") != model_version:
+        reason = "model changed"
+    elif store.classes != list(classes):
+        reason = "class list changed"
+    elif store.paths is None or sorted(store.paths) != sorted(manifest["files"]):
+        reason = "manifest out of sync with store"
+    if reason:
+        print(f"{root.name}: {reason}, full extraction")
+        return None
+    return store, manifest["files"]
+
+
+def _write(root, classes, dtype, model_version, files, parts, previous=None):
+    """
+    Builds a new store next to `root` from `parts` (an iterable of
+    (feats, labels, paths) chunks), then swaps it in. `previous`, the
+    store `parts` reads from, is closed before its directory is moved.
+    """
+    root = Path(root)
+    tmp = root.with_name(root.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+
+    store = EmbeddingStore.create(tmp, classes, dtype=dtype,
+                                  meta={"model_version": model_version})
+    for feats, labels, paths in parts:
+        store.append(feats, labels, paths)
+    _save_manifest(tmp, model_version, files)
+
+    if previous is not None:
+        previous.close()
+    old = root.with_name(root.name + ".old")
+    if old.exists():
+        shutil.rmtree(old)
+    if root.exists():
+        os.replace(root, old)
+    os.replace(tmp, root)
+    if old.exists():
+        shutil.rmtree(old)
+
+
+def _save_manifest(root, model_version, files):
+    path = Path(root) / MANIFEST
+    tmp = path.with_name(MANIFEST + ".tmp")
+    tmp.write_text(json.dumps({"model_version": model_version, "files": files}))
+    os.replace(tmp, path)
+
+
+def _kept_rows(store, rows):
+    # Old rows in shard-sized chunks straight from the memory map
+    all_paths = store.paths
+    for lo in range(0, len(rows), SHARD_ROWS):
+        chunk = rows[lo:lo + SHARD_ROWS]
+        feats, labels = store.take(chunk, with_labels=True)
+        yield feats, labels, [all_paths[i] for i in chunk]
+
+
+def update_store(root, paths, labels, classes, model_version, compute,
+                 dtype="float16", incremental=True):
+    """
+    compute(paths) -> (feats for the readable ones, ok mask); only
+    called for new / changed files (or everything without a usable
+    previous run). Unreadable files are left out of the manifest, so
+    they are retried next time.
+    """
+    t0 = time.perf_counter()
+    paths = [str(p) for p in paths]
+    label_of = dict(zip(paths, labels))
+    stats = {p: _stat(p) for p in paths}
+
+    previous = _load_previous(root, classes, model_version) if incremental else None
+    files = {}
+    kept, todo, changed = [], [], 0
+
+    if previous is None:
+        store, old_files = None, {}
+        todo = paths
+    else:
+        store, old_files = previous
+        for p in paths:
+            rec = old_files.get(p)
+            size, mtime = stats[p]
+            if rec is not None and rec["size"] == size:
+                if rec["mtime_ns"] == mtime:
+                    kept.append(p)
+                    files[p] = rec
+                    continue
+                digest = content_hash(p)
+                if digest == rec["hash"]:   # touched, not modified
+                    kept.append(p)
+                    files[p] = dict(rec, mtime_ns=mtime)
+                    continue
+            changed += rec is not None
+            todo.append(p)
+
+    deleted = len(set(old_files) - set(paths))
+
+    if todo:
+        feats, ok = compute(todo)
+        new_paths = [p for p, keep in zip(todo, ok) if keep]
+    else:
+        feats, new_paths = None, []
+    new_labels = np.asarray([label_of[p] for p in new_paths], dtype=np.int32)
+    for p in new_paths:
+        size, mtime = stats[p]
+        files[p] = {"size": size, "mtime_ns": mtime, "hash": content_hash(p)}
+
+    if (store is not None and len(kept) == len(store)
+            and store.dtype == np.dtype(dtype)):
+        # Pure addition: one more shard, existing shards untouched
+        if new_paths:
+            store.append(feats, new_labels, new_paths)
+        _save_manifest(root, model_version, files)
+    else:
+        parts = []
+        if store is not None and kept:
+            row_of = {p: i for i, p in enumerate(store.paths)}
+            parts = _kept_rows(store, np.array([row_of[p] for p in kept]))
+        if new_paths:
+            parts = itertools.chain(parts, [(feats, new_labels, new_paths)])
+        if store is not None and store.dtype != np.dtype(dtype):
+            print(f"{Path(root).name}: dtype {store.dtype} -> "
+                  f"{np.dtype(dtype)}, rewriting kept rows")
+        _write(root, classes, dtype, model_version, files, parts, store)
+
+    print(f"{Path(root).name}: kept {len(kept)}, computed {len(new_paths)} "
+          f"({changed} changed), dropped {deleted} deleted "
+          f"in {time.perf_counter() - t0:.1f}s")
+    return EmbeddingStore(root)
@@ -0,0 +1,162 @@
+# ml_code/metrics.py
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# ======================================================
+# Minimal Prometheus-compatible metrics (no dependencies)
+# ======================================================
+# Latency buckets in seconds: 1 ms .. 10 s
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_registry = []
+
+
+def _escape(value):
+    # Label value escaping from the text exposition format
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join('{}="{}"'.format(k, _escape(v)) for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {v}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read at scrape time from a zero-arg callable.
+    kind="counter" exposes an externally kept monotonic count.
+    """
+
+    def __init__(self, name, help, fn, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        _registry.append(self)
+
+    def render(self):
+        try:
+            value = float(self.fn())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}",
+                f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {value}"]
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, series):
+                    cumulative += n
+                    labels = _fmt_labels(self.labelnames, key, ("le", bound))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                labels = _fmt_labels(self.labelnames, key, ("le", "+Inf"))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                base = _fmt_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{base} {series[-1]}")
+                lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+def render():
+    """
+    All registered metrics in Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ======================================================
+# Prediction pipeline metrics
+# ======================================================
+STAGE_SECONDS = Histogram(
+    "skin_pipeline_stage_seconds",
+    "Wall time per prediction pipeline stage (per call/batch)",
+    labelnames=("stage",),
+)
+
+BATCH_SIZE = Histogram(
+    "skin_pipeline_batch_size",
+    "Images per pipeline call",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+PREDICTIONS = Counter(
+    "skin_predictions_total",
+    "Predictions by decision source",
+    labelnames=("source",),
+)
+
+TTA_IMAGES = Counter(
+    "skin_cnn_tta_images_total",
+    "Low-confidence images re-scored with test-time augmentation",
+)
+
+
+@contextmanager
+def stage_timer(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage)
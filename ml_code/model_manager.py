@@ -0,0 +1,176 @@
+# ml_code/model_manager.py
+
+import threading
+import time
+
+import numpy as np
+
+from ml_code.config import IMG_SIZE
+
+
+# ======================================================
+# Model manager
+# ======================================================
+class ModelManager:
+    """
+    Central, thread-safe owner of the serving models.
+
+    Each model is registered as a loader (+ optional warm-up) and built
+    on first get(). Loading is single-flight: concurrent callers wait on
+    a per-model lock instead of loading a second copy. load_async()
+    starts loading in the background so the process can answer /health
+    while weights are still being read.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._warmups = {}
+        self._models = {}
+        self._locks = {}
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, warmup=None):
+        with self._lock:
+            if name in self._models:
+                raise RuntimeError(f"Model '{name}' is already loaded")
+            self._loaders[name] = loader
+            self._warmups[name] = warmup
+            self._locks.setdefault(name, threading.Lock())
+            self._status[name] = {"state": "pending"}
+
+    def override(self, name, loader):
+        """
+        Swaps the loader of a model that is not loaded yet (benchmarks,
+        random-init fallbacks) and keeps its warm-up. Returns the
+        previous loader.
+        """
+        with self._lock:
+            previous = self._loaders.get(name)
+            warmup = self._warmups.get(name)
+        self.register(name, loader, warmup)
+        return previous
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model '{name}'")
+
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            self._status[name] = {"state": "loading"}
+            t0 = time.perf_counter()
+            try:
+                model = self._loaders[name]()
+                t1 = time.perf_counter()
+
+                warmup = self._warmups.get(name)
+                if warmup is not None:
+                    warmup(model)
+                t2 = time.perf_counter()
+            except Exception as e:
+                self._status[name] = {"state": "failed", "error": str(e)}
+                raise
+
+            self._models[name] = model
+            self._status[name] = {
+                "state": "ready",
+                "load_seconds": round(t1 - t0, 3),
+                "warmup_seconds": round(t2 - t1, 3),
+            }
+            print(f"Model '{name}' ready in {t2 - t0:.2f}s")
+            return model
+
+    def load_async(self, names=None):
+        """
+        Loads (and warms) the given models on background threads.
+        """
+        names = list(names or self._loaders)
+
+        def _load(name):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Model '{name}' failed to load:", e)
+
+        for name in names:
+            threading.Thread(
+                target=_load, args=(name,), name=f"load-{name}", daemon=True
+            ).start()
+
+    def is_ready(self, names=None):
+        names = names or list(self._loaders)
+        return all(n in self._models for n in names)
+
+    def status(self, names=None):
+        names = names or list(self._loaders)
+        return {n: dict(self._status.get(n, {"state": "unknown"})) for n in names}
+
+
+models = ModelManager()
+
+
+# ======================================================
+# Default loaders
+# ======================================================
+def _load_cnn():
+    from ml_code.cnn_backends import load_cnn
+
+    print("Loading CNN model...")
+    return load_cnn()   # runtime picked by config.CNN_BACKEND
+
+
+def _warm_cnn(model):
+    model.predict(np.zeros((1, IMG_SIZE[0], IMG_SIZE[1], 3), dtype="float32"))
+
+
+def _load_clip():
+    from ml_code.runtime import configure_threads
+    from ml_code.clip_registry import get_open_clip
+    from ml_code.open_set.clip_predict import (
+        CLIP_ARCH, CLIP_PRETRAINED, CLIP_PRECISION,
+    )
+
+    configure_threads()
+    # Same instance clip_open_set_predict.py gets from the registry
+    return tuple(get_open_clip(CLIP_ARCH, CLIP_PRETRAINED, CLIP_PRECISION))
+
+
+def _warm_clip(bundle):
+    import torch
+    from ml_code.open_set.clip_predict import (
+        CLIP_ARCH, CLIP_PRETRAINED, CLIP_PRECISION, TEXT_PROMPTS,
+    )
+    from ml_code.clip_text_cache import get_text_features
+    from ml_code.open_set.precision import image_autocast
+
+    model, _, tokenizer = bundle
+    get_text_features(model, tokenizer, TEXT_PROMPTS, CLIP_ARCH, CLIP_PRETRAINED)
+    with torch.no_grad(), image_autocast(CLIP_PRECISION):
+        model.encode_image(torch.zeros(1, 3, IMG_SIZE[0], IMG_SIZE[1]))
+
+
+def _load_vit():
+    from ml_code.runtime import configure_threads
+    from ml_code.vit.vit_predict import load_vit
+
+    configure_threads()
+    return load_vit()   # TorchScript export when present
+
+
+def _warm_vit(model):
+    import torch
+
+    with torch.inference_mode():
+        model(torch.zeros((1, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=torch.uint8))
+
+
+models.register("cnn", _load_cnn, _warm_cnn)
+models.register("clip", _load_clip, _warm_clip)
+models.register("vit", _load_vit, _warm_vit)
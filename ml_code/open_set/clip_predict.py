@@ -1,12 +1,15 @@
 import torch
-import open_clip
-from PIL import Image
 
-model, _, preprocess = open_clip.create_model_and_transforms(
-    "ViT-B-32", pretrained="laion2b_s34b_b79k"
-)
-tokenizer = open_clip.get_tokenizer("ViT-B-32")
-model.eval()
+from ml_code.preprocessing import as_uint8_batch, buffer, clip_normalize
+from ml_code.clip_text_cache import get_text_features
+from ml_code.model_manager import models
+from ml_code.metrics import stage_timer
+from ml_code.open_set.precision import resolve_precision, image_autocast
+
+# Loaded lazily by ml_code.model_manager ("clip")
+CLIP_ARCH = "ViT-B-32"
+CLIP_PRETRAINED = "laion2b_s34b_b79k"
+CLIP_PRECISION = resolve_precision()
 
 DISEASES = [
     "acne",
@@ -25,22 +28,9 @@ DISEASES = [
     "healthy skin"
 ]
 
-def clip_predict(image_path):
-    image = preprocess(Image.open(image_path).convert("RGB")).unsqueeze(0)
-
-    texts = [f"a clinical photograph of {d}" for d in DISEASES]
-    text_tokens = tokenizer(texts)
-
-    with torch.no_grad():
-        img_feat = model.encode_image(image)
-        txt_feat = model.encode_text(text_tokens)
-
-        img_feat /= img_feat.norm(dim=-1, keepdim=True)
-        txt_feat /= txt_feat.norm(dim=-1, keepdim=True)
+TEXT_PROMPTS = [f"a clinical photograph of {d}" for d in DISEASES]
 
-        similarity = (img_feat @ txt_feat.T)[0]
-
-    scores = similarity.softmax(dim=0).tolist()
+def _rank(scores):
     ranked = sorted(zip(DISEASES, scores), key=lambda x: x[1], reverse=True)
 
     return {
@@ -48,3 +38,45 @@ def clip_predict(image_path):
         "confidence": ranked[0][1],   # DO NOT compare numerically
         "top5": ranked[:5]
     }
+
+
+def clip_scores(imgs, bundle=None, precision=CLIP_PRECISION):
+    """
+    imgs: list of sources / PIL images (bicubic resize + centre crop,
+    as open_clip's preprocess), or an (N, 224, 224, 3) uint8 batch
+    already resized that way.
+    Returns (N, len(DISEASES)) softmax scores. `bundle` (model,
+    preprocess, tokenizer) and `precision` default to the served CLIP;
+    precision_check passes its own.
+    """
+    model, _, tokenizer = bundle or models.get("clip")
+
+    with stage_timer("clip_preprocess"):
+        u8 = as_uint8_batch(imgs, mode="clip")
+        x = clip_normalize(u8, out=buffer("clip_input", u8.shape))
+        images = torch.from_numpy(x)
+
+    # Cached + normalised once per (model, prompts)
+    txt_feat = get_text_features(
+        model, tokenizer, TEXT_PROMPTS, CLIP_ARCH, CLIP_PRETRAINED
+    )
+
+    with torch.no_grad():
+        with stage_timer("clip_image_encode"), image_autocast(precision):
+            img_feat = model.encode_image(images).float()
+
+        with stage_timer("clip_scoring"):
+            img_feat /= img_feat.norm(dim=-1, keepdim=True)
+            similarity = img_feat @ txt_feat.T
+            return similarity.softmax(dim=-1).numpy()
+
+
+def clip_predict_batch(imgs):
+    """
+    imgs: as clip_scores.
+    """
+    return [_rank(row) for row in clip_scores(imgs).tolist()]
+
+
+def clip_predict(img):
+    return clip_predict_batch([img])[0]
@@ -0,0 +1,51 @@
+import contextlib
+import warnings
+
+import torch
+
+from ml_code.config import CLIP_PRECISION
+
+PRECISIONS = ("fp32", "int8", "bf16")
+
+
+def cpu_supports_bf16():
+    """
+    True on CPUs with native bf16 math (AVX512-BF16 / AMX). Elsewhere
+    bf16 autocast is emulated and slower than fp32.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def resolve_precision(precision=CLIP_PRECISION):
+    if precision not in PRECISIONS:
+        raise ValueError(
+            f"Unknown CLIP_PRECISION '{precision}', expected one of {PRECISIONS}"
+        )
+    if precision == "bf16" and not cpu_supports_bf16():
+        warnings.warn("CPU has no native bf16 support, using fp32 for CLIP")
+        return "fp32"
+    return precision
+
+
+def apply_precision(model, precision):
+    """
+    int8: dynamic INT8 quantization of the image encoder's nn.Linear
+    layers (weights int8, activations quantized on the fly). Text
+    encoding is untouched, so cached text features stay valid.
+    """
+    if precision == "int8":
+        model.visual = torch.ao.quantization.quantize_dynamic(
+            model.visual, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model
+
+
+def image_autocast(precision):
+    if precision == "bf16":
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
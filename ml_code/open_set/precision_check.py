@@ -0,0 +1,98 @@
+"""
+How much does CLIP_PRECISION change the open-set disease ranking?
+
+    python -m ml_code.open_set.precision_check --limit 500
+
+Scores VAL_DIR images through the served clip_scores() path (same
+decode, bicubic resize + crop and normalisation as serving) with the
+fp32 image encoder and with each reduced precision mode, then reports
+top-1 agreement, exact top-5 set agreement and per-disease top-5
+membership flips (what hybrid_decision looks at), plus per-image
+latency of the whole served path.
+"""
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from ml_code.config import VAL_DIR
+from ml_code.clip_registry import get_open_clip
+from ml_code.hybrid.decision import CLIP_TOP_K
+from ml_code.open_set.clip_predict import (
+    CLIP_ARCH, CLIP_PRETRAINED, clip_scores,
+)
+from ml_code.open_set.precision import apply_precision, cpu_supports_bf16
+
+EXTS = (".jpg", ".jpeg", ".png")
+
+
+def score_all(bundle, paths, precision, batch_size=32):
+    """
+    Scores through clip_predict.clip_scores, the function serving calls,
+    so decode / resize / normalisation are the served ones.
+    """
+    scores = []
+    total_ms = 0.0
+
+    for i in range(0, len(paths), batch_size):
+        t0 = time.perf_counter()
+        scores.append(clip_scores(paths[i:i + batch_size], bundle, precision))
+        total_ms += (time.perf_counter() - t0) * 1000
+
+    return np.concatenate(scores), total_ms / len(paths)
+
+
+def compare(ref, other, k=CLIP_TOP_K):
+    ref_top = np.argsort(-ref, axis=1)[:, :k]
+    oth_top = np.argsort(-other, axis=1)[:, :k]
+
+    ref_member = np.zeros_like(ref, dtype=bool)
+    oth_member = np.zeros_like(other, dtype=bool)
+    rows = np.arange(len(ref))[:, None]
+    ref_member[rows, ref_top] = True
+    oth_member[rows, oth_top] = True
+
+    flips = ref_member != oth_member
+    return {
+        "top1_agreement": float((ref_top[:, 0] == oth_top[:, 0]).mean()),
+        f"top{k}_set_agreement": float((~flips).all(axis=1).mean()),
+        "images_with_membership_flip": float(flips.any(axis=1).mean()),
+        "membership_flips_per_image": float(flips.sum(axis=1).mean() / 2),
+        "max_abs_prob_diff": float(np.abs(ref - other).max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=500,
+                        help="Max validation images (0 = all)")
+    parser.add_argument("--modes", default="int8,bf16")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in VAL_DIR.rglob("*") if p.suffix.lower() in EXTS)
+    paths = paths[:args.limit] if args.limit else paths
+    if not paths:
+        raise SystemExit(f"No validation images under {VAL_DIR}")
+
+    base, preprocess, tokenizer = get_open_clip(CLIP_ARCH, CLIP_PRETRAINED)
+
+    print(f"Images: {len(paths)}")
+    ref, ref_ms = score_all((base, preprocess, tokenizer), paths, "fp32")
+    print(f"fp32: {ref_ms:.1f} ms/image (served path)")
+
+    for mode in args.modes.split(","):
+        if mode == "bf16" and not cpu_supports_bf16():
+            print("bf16: skipped, CPU has no native bf16")
+            continue
+
+        model = apply_precision(copy.deepcopy(base), mode) if mode == "int8" else base
+        scores, ms = score_all((model, preprocess, tokenizer), paths, mode)
+
+        print(f"\n{mode}: {ms:.1f} ms/image (served path, x{ref_ms / ms:.2f} vs fp32)")
+        for key, value in compare(ref, scores).items():
+            print(f"  {key:<30} {value:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,48 +5,50 @@ Uses canonical config paths from ml_code.config.
 """
 from ml_code.config import CNN_MODEL, RF_MODEL, XGB_MODEL, CLASSES_JSON, IMG_SIZE
 import json
+import threading
 import numpy as np
 import warnings
 
-# lazy loaders
+from ml_code.ensemble.features import ensemble_proba
+
+# lazy loaders (guarded so concurrent threads never double-load)
 keras_model = None
 rf_model = None
 xgb_model = None
 CLASSES = None
+_load_lock = threading.Lock()
 
 def _load_classes():
     global CLASSES
-    if CLASSES is None and CLASSES_JSON.exists():
-        with open(CLASSES_JSON, "r") as f:
-            CLASSES = json.load(f)
+    with _load_lock:
+        if CLASSES is None and CLASSES_JSON.exists():
+            with open(CLASSES_JSON, "r") as f:
+                CLASSES = json.load(f)
 
 def _load_keras():
     global keras_model
     if keras_model is None and CNN_MODEL.exists():
         try:
-            from tensorflow.keras.models import load_model
-            keras_model = load_model(str(CNN_MODEL))
+            from ml_code.model_manager import models
+            keras_model = models.get("cnn")
         except Exception as e:
             warnings.warn(f"Keras load failed: {e}")
 
 def _load_rf_xgb():
     global rf_model, xgb_model
-    try:
-        import joblib
-        if rf_model is None and RF_MODEL.exists():
-            rf_model = joblib.load(str(RF_MODEL))
-        if xgb_model is None and XGB_MODEL.exists():
-            xgb_model = joblib.load(str(XGB_MODEL))
-    except Exception:
-        pass
+    with _load_lock:
+        try:
+            import joblib
+            if rf_model is None and RF_MODEL.exists():
+                rf_model = joblib.load(str(RF_MODEL))
+            if xgb_model is None and XGB_MODEL.exists():
+                xgb_model = joblib.load(str(XGB_MODEL))
+        except Exception:
+            pass
 
 def _preprocess(img_pil, size=IMG_SIZE):
-    from PIL import Image
-    if img_pil.mode != "RGB":
-        img_pil = img_pil.convert("RGB")
-    img_pil = img_pil.resize(size)
-    arr = np.array(img_pil).astype("float32") / 255.0
-    return np.expand_dims(arr, 0)
+    from ml_code.preprocessing import decode, cnn_normalize
+    return cnn_normalize(decode(img_pil, size)[None])
 
 def predict_from_pil(img_pil):
     _load_classes()
@@ -64,28 +66,11 @@ def predict_from_pil(img_pil):
         preds.append(out)
         n_classes = out.shape[0]
 
-    # embedding-based models (optional)
-    try:
-        from ml_code.extract_embeddings import compute_embedding_for_pil
-        features = compute_embedding_for_pil(img_pil)
-    except Exception:
-        features = None
-
-    if features is not None and rf_model is not None:
-        try:
-            proba = rf_model.predict_proba(features.reshape(1, -1)).reshape(-1)
-            preds.append(proba)
-            n_classes = proba.shape[0] if n_classes is None else n_classes
-        except Exception:
-            pass
-
-    if features is not None and xgb_model is not None:
-        try:
-            proba = xgb_model.predict_proba(features.reshape(1, -1)).reshape(-1)
-            preds.append(proba)
-            n_classes = proba.shape[0] if n_classes is None else n_classes
-        except Exception:
-            pass
+    # RF / XGB were fitted on the calibrated CNN probabilities
+    # (ensemble.features); a mismatched model raises
+    for model in (rf_model, xgb_model):
+        if model is not None and keras_model is not None:
+            preds.append(ensemble_proba(model, out[None]).reshape(-1))
 
     if not preds:
         raise RuntimeError("No models available to make predictions")
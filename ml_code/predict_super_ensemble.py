@@ -6,27 +6,27 @@ import random
 import os
 
 import joblib
-import tensorflow as tf
 
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+from ml_code.config import (
+    CLASSES_JSON,
+    CNN_BACKEND,
+)
+from ml_code.preprocessing import decode, cnn_normalize
 
 os.environ["PYTHONHASHSEED"] = "42"
 random.seed(42)
 np.random.seed(42)
-tf.random.set_seed(42)
 
-from ml_code.config import (
-    CNN_MODEL,
-    CLASSES_JSON,
-    IMG_SIZE,
-)
+# TensorFlow is only imported when it actually serves the CNN
+if CNN_BACKEND == "keras":
+    import tensorflow as tf
+    tf.random.set_seed(42)
+from ml_code.model_manager import models
 
 # ======================================================
 # Global cached models
 # ======================================================
 keras_model = None
-embedding_model = None
 LABELS_BY_INDEX = None
 
 
@@ -54,46 +54,34 @@ def load_classes():
 # Preprocess image for CNN
 # ======================================================
 def preprocess_for_cnn(img):
-    if img.mode != "RGB":
-        img = img.convert("RGB")
-    img = img.resize(IMG_SIZE)
-    arr = np.array(img).astype("float32") / 255.0
-    return np.expand_dims(arr, axis=0)
+    return cnn_normalize(decode(img)[None])
 
 
 # ======================================================
-# Load models (lazy loading)
+# Load models (lazy, single-flight via model_manager)
 # ======================================================
 def load_models():
-    global keras_model, rf_model, embedding_model
+    global keras_model
 
     if keras_model is None:
-        keras_model = tf.keras.models.load_model(str(CNN_MODEL))
-        print("Loaded Keras model:", CNN_MODEL)
-
-    if embedding_model is None:
-        embedding_model = MobileNetV2(
-            weights="imagenet",
-            include_top=False,
-            pooling="avg",              # 1280-D embedding
-            input_shape=(IMG_SIZE[0], IMG_SIZE[1], 3),
-        )
+        keras_model = models.get("cnn")
 
 
 # ======================================================
-# Compute 1280-D embedding
+# One CNN forward -> class probs + 1280-D embedding
 # ======================================================
-def compute_embedding(img):
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+def cnn_forward(img):
+    """
+    The fine-tuned CNN is itself a MobileNetV2, so its pooled backbone
+    output is the embedding; no second ImageNet model is needed.
+    """
+    load_models()
+    probs, emb = keras_model.predict_with_embedding(preprocess_for_cnn(img))
+    return probs[0], emb  # (num_classes,), (1, 1280)
 
-    img = img.resize(IMG_SIZE)
-    arr = np.array(img).astype("float32")
-    arr = preprocess_input(arr)
-    arr = np.expand_dims(arr, axis=0)
 
-    emb = embedding_model.predict(arr, verbose=0)
-    return emb  # shape (1, 1280)
+def compute_embedding(img):
+    return cnn_forward(img)[1]
 
 
 # ======================================================
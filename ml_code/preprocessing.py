@@ -0,0 +1,213 @@
+# ml_code/preprocessing.py
+
+import io
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from ml_code.config import IMG_SIZE
+
+# Decode once, then each model gets the resize it was trained with:
+#   cnn   NEAREST squash (keras flow_from_directory / load_img default)
+#   clip  BICUBIC shortest side -> 224 + centre crop (open_clip / clip
+#         preprocess)
+#   vit   BILINEAR squash, antialiased (torchvision Resize((224, 224)))
+RESIZE_MODES = {
+    "cnn": (Image.NEAREST, False),
+    "clip": (Image.BICUBIC, True),
+    "vit": (Image.BILINEAR, False),
+}
+RESAMPLE = RESIZE_MODES["cnn"][0]
+
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+# ======================================================
+# Decode any image source ONCE
+# ======================================================
+def load_image(src):
+    """
+    Decode an image source into an RGB PIL image.
+
+    Accepts:
+        - str / Path        (file on disk)
+        - bytes / bytearray (encoded upload body)
+        - file-like object  (e.g. UploadFile.file)
+        - PIL.Image.Image
+        - np.ndarray        (HxW or HxWx3 uint8, RGB order)
+    """
+    if isinstance(src, Image.Image):
+        img = src
+
+    elif isinstance(src, np.ndarray):
+        if src.dtype != np.uint8:
+            raise ValueError(f"Expected uint8 array, got {src.dtype}")
+        img = Image.fromarray(src)
+
+    elif isinstance(src, (bytes, bytearray, memoryview)):
+        img = Image.open(io.BytesIO(src))
+
+    elif isinstance(src, (str, Path)):
+        img = Image.open(src)
+
+    elif hasattr(src, "read"):
+        img = Image.open(src)
+
+    else:
+        raise TypeError(f"Unsupported image source: {type(src).__name__}")
+
+    # Force the lazy PIL decode so corrupt uploads fail here
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    else:
+        img.load()
+
+    return img
+
+
+# ======================================================
+# Per-model resize into a 224x224 uint8 buffer
+# ======================================================
+def resize(img, size=IMG_SIZE, mode="cnn"):
+    """
+    PIL image -> PIL image of `size`, the way `mode` (see RESIZE_MODES)
+    was trained / evaluated.
+    """
+    resample, crop = RESIZE_MODES[mode]
+    tw, th = size
+    if not crop:
+        return img if img.size == (tw, th) else img.resize((tw, th), resample)
+
+    # torchvision Resize(int) + CenterCrop, as in the CLIP transforms
+    w, h = img.size
+    short = max(tw, th)
+    if w <= h:
+        nw, nh = short, int(short * h / w)
+    else:
+        nw, nh = int(short * w / h), short
+    if (nw, nh) != (w, h):
+        img = img.resize((nw, nh), resample)
+    left = int(round((nw - tw) / 2.0))
+    top = int(round((nh - th) / 2.0))
+    return img.crop((left, top, left + tw, top + th))
+
+
+def decode(src, size=IMG_SIZE, mode="cnn"):
+    """
+    Any image source -> (H, W, 3) uint8 RGB at the model input size.
+    """
+    return np.asarray(resize(load_image(src), size, mode), dtype=np.uint8)
+
+
+def decode_batch(srcs, size=IMG_SIZE, out=None, mode="cnn"):
+    """
+    Decode + resize every source into one (N, H, W, 3) uint8 array.
+    Already decoded PIL images are only resized.
+    """
+    srcs = list(srcs)
+    shape = (len(srcs), size[1], size[0], 3)
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+
+    for i, src in enumerate(srcs):
+        out[i] = resize(load_image(src), size, mode)
+    return out
+
+
+def as_uint8_batch(imgs, out=None, mode="cnn"):
+    """
+    Pass an (N, H, W, 3) uint8 batch through (already resized for this
+    model), decode + resize anything else with `mode`.
+    """
+    if isinstance(imgs, np.ndarray) and imgs.dtype == np.uint8 and imgs.ndim == 4:
+        return imgs
+    return decode_batch(imgs, out=out, mode=mode)
+
+
+# ======================================================
+# Per-thread scratch buffers
+# ======================================================
+_local = threading.local()
+
+
+def buffer(name, shape, dtype=np.float32):
+    """
+    Scratch array owned by the calling thread, reused across requests
+    and grown when a larger batch arrives. The contents are only valid
+    until the same thread asks for `name` again.
+    """
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = {}
+
+    shape = tuple(shape)
+    buf = pool.get(name)
+    if (buf is None or buf.dtype != dtype or buf.shape[1:] != shape[1:]
+            or buf.shape[0] < shape[0]):
+        buf = pool[name] = np.empty(shape, dtype=dtype)
+    return buf[:shape[0]]
+
+
+# ======================================================
+# Model-specific normalisation (NumPy, no framework import)
+#   uint8 (..., H, W, 3) -> float32, written into `out` when given
+# ======================================================
+def _affine(x, scale, shift, out):
+    # x * scale - shift in two in-place passes, no temporaries
+    x = np.asarray(x)
+    if out is None:
+        out = np.empty(x.shape, dtype=np.float32)
+    np.multiply(x, np.asarray(scale, dtype=np.float32), out=out)
+    np.subtract(out, np.asarray(shift, dtype=np.float32), out=out)
+    return out
+
+
+def mobilenet_preprocess(x, out=None):
+    """
+    Same as keras mobilenet_v2.preprocess_input: [0, 255] -> [-1, 1].
+    """
+    return _affine(x, 1 / 127.5, 1.0, out)
+
+
+def unit_scale(x, out=None):
+    """
+    [0, 255] -> [0, 1], the rescale=1/255 used by train_cnn.py.
+    """
+    return _affine(x, 1 / 255.0, 0.0, out)
+
+
+def cnn_normalize(x, out=None):
+    """
+    The CNN's input scaling, used by every CNN caller (serving, TTA,
+    INT8 calibration, ONNX parity). The model was trained with
+    rescale=1/255, so this is unit_scale; keep them the same function.
+    """
+    return unit_scale(x, out)
+
+
+def _mean_std(x, mean, std, out):
+    # ((x / 255) - mean) / std == x * (1 / (255 * std)) - mean / std
+    std = np.asarray(std, dtype=np.float64)
+    mean = np.asarray(mean, dtype=np.float64)
+    out = _affine(x, 1.0 / (255.0 * std), mean / std, out)
+    # NHWC -> NCHW view (channels_last memory), no copy
+    return np.moveaxis(out, -1, -3)
+
+
+def clip_normalize(x, out=None):
+    """
+    CLIP image normalisation -> (N, 3, H, W) for torch.from_numpy().
+    """
+    return _mean_std(x, CLIP_MEAN, CLIP_STD, out)
+
+
+def imagenet_normalize(x, out=None):
+    """
+    torchvision ImageNet normalisation (timm ViT) -> (N, 3, H, W).
+    """
+    return _mean_std(x, IMAGENET_MEAN, IMAGENET_STD, out)
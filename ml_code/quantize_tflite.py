@@ -0,0 +1,193 @@
+# ml_code/quantize_tflite.py
+"""
+Post-training INT8 quantization of the CNN + accuracy-regression harness.
+
+    python -m ml_code.quantize_tflite              # write CNN_TFLITE_INT8
+    python -m ml_code.quantize_tflite --eval       # float vs INT8 report
+
+Calibration images come from VAL_DIR and are scaled with
+preprocessing.cnn_normalize, the function every serving path uses, so
+the INT8 input quantizer sees the same range it will be fed. --eval
+scores both models through ensemble.predict.cnn_probs_batch, i.e. the
+/predict code path, not a separate loader.
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from ml_code.config import (
+    CNN_MODEL,
+    CNN_TFLITE_INT8,
+    CLASSES_JSON,
+    TEMPERATURE_NPY,
+    VAL_DIR,
+    RANDOM_SEED,
+)
+from ml_code.preprocessing import decode, decode_batch, cnn_normalize
+from ml_code.ensemble.features import calibrate
+
+# Classes whose recall must not regress
+CRITICAL_CLASSES = ["Melanoma", "Basal_Cell_Carcinoma"]
+
+EXTS = (".jpg", ".jpeg", ".png")
+
+
+# ======================================================
+# Validation data
+# ======================================================
+def val_samples():
+    with open(CLASSES_JSON) as f:
+        class_to_idx = json.load(f)
+
+    samples = []
+    for cls, idx in class_to_idx.items():
+        cls_dir = VAL_DIR / cls
+        if not cls_dir.is_dir():
+            continue
+        for p in sorted(cls_dir.iterdir()):
+            if p.suffix.lower() in EXTS:
+                samples.append((p, int(idx)))
+    return samples, class_to_idx
+
+
+def load_normalized(path):
+    return cnn_normalize(decode(path))
+
+
+# ======================================================
+# Quantize
+# ======================================================
+def quantize(num_calibration=300):
+    import tensorflow as tf
+    from ml_code.cnn_backends import with_embedding
+
+    samples, _ = val_samples()
+    if not samples:
+        raise SystemExit(f"No calibration images under {VAL_DIR}")
+
+    rng = random.Random(RANDOM_SEED)
+    calib = rng.sample(samples, min(num_calibration, len(samples)))
+
+    def representative_dataset():
+        for path, _ in calib:
+            yield [np.expand_dims(load_normalized(path), 0)]
+
+    # Quantize the two-output view so TFLiteCNN can serve embeddings too
+    model = with_embedding(tf.keras.models.load_model(CNN_MODEL, compile=False))
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # Keep float32 I/O so callers don't change; (de)quantize is in-graph
+    converter.inference_input_type = tf.float32
+    converter.inference_output_type = tf.float32
+
+    CNN_TFLITE_INT8.write_bytes(converter.convert())
+    print(f"Saved INT8 model: {CNN_TFLITE_INT8} "
+          f"({CNN_TFLITE_INT8.stat().st_size / 1e6:.1f} MB, "
+          f"float: {CNN_MODEL.stat().st_size / 1e6:.1f} MB)")
+
+
+# ======================================================
+# Metrics
+# ======================================================
+def expected_calibration_error(probs, y, n_bins=15):
+    conf = probs.max(axis=1)
+    correct = probs.argmax(axis=1) == y
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+
+    ece = 0.0
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        mask = (conf > lo) & (conf <= hi)
+        if mask.any():
+            ece += mask.mean() * abs(correct[mask].mean() - conf[mask].mean())
+    return float(ece)
+
+
+def evaluate(backend, samples, class_to_idx, T, batch_size=32):
+    # Same preprocessing + forward as /predict (cnn_probs_batch)
+    from ml_code.ensemble.predict import cnn_probs_batch
+
+    probs = []
+    latencies = []
+
+    for i in range(0, len(samples), batch_size):
+        u8 = decode_batch([p for p, _ in samples[i:i + batch_size]])
+        probs.append(cnn_probs_batch(u8, model=backend))
+
+    # Per-image latency at batch size 1
+    u1 = decode_batch([samples[0][0]])
+    cnn_probs_batch(u1, model=backend)
+    for _ in range(50):
+        t0 = time.perf_counter()
+        cnn_probs_batch(u1, model=backend)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    probs = np.concatenate(probs)
+    y = np.array([label for _, label in samples])
+    pred = probs.argmax(axis=1)
+
+    recall = {}
+    for cls, idx in class_to_idx.items():
+        mask = y == idx
+        if mask.any():
+            recall[cls] = float((pred[mask] == idx).mean())
+
+    return {
+        "top1": float((pred == y).mean()),
+        "recall": recall,
+        "ece_calibrated": expected_calibration_error(calibrate(probs, T), y),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "pred": pred,
+    }
+
+
+def run_eval():
+    from ml_code.cnn_backends import KerasCNN, TFLiteCNN
+    from ml_code.export_onnx import report
+
+    samples, class_to_idx = val_samples()
+    if not samples:
+        raise SystemExit(f"No validation images under {VAL_DIR}")
+    T = float(np.load(TEMPERATURE_NPY))
+
+    print(f"Validation images: {len(samples)}, temperature: {T:.3f}\n")
+    results = {
+        "float": evaluate(KerasCNN(), samples, class_to_idx, T),
+        "int8": evaluate(TFLiteCNN(), samples, class_to_idx, T),
+    }
+    f, q = results["float"], results["int8"]
+
+    print(f"{'metric':<28} {'float':>8} {'int8':>8} {'delta':>8}")
+    rows = [("top-1 accuracy", f["top1"], q["top1"]),
+            ("ECE (after temperature)", f["ece_calibrated"], q["ece_calibrated"])]
+    for cls in class_to_idx:
+        if cls in f["recall"]:
+            mark = " *" if cls in CRITICAL_CLASSES else ""
+            rows.append((f"recall {cls}{mark}", f["recall"][cls], q["recall"][cls]))
+    for name, a, b in rows:
+        print(f"{name:<28} {a:>8.4f} {b:>8.4f} {b - a:>+8.4f}")
+
+    agree = float((f["pred"] == q["pred"]).mean())
+    print(f"{'top-1 agreement':<28} {agree:>8.4f}")
+    print(f"{'p50 latency ms (bs=1)':<28} {f['p50_ms']:>8.2f} {q['p50_ms']:>8.2f} "
+          f"{'x%.2f' % (f['p50_ms'] / q['p50_ms']):>8}")
+
+    print("\nStandalone startup / RSS / latency:")
+    report(backends=("keras", "tflite"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval", action="store_true",
+                        help="Compare float and INT8 models on VAL_DIR")
+    parser.add_argument("--calibration-images", type=int, default=300)
+    args = parser.parse_args()
+
+    if args.eval:
+        run_eval()
+    else:
+        quantize(args.calibration_images)
@@ -0,0 +1,114 @@
+"""
+Train/serve resize parity for CLIP and the ViT on VAL_DIR.
+
+    python -m ml_code.resize_parity --limit 500
+
+Reference is each model's own preprocessing (open_clip's `preprocess`;
+the ViT training transform Resize((224, 224)) + ToTensor + Normalize).
+It is compared with the served path (ml_code.preprocessing.decode with
+the model's resize mode) and with the old shared NEAREST squash, so the
+table shows what the per-model resize buys back.
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from ml_code.config import VAL_DIR
+from ml_code.preprocessing import (
+    IMAGENET_MEAN, IMAGENET_STD, load_image, decode_batch,
+    clip_normalize, imagenet_normalize,
+)
+from ml_code.clip_text_cache import get_text_features
+from ml_code.model_manager import models
+from ml_code.open_set.clip_predict import (
+    CLIP_ARCH, CLIP_PRETRAINED, TEXT_PROMPTS, clip_scores,
+)
+from ml_code.open_set.precision_check import EXTS, compare
+
+
+def _chunks(paths, batch_size):
+    for i in range(0, len(paths), batch_size):
+        yield [load_image(p) for p in paths[i:i + batch_size]]
+
+
+def _report(name, input_diff, ref, served, squash, k):
+    print(f"\n{name}: max |input diff| served vs reference {input_diff:.5f}")
+    for label, scores in (("served", served), ("old nearest", squash)):
+        print(f"  {label}")
+        for key, value in compare(ref, scores, k=k).items():
+            print(f"    {key:<30} {value:.4f}")
+
+
+def clip_parity(paths, batch_size=32):
+    bundle = models.get("clip")
+    model, preprocess, tokenizer = bundle
+    txt_feat = get_text_features(
+        model, tokenizer, TEXT_PROMPTS, CLIP_ARCH, CLIP_PRETRAINED
+    )
+
+    ref, served, squash, diff = [], [], [], 0.0
+    with torch.no_grad():
+        for imgs in _chunks(paths, batch_size):
+            x = torch.stack([preprocess(im) for im in imgs])
+            feat = model.encode_image(x).float()
+            feat /= feat.norm(dim=-1, keepdim=True)
+            ref.append((feat @ txt_feat.T).softmax(dim=-1).numpy())
+
+            u8 = decode_batch(imgs, mode="clip")
+            diff = max(diff, float(np.abs(clip_normalize(u8) - x.numpy()).max()))
+            served.append(clip_scores(u8, bundle, "fp32"))
+            squash.append(clip_scores(decode_batch(imgs, mode="cnn"), bundle, "fp32"))
+
+    return diff, np.concatenate(ref), np.concatenate(served), np.concatenate(squash)
+
+
+def vit_parity(paths, batch_size=32):
+    from torchvision import transforms
+    from ml_code.vit.vit_predict import load_vit, vit_predict_batch
+
+    # Eager module: the reference skips the uint8 wrapper's normalisation
+    classifier = load_vit(prefer_torchscript=False).classifier
+    device = next(classifier.parameters()).device
+    train_tf = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD),
+    ])
+
+    ref, served, squash, diff = [], [], [], 0.0
+    with torch.inference_mode():
+        for imgs in _chunks(paths, batch_size):
+            x = torch.stack([train_tf(im) for im in imgs])
+            ref.append(torch.softmax(classifier(x.to(device)), dim=1).cpu().numpy())
+
+            u8 = decode_batch(imgs, mode="vit")
+            diff = max(diff, float(np.abs(imagenet_normalize(u8) - x.numpy()).max()))
+            served.append(vit_predict_batch(u8))
+            squash.append(vit_predict_batch(decode_batch(imgs, mode="cnn")))
+
+    return diff, np.concatenate(ref), np.concatenate(served), np.concatenate(squash)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=500,
+                        help="Max validation images (0 = all)")
+    parser.add_argument("--models", default="clip,vit")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in VAL_DIR.rglob("*") if p.suffix.lower() in EXTS)
+    paths = paths[:args.limit] if args.limit else paths
+    if not paths:
+        raise SystemExit(f"No validation images under {VAL_DIR}")
+    print(f"Images: {len(paths)}")
+
+    wanted = args.models.split(",")
+    if "clip" in wanted:
+        _report("clip", *clip_parity(paths), k=5)
+    if "vit" in wanted:
+        _report("vit", *vit_parity(paths), k=3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# ml_code/runtime.py
+
+import json
+import os
+import threading
+import warnings
+
+from ml_code.config import (
+    CNN_BACKEND,
+    PARALLEL_BRANCHES,
+    TF_INTRA_OP_THREADS,
+    TF_INTER_OP_THREADS,
+    TORCH_NUM_THREADS,
+    RUNTIME_TUNING_JSON,
+)
+
+_configured = None
+_tuned = {}          # parallel -> settings ({} when unusable)
+_lock = threading.Lock()
+
+
+# ======================================================
+# Auto-tuned settings (python -m ml_code.tune_runtime)
+# ======================================================
+def tuned_settings(parallel=PARALLEL_BRANCHES):
+    """
+    Settings from RUNTIME_TUNING_JSON, or {} if the file is missing or
+    was tuned for another core count, CNN backend or branch mode.
+    Read (and warned about) once per process.
+    """
+    parallel = bool(parallel)
+    with _lock:
+        if parallel not in _tuned:
+            _tuned[parallel] = _load_tuned(parallel)
+        return _tuned[parallel]
+
+
+def _load_tuned(parallel):
+    try:
+        with open(RUNTIME_TUNING_JSON) as f:
+            tuned = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if (tuned.get("cpus") != os.cpu_count()
+            or tuned.get("cnn_backend") != CNN_BACKEND
+            or tuned.get("parallel_branches") != parallel):
+        warnings.warn(
+            f"{RUNTIME_TUNING_JSON} was tuned for another machine/config, ignoring"
+        )
+        return {}
+    return tuned
+
+
+# ======================================================
+# Thread budgets
+# ======================================================
+def thread_budget(parallel=PARALLEL_BRANCHES):
+    """
+    Returns {"tf_intra", "tf_inter", "torch"} thread counts.
+
+    When the CNN (TF) and CLIP (PyTorch) branches overlap, each runtime
+    gets its own share of the cores instead of both spawning one thread
+    per core and fighting over them. Explicit config values win, then
+    auto-tuned ones, then the split below.
+    """
+    cores = os.cpu_count() or 1
+    tuned = tuned_settings(parallel)
+
+    if parallel:
+        tf_share = max(1, cores // 2)
+        torch_share = max(1, cores - tf_share)
+    else:
+        tf_share = torch_share = cores
+
+    return {
+        "tf_intra": TF_INTRA_OP_THREADS or tuned.get("tf_intra") or tf_share,
+        "tf_inter": (TF_INTER_OP_THREADS or tuned.get("tf_inter")
+                     or (1 if parallel else 2)),
+        "torch": TORCH_NUM_THREADS or tuned.get("torch") or torch_share,
+    }
+
+
+def configure_threads(parallel=PARALLEL_BRANCHES):
+    """
+    Applies thread_budget() to TensorFlow and PyTorch (once per process).
+    Must run before the first TF op, so call it before loading models.
+    """
+    global _configured
+
+    with _lock:
+        if _configured is None:
+            _configured = _apply(thread_budget(parallel))
+    return _configured
+
+
+def _apply(budget):
+    # ONNX / TFLite backends take their share via their own options
+    # and must not pull in the full TensorFlow runtime
+    if CNN_BACKEND == "keras":
+        try:
+            import tensorflow as tf
+            tf.config.threading.set_intra_op_parallelism_threads(budget["tf_intra"])
+            tf.config.threading.set_inter_op_parallelism_threads(budget["tf_inter"])
+        except ImportError:
+            pass
+        except RuntimeError as e:
+            # TF refuses once its runtime is initialised
+            warnings.warn(f"TF thread budget not applied: {e}")
+
+    try:
+        import torch
+        torch.set_num_threads(budget["torch"])
+    except ImportError:
+        pass
+
+    return budget
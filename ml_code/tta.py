@@ -0,0 +1,151 @@
+# ml_code/tta.py
+"""
+Batched test-time augmentation for the CNN.
+
+Each view (flips, small rotations, multi-crop) is a fixed pixel index
+map over the shared 224x224 uint8 buffer, so all views of all
+low-confidence images come out of one NumPy gather and go through one
+forward pass. Images at or above CNN_CONF_THRESHOLD are never touched.
+
+    python -m ml_code.tta --limit 1000     # accuracy / latency on VAL_DIR
+"""
+import argparse
+import functools
+import time
+
+import numpy as np
+
+from ml_code.hybrid.decision import CNN_CONF_THRESHOLD
+from ml_code.preprocessing import buffer
+
+TTA_ROTATIONS = (-10, 10)   # degrees
+TTA_CROP = 0.875            # side of each of the 5 crops, relative
+
+
+# ======================================================
+# Views as index maps
+# ======================================================
+@functools.lru_cache(maxsize=4)
+def view_index(h, w):
+    """
+    (V, h*w) flat source-pixel indices, one row per view.
+    """
+    ys, xs = np.mgrid[0:h, 0:w]
+    maps = [
+        (ys, xs[:, ::-1]),      # horizontal flip
+        (ys[::-1], xs),         # vertical flip
+    ]
+
+    # Inverse rotation about the centre, nearest pixel, edges clamped
+    cy, cx = (h - 1) / 2, (w - 1) / 2
+    for deg in TTA_ROTATIONS:
+        t = np.deg2rad(deg)
+        sy = cy + (ys - cy) * np.cos(t) - (xs - cx) * np.sin(t)
+        sx = cx + (ys - cy) * np.sin(t) + (xs - cx) * np.cos(t)
+        maps.append((np.clip(np.rint(sy), 0, h - 1).astype(np.intp),
+                     np.clip(np.rint(sx), 0, w - 1).astype(np.intp)))
+
+    # Four corners + centre, each scaled back up to h x w (nearest)
+    ch, cw = int(h * TTA_CROP), int(w * TTA_CROP)
+    ry = (np.arange(h) * ch // h).astype(np.intp)
+    rx = (np.arange(w) * cw // w).astype(np.intp)
+    for y0, x0 in [(0, 0), (0, w - cw), (h - ch, 0), (h - ch, w - cw),
+                   ((h - ch) // 2, (w - cw) // 2)]:
+        maps.append(np.meshgrid(y0 + ry, x0 + rx, indexing="ij"))
+
+    return np.stack([(my * w + mx).ravel() for my, mx in maps])
+
+
+def tta_views(u8, out=None):
+    """
+    (N, H, W, 3) uint8 -> (N * V, H, W, 3) uint8, each image's V views
+    adjacent. `out`, if given, must be a contiguous array of that shape.
+    """
+    n, h, w, c = u8.shape
+    idx = view_index(h, w)
+    flat = np.ascontiguousarray(u8).reshape(n, h * w, c)
+
+    if out is None:
+        out = np.empty((n * len(idx), h, w, c), dtype=np.uint8)
+    np.take(flat, idx.ravel(), axis=1, out=out.reshape(n, idx.size, c))
+    return out
+
+
+def tta_probs(model, u8, probs, normalize, threshold=CNN_CONF_THRESHOLD):
+    """
+    Re-scores images whose top probability is below `threshold` with the
+    mean over the original and every view. Returns (probs, mask).
+    """
+    low = probs.max(axis=1) < threshold
+    if not low.any():
+        return probs, low
+
+    n = int(low.sum())
+    v = len(view_index(*u8.shape[1:3]))
+    views = tta_views(
+        u8[low], out=buffer("tta_views", (n * v,) + u8.shape[1:], np.uint8)
+    )
+    x = normalize(views, out=buffer("tta_input", views.shape))
+    view_probs = np.asarray(model.predict(x)).reshape(n, -1, probs.shape[1])
+
+    probs = np.array(probs, copy=True)
+    probs[low] = (probs[low] + view_probs.sum(axis=1)) / (view_probs.shape[1] + 1)
+    return probs, low
+
+
+# ======================================================
+# Validation report
+# ======================================================
+def report(limit=0, batch_size=32):
+    from ml_code.quantize_tflite import val_samples
+    from ml_code.preprocessing import decode_batch
+    from ml_code.ensemble.predict import cnn_predict_batch
+
+    samples, _ = val_samples()
+    samples = samples[:limit] if limit else samples
+    if not samples:
+        raise SystemExit("No validation images")
+
+    labels = [p.parent.name for p, _ in samples]
+    cnn_predict_batch(decode_batch([samples[0][0]]), tta=True)   # warm-up
+
+    out = {False: [], True: []}
+    secs = {False: 0.0, True: 0.0}
+    for i in range(0, len(samples), batch_size):
+        u8 = decode_batch([p for p, _ in samples[i:i + batch_size]])
+        for tta in (False, True):
+            t0 = time.perf_counter()
+            out[tta].extend(cnn_predict_batch(u8, tta=tta))
+            secs[tta] += time.perf_counter() - t0
+
+    base, aug = out[False], out[True]
+    fired = np.array([r["confidence"] < CNN_CONF_THRESHOLD for r in base])
+    ok_base = np.array([r["label"] == y for r, y in zip(base, labels)])
+    ok_aug = np.array([r["label"] == y for r, y in zip(aug, labels)])
+    n = len(samples)
+
+    print(f"Images: {n}, threshold {CNN_CONF_THRESHOLD}, "
+          f"views/image: {len(view_index(224, 224))}")
+    print(f"TTA fired on: {fired.mean():.1%} ({int(fired.sum())})")
+    print(f"{'':<24} {'no TTA':>8} {'TTA':>8} {'delta':>8}")
+    print(f"{'top-1 (all)':<24} {ok_base.mean():>8.4f} {ok_aug.mean():>8.4f} "
+          f"{ok_aug.mean() - ok_base.mean():>+8.4f}")
+    if fired.any():
+        a, b = ok_base[fired].mean(), ok_aug[fired].mean()
+        print(f"{'top-1 (TTA fired)':<24} {a:>8.4f} {b:>8.4f} {b - a:>+8.4f}")
+    print(f"{'ms/image (avg)':<24} {secs[False] / n * 1000:>8.2f} "
+          f"{secs[True] / n * 1000:>8.2f} "
+          f"{(secs[True] - secs[False]) / n * 1000:>+8.2f}")
+    if fired.any():
+        print(f"{'added ms / fired image':<24} "
+              f"{(secs[True] - secs[False]) / fired.sum() * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=0,
+                        help="Max validation images (0 = all)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    report(args.limit, args.batch_size)
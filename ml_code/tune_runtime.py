@@ -0,0 +1,204 @@
+# ml_code/tune_runtime.py
+"""
+Pick TF / PyTorch thread budgets and inference workers for this machine.
+
+    python -m ml_code.tune_runtime                       # synthetic image
+    python -m ml_code.tune_runtime --img some.jpg --slo-ms 400
+
+Every candidate split (tf_intra, tf_inter, torch) runs in a fresh
+interpreter, because thread budgets are fixed once TF initialises. Each
+one times what the backend's MicroBatcher does under load: 1..N worker
+threads, each running ml_code.ensemble.predict.predict_batch on full
+batches of --batch-size (BATCH_MAX_SIZE). The fastest (split, workers)
+whose per-batch p95 meets --slo-ms is written to
+config.RUNTIME_TUNING_JSON, which ml_code.runtime and backend.inference
+(INFERENCE_WORKERS = concurrent batches) pick up on the next start.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ml_code.config import (
+    CNN_BACKEND,
+    IMG_SIZE,
+    PARALLEL_BRANCHES,
+    RUNTIME_TUNING_JSON,
+)
+
+
+# ======================================================
+# Candidates
+# ======================================================
+def candidate_splits(cores, parallel=PARALLEL_BRANCHES):
+    """
+    [(tf_intra, tf_inter, torch)], starting with the untuned default
+    of every runtime taking every core.
+    """
+    splits = [(cores, 2, cores)]
+    if parallel:
+        for frac in (0.25, 0.5, 0.75):
+            tf = max(1, round(cores * frac))
+            splits.append((tf, 1, max(1, cores - tf)))
+    # Fewer threads per runtime, more requests in flight
+    for per in (1, 2, max(1, cores // 4)):
+        splits.append((per, 1, per))
+    return list(dict.fromkeys(splits))
+
+
+def parse_splits(text):
+    return [tuple(int(v) for v in s.split(":")) for s in text.split(",")]
+
+
+# ======================================================
+# Probe (runs in a child process)
+# ======================================================
+def _input(img):
+    if img:
+        return img
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.uint8)
+
+
+def probe(img, levels, runs, batch_size):
+    from ml_code.ensemble.predict import predict_batch
+    from ml_code.runtime import configure_threads
+
+    budget = configure_threads()
+    batch = [_input(img)] * batch_size
+    predict_batch(batch)   # load + warm
+
+    def timed(_):
+        t0 = time.perf_counter()
+        predict_batch(batch)
+        return time.perf_counter() - t0
+
+    for c in levels:
+        with ThreadPoolExecutor(max_workers=c) as pool:
+            t0 = time.perf_counter()
+            lat = list(pool.map(timed, range(runs * c)))
+            wall = time.perf_counter() - t0
+
+        print(json.dumps({
+            **budget,
+            "concurrency": c,
+            "batch_size": batch_size,
+            "throughput_ips": round(len(lat) * batch_size / wall, 2),
+            "p50_ms": round(float(np.percentile(lat, 50)) * 1000, 1),
+            "p95_ms": round(float(np.percentile(lat, 95)) * 1000, 1),
+        }), flush=True)
+
+
+# ======================================================
+# Driver
+# ======================================================
+def run(splits, levels, runs, batch_size, img=None):
+    rows = []
+    for tf_intra, tf_inter, torch_threads in splits:
+        env = dict(
+            os.environ,
+            TF_INTRA_OP_THREADS=str(tf_intra),
+            TF_INTER_OP_THREADS=str(tf_inter),
+            TORCH_NUM_THREADS=str(torch_threads),
+        )
+        cmd = [sys.executable, "-m", "ml_code.tune_runtime", "--probe",
+               "--levels", ",".join(map(str, levels)), "--runs", str(runs),
+               "--batch-size", str(batch_size)]
+        if img:
+            cmd += ["--img", img]
+
+        out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"split {tf_intra}/{tf_inter}/{torch_threads} failed:\n"
+                  f"{out.stderr[-2000:]}")
+            continue
+
+        for line in out.stdout.splitlines():
+            if line.startswith("{"):
+                r = json.loads(line)
+                rows.append(r)
+                print(f"{r['tf_intra']:>8} {r['tf_inter']:>8} {r['torch']:>6} "
+                      f"{r['concurrency']:>5} {r['throughput_ips']:>8} "
+                      f"{r['p50_ms']:>8} {r['p95_ms']:>8}")
+    return rows
+
+
+def pick(rows, slo_ms=None):
+    ok = [r for r in rows if slo_ms is None or r["p95_ms"] <= slo_ms]
+    if not ok:
+        print(f"No setting meets p95 <= {slo_ms} ms, using lowest p95")
+        return min(rows, key=lambda r: r["p95_ms"])
+    return max(ok, key=lambda r: (r["throughput_ips"], -r["p95_ms"]))
+
+
+def save(best):
+    settings = {
+        "cpus": os.cpu_count(),
+        "cnn_backend": CNN_BACKEND,
+        "parallel_branches": bool(PARALLEL_BRANCHES),
+        "tf_intra": best["tf_intra"],
+        "tf_inter": best["tf_inter"],
+        "torch": best["torch"],
+        # Concurrent predict_batch calls (MicroBatcher max_inflight)
+        "inference_workers": best["concurrency"],
+        "batch_size": best["batch_size"],
+        "throughput_ips": best["throughput_ips"],
+        "p95_ms": best["p95_ms"],
+        "tuned_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    RUNTIME_TUNING_JSON.parent.mkdir(parents=True, exist_ok=True)
+    tmp = RUNTIME_TUNING_JSON.with_suffix(".tmp")
+    tmp.write_text(json.dumps(settings, indent=2))
+    os.replace(tmp, RUNTIME_TUNING_JSON)
+    return settings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--img", help="Image to benchmark (default: synthetic)")
+    parser.add_argument("--levels", default=None,
+                        help="Worker counts, e.g. 1,2,4 (default: 1..cores)")
+    parser.add_argument("--runs", type=int, default=10,
+                        help="Batches per worker thread")
+    # backend.batching reads the same variable
+    parser.add_argument("--batch-size", type=int,
+                        default=int(os.getenv("BATCH_MAX_SIZE", "8")),
+                        help="Images per batch (default: BATCH_MAX_SIZE)")
+    parser.add_argument("--splits", default=None,
+                        help="tf_intra:tf_inter:torch,... (default: generated)")
+    parser.add_argument("--slo-ms", type=float, default=None,
+                        help="Only consider settings with batch p95 under this")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the result without writing it")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    levels = ([int(v) for v in args.levels.split(",")] if args.levels
+              else sorted({1, 2, 4, cores} & set(range(1, cores + 1))))
+
+    if args.probe:
+        probe(args.img, levels, args.runs, args.batch_size)
+        sys.exit(0)
+
+    splits = parse_splits(args.splits) if args.splits else candidate_splits(cores)
+    print(f"cores={cores} backend={CNN_BACKEND} parallel={PARALLEL_BRANCHES} "
+          f"splits={len(splits)} workers={levels} batch={args.batch_size}\n")
+    print(f"{'tf_intra':>8} {'tf_inter':>8} {'torch':>6} {'wrk':>5} "
+          f"{'img/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+
+    rows = run(splits, levels, args.runs, args.batch_size, args.img)
+    if not rows:
+        raise SystemExit("No successful runs")
+
+    best = pick(rows, args.slo_ms)
+    if args.dry_run:
+        print("\nBest:", json.dumps(best))
+    else:
+        print("\nSaved", RUNTIME_TUNING_JSON, json.dumps(save(best), indent=2))
@@ -0,0 +1,128 @@
+# ml_code/vit/export_vit.py
+"""
+Export the trained ViT to TorchScript and compare startup / latency.
+
+    python -m ml_code.vit.export_vit              # write config.VIT_TORCHSCRIPT
+    python -m ml_code.vit.export_vit --report     # eager vs TorchScript, CPU
+
+The exported module is vit_model.ViTUint8: (N, 224, 224, 3) uint8 in,
+probabilities out, normalisation included. It is traced channels-last
+and frozen, and loads with torch.jit.load alone (no timm, no network).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+
+from ml_code.config import VIT_TORCHSCRIPT, IMG_SIZE
+
+
+# ======================================================
+# Export
+# ======================================================
+def export():
+    from ml_code.vit.vit_predict import load_vit
+
+    model = load_vit(prefer_torchscript=False).cpu()
+    example = torch.zeros((1, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=torch.uint8)
+
+    # no_grad, not inference_mode: tracing must not capture inference tensors
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        traced = torch.jit.freeze(traced)
+        # Parity on random input before writing anything
+        x = torch.randint(0, 256, (4, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=torch.uint8)
+        diff = (traced(x) - model(x)).abs().max().item()
+
+    if diff > 1e-4:
+        raise SystemExit(f"TorchScript output differs from eager by {diff:.2e}")
+
+    traced.save(str(VIT_TORCHSCRIPT))
+    print(f"Saved TorchScript model: {VIT_TORCHSCRIPT} (max |diff| {diff:.2e})")
+
+
+# ======================================================
+# Startup / latency report (CPU)
+# ======================================================
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def probe(kind, runs=30, batch_sizes=(1, 8)):
+    """
+    Fresh interpreter per kind, so imports and caches don't leak across.
+    """
+    t0 = time.perf_counter()
+    from ml_code.model_manager import models
+    from ml_code.vit.vit_predict import load_vit, vit_predict_batch
+
+    models.override("vit", lambda: load_vit(prefer_torchscript=(kind == "torchscript")))
+    models.get("vit")
+    startup = time.perf_counter() - t0
+
+    result = {
+        "kind": kind,
+        "startup_s": round(startup, 2),
+        "rss_mb": round(_rss_mb(), 1),
+        "timm_imported": "timm" in sys.modules,
+    }
+    rng = np.random.default_rng(0)
+    for bs in batch_sizes:
+        x = torch.from_numpy(
+            rng.integers(0, 256, (bs, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.uint8)
+        )
+        vit_predict_batch(x)   # warm-up
+        times = []
+        for _ in range(runs):
+            t = time.perf_counter()
+            vit_predict_batch(x)
+            times.append((time.perf_counter() - t) * 1000)
+        result[f"bs{bs}_p50_ms"] = round(float(np.percentile(times, 50)), 2)
+        result[f"bs{bs}_ms_per_img"] = round(result[f"bs{bs}_p50_ms"] / bs, 2)
+
+    print(json.dumps(result))
+
+
+def report(runs=30):
+    rows = []
+    for kind in ("eager", "torchscript"):
+        out = subprocess.run(
+            [sys.executable, "-m", "ml_code.vit.export_vit",
+             "--probe", kind, "--runs", str(runs)],
+            env=dict(os.environ, CUDA_VISIBLE_DEVICES=""),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        rows.append(json.loads(out))
+
+    print(f"{'kind':>12} {'startup s':>10} {'RSS MB':>8} {'timm':>5} "
+          f"{'bs1 ms':>8} {'bs8 ms/img':>11}")
+    for r in rows:
+        print(f"{r['kind']:>12} {r['startup_s']:>10} {r['rss_mb']:>8} "
+              f"{str(r['timm_imported']):>5} {r['bs1_p50_ms']:>8} "
+              f"{r['bs8_ms_per_img']:>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--report", action="store_true",
+                        help="Startup time, RSS and CPU latency, eager vs TorchScript")
+    parser.add_argument("--probe", choices=["eager", "torchscript"],
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.runs)
+    elif args.report:
+        report(args.runs)
+    else:
+        export()
@@ -1,15 +1,41 @@
+import torch
 import torch.nn as nn
 import timm
 
 class ViTDiseaseClassifier(nn.Module):
-    def __init__(self, num_classes):
+    def __init__(self, num_classes, pretrained=True):
         super().__init__()
 
+        # pretrained=False when a trained state dict is loaded right
+        # after; avoids the ImageNet weight download
         self.model = timm.create_model(
             "vit_base_patch16_224",
-            pretrained=True,
+            pretrained=pretrained,
             num_classes=num_classes
         )
 
     def forward(self, x):
         return self.model(x)
+
+
+class ViTUint8(nn.Module):
+    """
+    Serving wrapper: (N, H, W, 3) uint8 RGB in, class probabilities out.
+
+    ImageNet normalisation runs in torch, and the NHWC input permuted
+    to NCHW is already channels-last in memory, so no layout copy is
+    made. This is the module exported to TorchScript.
+    """
+
+    def __init__(self, classifier):
+        super().__init__()
+        self.classifier = classifier
+        mean = torch.tensor([0.485, 0.456, 0.406]) * 255
+        std = torch.tensor([0.229, 0.224, 0.225]) * 255
+        self.register_buffer("mean", mean.view(1, 3, 1, 1))
+        self.register_buffer("std", std.view(1, 3, 1, 1))
+
+    def forward(self, x):
+        x = x.permute(0, 3, 1, 2).float()
+        x = (x - self.mean) / self.std
+        return torch.softmax(self.classifier(x), dim=1)
@@ -1,8 +1,9 @@
 import torch
 import numpy as np
-import cv2
-from torchvision import transforms
-from ml_code.vit.vit_model import ViTDiseaseClassifier
+
+from ml_code.config import VIT_MODEL, VIT_TORCHSCRIPT
+from ml_code.preprocessing import decode, as_uint8_batch
+from ml_code.model_manager import models
 
 CLASSES = [
     "Acne",
@@ -15,31 +16,52 @@ CLASSES = [
     "Melanoma"
 ]
 
-MODEL_PATH = "artifacts/models/vit_model.pth"
+MODEL_PATH = VIT_MODEL
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
-model = ViTDiseaseClassifier(len(CLASSES))
-model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
-model.to(device)
-model.eval()
-
-transform = transforms.Compose([
-    transforms.ToPILImage(),
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225]
-    )
-])
-
-@torch.no_grad()
-def vit_predict(image_np):
-    img = cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB)
-    tensor = transform(img).unsqueeze(0).to(device)
 
-    logits = model(tensor)
-    probs = torch.softmax(logits, dim=1)[0].cpu().numpy()
+# ---------------- Lazy loading ----------------
+def load_vit(prefer_torchscript=True):
+    """
+    uint8 NHWC -> probs module. The TorchScript export needs neither
+    timm nor network; the eager fallback needs timm but no download.
+    """
+    if prefer_torchscript and VIT_TORCHSCRIPT.exists():
+        model = torch.jit.load(str(VIT_TORCHSCRIPT), map_location=device)
+    else:
+        from ml_code.vit.vit_model import ViTDiseaseClassifier, ViTUint8
+
+        classifier = ViTDiseaseClassifier(len(CLASSES), pretrained=False)
+        classifier.load_state_dict(torch.load(MODEL_PATH, map_location=device))
+        model = ViTUint8(classifier).to(memory_format=torch.channels_last)
+
+    model.to(device)
+    model.eval()
+    return model
+
+
+def get_model():
+    # Lazy, single-flight, warmed (ml_code.model_manager)
+    return models.get("vit")
+
+
+# ---------------- Prediction ----------------
+@torch.inference_mode()
+def vit_predict_batch(images):
+    """
+    images: (N, 224, 224, 3) uint8 RGB tensor / ndarray, or a list of
+    image sources (decoded once via ml_code.preprocessing).
+    Returns an (N, len(CLASSES)) probability array.
+    """
+    if not isinstance(images, torch.Tensor):
+        images = torch.from_numpy(as_uint8_batch(images, mode="vit"))
+    return get_model()(images.to(device)).cpu().numpy()
+
+
+def vit_predict(image_np):
+    # BGR (cv2) -> RGB, then the training transform's bilinear resize
+    img = decode(np.ascontiguousarray(image_np[..., ::-1]), mode="vit")
+    probs = vit_predict_batch(img[None])[0]
 
     idx = int(np.argmax(probs))
 
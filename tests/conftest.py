@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# ml_code.config asserts the trained artifacts exist unless told not to
+os.environ.setdefault("SKIP_ASSET_CHECKS", "1")
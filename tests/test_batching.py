@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.batching import MicroBatcher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def recording(fn=lambda items: [i * 2 for i in items]):
+    calls = []
+
+    def batch_fn(items):
+        calls.append(list(items))
+        return fn(items)
+
+    return batch_fn, calls
+
+
+def test_concurrent_submits_share_one_batch():
+    batch_fn, calls = recording()
+
+    async def main():
+        b = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=50)
+        try:
+            return await asyncio.gather(*(b.submit(i) for i in range(5)))
+        finally:
+            await b.stop()
+
+    assert run(main()) == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+
+
+def test_batches_split_at_max_size_in_order():
+    batch_fn, calls = recording()
+
+    async def main():
+        b = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=50)
+        try:
+            return await asyncio.gather(*(b.submit(i) for i in range(7)))
+        finally:
+            await b.stop()
+
+    assert run(main()) == [i * 2 for i in range(7)]
+    assert [len(c) for c in calls] == [3, 3, 1]
+    assert sum(calls, []) == list(range(7))
+
+
+def test_lone_item_flushes_after_max_wait():
+    batch_fn, calls = recording()
+
+    async def main():
+        b = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=20)
+        try:
+            t0 = time.perf_counter()
+            result = await asyncio.wait_for(b.submit(1), timeout=2)
+            return result, time.perf_counter() - t0
+        finally:
+            await b.stop()
+
+    result, elapsed = run(main())
+    assert result == 2
+    assert calls == [[1]]
+    assert 0.015 <= elapsed < 1.0
+
+
+def test_items_arriving_after_the_deadline_go_to_the_next_batch():
+    batch_fn, calls = recording()
+
+    async def main():
+        b = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=10)
+        try:
+            first = asyncio.ensure_future(b.submit(1))
+            await asyncio.sleep(0.1)
+            second = await b.submit(2)
+            return await first, second
+        finally:
+            await b.stop()
+
+    assert run(main()) == (2, 4)
+    assert calls == [[1], [2]]
+
+
+def test_batch_fn_error_reaches_every_caller():
+    def boom(items):
+        raise ValueError("model failed")
+
+    async def main():
+        b = MicroBatcher(boom, max_batch_size=4, max_wait_ms=20)
+        try:
+            return await asyncio.gather(*(b.submit(i) for i in range(3)),
+                                        return_exceptions=True)
+        finally:
+            await b.stop()
+
+    results = run(main())
+    assert len(results) == 3
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_worker_survives_a_failed_batch():
+    state = {"fail": True}
+
+    def flaky(items):
+        if state.pop("fail", False):
+            raise ValueError("first batch fails")
+        return items
+
+    async def main():
+        b = MicroBatcher(flaky, max_batch_size=4, max_wait_ms=5)
+        try:
+            with pytest.raises(ValueError):
+                await b.submit(1)
+            return await asyncio.wait_for(b.submit(2), timeout=2)
+        finally:
+            await b.stop()
+
+    assert run(main()) == 2
+
+
+@pytest.mark.parametrize("returned", [[], [0], [0, 1, 2, 3]])
+def test_wrong_result_count_fails_every_caller(returned):
+    async def main():
+        b = MicroBatcher(lambda items: returned, max_batch_size=8,
+                         max_wait_ms=20)
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*(b.submit(i) for i in range(2)),
+                               return_exceptions=True),
+                timeout=2,
+            )
+        finally:
+            await b.stop()
+
+    results = run(main())
+    assert len(results) == 2
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert "results for 2 items" in str(results[0])
+
+
+def test_cancelled_caller_is_dropped_from_the_batch():
+    batch_fn, calls = recording()
+
+    async def main():
+        b = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=30)
+        try:
+            gone = asyncio.ensure_future(b.submit("gone"))
+            kept = asyncio.ensure_future(b.submit("kept"))
+            await asyncio.sleep(0)
+            gone.cancel()
+            return await kept
+        finally:
+            await b.stop()
+
+    assert run(main()) == "keptkept"
+    assert calls == [["kept"]]
+
+
+def test_max_inflight_runs_batches_concurrently():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(items):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return items
+
+    async def main():
+        b = MicroBatcher(slow, max_batch_size=1, max_wait_ms=0,
+                         max_inflight=2)
+        try:
+            return await asyncio.gather(*(b.submit(i) for i in range(4)))
+        finally:
+            await b.stop()
+
+    assert run(main()) == [0, 1, 2, 3]
+    assert peak[0] == 2
+
+
+def test_depth_counts_waiting_items():
+    async def main():
+        b = MicroBatcher(lambda items: items)
+        assert b.depth == 0
+        b.start()
+        await b._queue.put((1, asyncio.get_running_loop().create_future()))
+        depth = b.depth
+        await b.stop()
+        return depth
+
+    assert run(main()) == 1
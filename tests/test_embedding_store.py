@@ -0,0 +1,158 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ml_code.embedding_store import EmbeddingStore, convert
+
+
+def make(tmp_path, rows=10, dim=4, dtype="float32", shard_rows=4, paths=True,
+         name="store"):
+    rng = np.random.default_rng(0)
+    feats = rng.standard_normal((rows, dim)).astype(dtype)
+    labels = rng.integers(0, 3, rows).astype(np.int32)
+    names = [f"img_{i}.jpg" for i in range(rows)] if paths else None
+    store = EmbeddingStore.create(tmp_path / name, ["a", "b", "c"], dtype=dtype)
+    store.append(feats, labels, names, shard_rows=shard_rows)
+    return store, feats, labels
+
+
+# ---------------- append ----------------
+def test_append_splits_into_shards_and_continues_numbering(tmp_path):
+    store, feats, labels = make(tmp_path, rows=10, shard_rows=4)
+    assert [s["rows"] for s in store.index["shards"]] == [4, 4, 2]
+
+    more = np.ones((5, 4), dtype=np.float32)
+    store.append(more, [1] * 5, [f"new_{i}.jpg" for i in range(5)], shard_rows=4)
+    assert [s["rows"] for s in store.index["shards"]] == [4, 4, 2, 4, 1]
+    assert [s["file"] for s in store.index["shards"]] == [
+        f"{i:05d}.npy" for i in range(5)
+    ]
+    assert len(store) == 15 and store.shape == (15, 4)
+
+    X, y = store.load()
+    np.testing.assert_array_equal(X, np.concatenate([feats, more]))
+    np.testing.assert_array_equal(y, np.concatenate([labels, [1] * 5]))
+    assert store.paths[-1] == "new_4.jpg" and len(store.paths) == 15
+
+
+def test_append_rejects_dim_and_length_mismatches(tmp_path):
+    store, _, _ = make(tmp_path)
+    with pytest.raises(ValueError, match="dim"):
+        store.append(np.zeros((2, 5)), [0, 0], ["x", "y"])
+    with pytest.raises(ValueError):
+        store.append(np.zeros((2, 4)), [0], ["x", "y"])
+    with pytest.raises(ValueError, match="paths"):
+        store.append(np.zeros((2, 4)), [0, 0], ["x"])
+
+
+def test_append_paths_must_match_the_store_both_ways(tmp_path):
+    with_paths, _, _ = make(tmp_path, name="with")
+    with pytest.raises(ValueError, match="pass paths"):
+        with_paths.append(np.zeros((1, 4)), [0])
+
+    without, _, _ = make(tmp_path, paths=False, name="without")
+    with pytest.raises(ValueError, match="without paths"):
+        without.append(np.zeros((1, 4)), [0], ["x.jpg"])
+    without.append(np.zeros((1, 4)), [0])
+    assert without.paths is None and len(without) == 11
+
+
+def test_float16_overflow_is_refused(tmp_path):
+    store = EmbeddingStore.create(tmp_path / "s", ["a"], dtype="float16")
+    with pytest.raises(ValueError, match="float16"):
+        store.append(np.array([[1.0, 1e6]]), [0])
+    assert len(store) == 0
+
+    store.append(np.array([[1.0, -60000.0]]), [0])
+    assert store[0].dtype == np.float16
+
+
+# ---------------- reading across shards ----------------
+@pytest.mark.parametrize("key", [
+    slice(0, 10), slice(2, 9), slice(3, 5), slice(4, 8), slice(7, 7),
+    slice(-3, None), slice(1, 10, 3), slice(None, None, -1),
+])
+def test_slices_match_concatenated_reference(tmp_path, key):
+    store, feats, _ = make(tmp_path, rows=10, shard_rows=4)
+    np.testing.assert_array_equal(store[key], feats[key])
+
+
+def test_take_in_any_order_across_shards(tmp_path):
+    store, feats, labels = make(tmp_path, rows=10, shard_rows=4)
+    rows = [9, 0, 5, 5, 3, -1, 4]
+    x, y = store.take(rows, with_labels=True)
+    np.testing.assert_array_equal(x, feats[rows])
+    np.testing.assert_array_equal(y, labels[rows])
+    np.testing.assert_array_equal(store[np.array(rows)], feats[rows])
+    np.testing.assert_array_equal(store[7], feats[7])
+
+    with pytest.raises(IndexError):
+        store.take([10])
+
+
+def test_iter_batches_covers_every_row_in_order(tmp_path):
+    store, feats, labels = make(tmp_path, rows=10, shard_rows=4)
+    chunks = list(store.iter_batches(batch_rows=3, dtype=np.float64))
+    assert [len(x) for x, _ in chunks] == [3, 1, 3, 1, 2]
+    np.testing.assert_array_equal(np.concatenate([x for x, _ in chunks]), feats)
+    np.testing.assert_array_equal(np.concatenate([y for _, y in chunks]), labels)
+    assert chunks[0][0].dtype == np.float64
+
+
+# ---------------- on disk ----------------
+def test_reopen_from_index(tmp_path):
+    store, feats, labels = make(tmp_path, dtype="float16")
+    root = store.root
+    store.close()
+
+    again = EmbeddingStore(root)
+    assert again.classes == ["a", "b", "c"]
+    assert again.dtype == np.float16 and again.dim == 4
+    assert again.paths == [f"img_{i}.jpg" for i in range(10)]
+    X, y = again.load()
+    assert X.dtype == np.float32
+    np.testing.assert_array_equal(X, feats.astype(np.float32))
+    np.testing.assert_array_equal(y, labels)
+
+
+def test_create_refuses_to_clobber_unless_asked(tmp_path):
+    store, _, _ = make(tmp_path)
+    with pytest.raises(FileExistsError):
+        EmbeddingStore.create(store.root, ["a"])
+    fresh = EmbeddingStore.create(store.root, ["a"], overwrite=True)
+    assert len(fresh) == 0 and fresh.classes == ["a"]
+
+
+def test_missing_store_points_at_convert(tmp_path):
+    with pytest.raises(FileNotFoundError, match="convert"):
+        EmbeddingStore(tmp_path / "nope")
+
+
+# ---------------- convert ----------------
+def test_convert_dict_pickle(tmp_path):
+    joblib = pytest.importorskip("joblib")
+    rng = np.random.default_rng(1)
+    feats = rng.standard_normal((6, 3)).astype(np.float32)
+    src = tmp_path / "train_embeddings.pkl"
+    joblib.dump({"paths": [f"p{i}" for i in range(6)], "labels": [0, 1] * 3,
+                 "feats": feats, "classes": ["x", "y"]}, src)
+
+    store = convert(src, tmp_path / "out", dtype="float32")
+    assert store.classes == ["x", "y"]
+    assert store.paths == [f"p{i}" for i in range(6)]
+    assert store.meta["converted_from"] == "train_embeddings.pkl"
+    X, y = EmbeddingStore(tmp_path / "out").load()
+    np.testing.assert_array_equal(X, feats)
+    assert y.tolist() == [0, 1] * 3
+
+
+def test_convert_tuple_pickle(tmp_path):
+    joblib = pytest.importorskip("joblib")
+    probs = np.full((4, 2), 0.5, dtype=np.float32)
+    src = tmp_path / "val_probs.joblib"
+    joblib.dump((probs, np.array([1, 0, 1, 0])), src)
+
+    store = convert(src, tmp_path / "out", dtype="float32")
+    assert store.paths is None
+    np.testing.assert_array_equal(store[:], probs)
+    np.testing.assert_array_equal(store.labels, [1, 0, 1, 0])
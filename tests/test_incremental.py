@@ -0,0 +1,146 @@
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ml_code.incremental import MANIFEST, update_store
+
+CLASSES = ["a", "b"]
+
+
+class StubModel:
+    """
+    compute() for update_store: features come from the file content, so
+    a row can be checked against the file it claims to be. Files whose
+    content starts with b"bad" are reported unreadable.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, paths):
+        self.calls.append(sorted(os.path.basename(p) for p in paths))
+        ok = []
+        feats = []
+        for p in paths:
+            data = open(p, "rb").read()
+            ok.append(not data.startswith(b"bad"))
+            if ok[-1]:
+                feats.append(features(data))
+        return np.array(feats, dtype=np.float32).reshape(-1, 2), np.array(ok)
+
+
+def features(data):
+    return [len(data), data[0]]
+
+
+@pytest.fixture
+def images(tmp_path):
+    folder = tmp_path / "images"
+    folder.mkdir()
+
+    def write(name, data):
+        path = folder / name
+        path.write_bytes(data)
+        return str(path)
+
+    return write
+
+
+def run(tmp_path, paths, model, version="v1"):
+    labels = [i % 2 for i in range(len(paths))]
+    return update_store(tmp_path / "store", paths, labels, CLASSES, version, model)
+
+
+def rows_by_name(store):
+    X = store.load()[0]
+    return {os.path.basename(p): X[i].tolist() for i, p in enumerate(store.paths)}
+
+
+def test_only_new_and_changed_files_are_computed(tmp_path, images):
+    model = StubModel()
+    a = images("a.jpg", b"aaaa")
+    b = images("b.jpg", b"bb")
+    c = images("c.jpg", b"cccccc")
+
+    first = rows_by_name(run(tmp_path, [a, b, c], model))
+    assert model.calls == [["a.jpg", "b.jpg", "c.jpg"]]
+
+    # Added file: one more shard, nothing else recomputed
+    d = images("d.jpg", b"ddd")
+    store = run(tmp_path, [a, b, c, d], model)
+    assert model.calls[-1] == ["d.jpg"]
+    assert len(store.index["shards"]) == 2
+
+    # Modify b (new content and size), delete c
+    images("b.jpg", b"BBBBBBBB")
+    os.remove(c)
+    store = run(tmp_path, [a, b, d], model)
+    assert model.calls[-1] == ["b.jpg"]
+
+    rows = rows_by_name(store)
+    assert sorted(rows) == ["a.jpg", "b.jpg", "d.jpg"]       # c is gone
+    assert rows["a.jpg"] == first["a.jpg"]                   # kept as is
+    assert rows["b.jpg"] == features(b"BBBBBBBB")
+    assert rows["d.jpg"] == features(b"ddd")
+
+    manifest = json.loads((tmp_path / "store" / MANIFEST).read_text())
+    assert sorted(manifest["files"]) == sorted([a, b, d])
+
+    # Nothing changed: no compute at all
+    run(tmp_path, [a, b, d], model)
+    assert len(model.calls) == 3
+
+
+def test_touched_but_unchanged_file_is_not_recomputed(tmp_path, images):
+    model = StubModel()
+    a = images("a.jpg", b"aaaa")
+    run(tmp_path, [a], model)
+
+    st = os.stat(a)
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    run(tmp_path, [a], model)
+    assert model.calls == [["a.jpg"]]
+
+    manifest = json.loads((tmp_path / "store" / MANIFEST).read_text())
+    assert manifest["files"][a]["mtime_ns"] == os.stat(a).st_mtime_ns
+
+
+def test_same_size_edit_is_caught_by_the_hash(tmp_path, images):
+    model = StubModel()
+    a = images("a.jpg", b"aaaa")
+    run(tmp_path, [a], model)
+
+    st = os.stat(a)
+    images("a.jpg", b"zzzz")
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    store = run(tmp_path, [a], model)
+    assert model.calls[-1] == ["a.jpg"]
+    assert rows_by_name(store)["a.jpg"] == features(b"zzzz")
+
+
+def test_model_version_bump_recomputes_everything(tmp_path, images):
+    model = StubModel()
+    paths = [images("a.jpg", b"aaaa"), images("b.jpg", b"bb")]
+    run(tmp_path, paths, model, version="v1")
+    store = run(tmp_path, paths, model, version="v2")
+
+    assert model.calls == [["a.jpg", "b.jpg"], ["a.jpg", "b.jpg"]]
+    assert store.meta["model_version"] == "v2"
+    manifest = json.loads((tmp_path / "store" / MANIFEST).read_text())
+    assert manifest["model_version"] == "v2"
+
+
+def test_unreadable_files_are_retried(tmp_path, images):
+    model = StubModel()
+    a = images("a.jpg", b"aaaa")
+    bad = images("bad.jpg", b"bad bytes")
+    store = run(tmp_path, [a, bad], model)
+    assert [os.path.basename(p) for p in store.paths] == ["a.jpg"]
+
+    images("bad.jpg", b"fixed now")
+    store = run(tmp_path, [a, bad], model)
+    assert model.calls[-1] == ["bad.jpg"]
+    assert sorted(rows_by_name(store)) == ["a.jpg", "bad.jpg"]
@@ -0,0 +1,118 @@
+import pytest
+
+from ml_code import metrics
+from ml_code.metrics import Counter, Gauge, Histogram
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Metrics register themselves globally; give each test a clean one
+    monkeypatch.setattr(metrics, "_registry", [])
+    return metrics._registry
+
+
+def samples(text):
+    return [l for l in text.splitlines() if l and not l.startswith("#")]
+
+
+# ---------------- render() ----------------
+def test_render_concatenates_every_metric_with_help_and_type(registry):
+    c = Counter("jobs_total", "Jobs run", labelnames=("kind",))
+    c.inc(kind="a")
+    c.inc(2, kind="a")
+    c.inc(kind="b")
+    Gauge("queue_depth", "Waiting", lambda: 3)
+    Gauge("hits_total", "Hits", lambda: 7, kind="counter")
+
+    text = metrics.render()
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    assert lines[:2] == ["# HELP jobs_total Jobs run", "# TYPE jobs_total counter"]
+    assert 'jobs_total{kind="a"} 3' in lines
+    assert 'jobs_total{kind="b"} 1' in lines
+    assert "# TYPE queue_depth gauge" in lines
+    assert "queue_depth 3.0" in lines
+    assert "# TYPE hits_total counter" in lines
+    assert "hits_total 7.0" in lines
+
+
+def test_unlabelled_counter_and_empty_metrics(registry):
+    Counter("never_total", "Never incremented")
+    c = Counter("once_total", "Once")
+    c.inc()
+    assert samples(metrics.render()) == ["once_total 1"]
+
+
+def test_failing_gauge_is_left_out(registry):
+    def broken():
+        raise RuntimeError("no backend")
+
+    Gauge("broken", "Broken", broken)
+    Gauge("fine", "Fine", lambda: 1)
+    text = metrics.render()
+    assert "broken" not in text
+    assert "fine 1.0" in text
+
+
+# ---------------- Histogram ----------------
+def test_histogram_buckets_are_cumulative_and_le_inclusive(registry):
+    h = Histogram("latency_seconds", "Latency", buckets=(0.1, 0.5, 1.0))
+    for v in (0.05, 0.1, 0.3, 0.5, 2.0):
+        h.observe(v)
+
+    assert samples(metrics.render()) == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="0.5"} 4',
+        'latency_seconds_bucket{le="1.0"} 4',
+        'latency_seconds_bucket{le="+Inf"} 5',
+        "latency_seconds_sum 2.95",
+        "latency_seconds_count 5",
+    ]
+
+
+def test_histogram_series_per_label(registry):
+    h = Histogram("stage_seconds", "Stage", labelnames=("stage",),
+                  buckets=(1.0,))
+    h.observe(0.5, stage="decode")
+    h.observe(3.0, stage="cnn")
+    h.observe(0.2, stage="cnn")
+
+    lines = samples(metrics.render())
+    assert 'stage_seconds_bucket{stage="cnn",le="1.0"} 1' in lines
+    assert 'stage_seconds_bucket{stage="cnn",le="+Inf"} 2' in lines
+    assert 'stage_seconds_count{stage="cnn"} 2' in lines
+    assert 'stage_seconds_bucket{stage="decode",le="1.0"} 1' in lines
+    assert 'stage_seconds_count{stage="decode"} 1' in lines
+
+
+def test_default_latency_buckets_are_sorted():
+    assert list(metrics.LATENCY_BUCKETS) == sorted(metrics.LATENCY_BUCKETS)
+
+
+def test_stage_timer_records_even_on_error(registry, monkeypatch):
+    h = Histogram("t_seconds", "T", labelnames=("stage",))
+    monkeypatch.setattr(metrics, "STAGE_SECONDS", h)
+
+    with pytest.raises(ValueError):
+        with metrics.stage_timer("decode"):
+            raise ValueError
+    assert 't_seconds_count{stage="decode"} 1' in samples(metrics.render())
+
+
+# ---------------- label escaping ----------------
+@pytest.mark.parametrize("raw, escaped", [
+    ('say "hi"', 'say \\"hi\\"'),
+    ("C:\\models", "C:\\\\models"),
+    ("two\nlines", "two\\nlines"),
+    ('\\"', '\\\\\\"'),
+])
+def test_label_values_are_escaped(registry, raw, escaped):
+    c = Counter("esc_total", "Escaping", labelnames=("path",))
+    c.inc(path=raw)
+    assert samples(metrics.render()) == [f'esc_total{{path="{escaped}"}} 1']
+
+
+def test_missing_label_renders_empty(registry):
+    c = Counter("partial_total", "Partial", labelnames=("a", "b"))
+    c.inc(a="x")
+    assert samples(metrics.render()) == ['partial_total{a="x",b=""} 1']
@@ -0,0 +1,161 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")        # fastapi.testclient
+main = pytest.importorskip("backend.main")
+
+from fastapi.testclient import TestClient
+
+
+class FakeImage:
+    def __init__(self, data):
+        self.data = data
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # "Images" are b"IMG:<label>"; anything else fails to decode
+    def decode_upload(data, tta=False):
+        if not data.startswith(b"IMG:"):
+            raise ValueError("cannot identify image file")
+        return FakeImage(data), data
+
+    async def cached_predict(image, key, tta=False):
+        return {"final_label": image.data[4:].decode(), "confidence": 0.5,
+                "source": "cnn"}
+
+    monkeypatch.setattr(main, "decode_upload", decode_upload)
+    monkeypatch.setattr(main, "cached_predict", cached_predict)
+    # No `with`: startup (model loading) is not run
+    return TestClient(main.app)
+
+
+def make_zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def post(client, files):
+    r = client.post("/predict/batch",
+                    files=[("files", (name, data)) for name, data in files])
+    assert r.status_code == 200
+    return [json.loads(l) for l in r.text.splitlines()]
+
+
+def test_mixed_multipart_and_zip(client):
+    archive = make_zip([
+        ("b.jpg", b"IMG:acne"),
+        ("notes.txt", b"skipped"),
+        ("dir/", b""),
+        ("dir/c.png", b"IMG:eczema"),
+    ])
+    lines = post(client, [("a.png", b"IMG:psoriasis"), ("set.zip", archive),
+                          ("d.jpg", b"IMG:rosacea")])
+
+    assert [l["index"] for l in lines] == [0, 1, 2, 3]
+    assert [l["filename"] for l in lines] == ["a.png", "b.jpg", "dir/c.png", "d.jpg"]
+    assert [l["disease"] for l in lines] == ["psoriasis", "acne", "eczema", "rosacea"]
+    assert all("error" not in l for l in lines)
+
+
+def test_bad_zip_is_an_error_line_not_a_truncated_stream(client):
+    lines = post(client, [("broken.zip", b"PK\x03\x04 not really a zip"),
+                          ("ok.png", b"IMG:acne")])
+
+    assert len(lines) == 2
+    assert lines[0]["filename"] == "broken.zip"
+    assert lines[0]["error"].startswith("Invalid zip")
+    assert lines[1] == {"index": 1, "filename": "ok.png", "disease": "acne",
+                        "confidence": 50.0, "source": "cnn", "description": ""}
+
+
+def test_corrupt_zip_member(client):
+    archive = bytearray(make_zip([("a.png", b"IMG:" + b"x" * 4096),
+                                  ("b.png", b"IMG:acne")]))
+    # Flip bytes inside a.png's compressed data (after its local header)
+    for i in range(40, 50):
+        archive[i] ^= 0xFF
+    lines = post(client, [("set.zip", bytes(archive))])
+
+    assert [l["filename"] for l in lines] == ["a.png", "b.png"]
+    assert "error" in lines[0]
+    assert lines[1]["disease"] == "acne"
+
+
+def test_bad_image(client):
+    lines = post(client, [("a.png", b"IMG:acne"), ("bad.png", b"\x00garbage")])
+    assert lines[0]["disease"] == "acne"
+    assert lines[1]["error"].startswith("Invalid image")
+
+
+def test_oversized_images_are_rejected_before_reading(client, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_MAX_IMAGE_BYTES", 64)
+    archive = make_zip([("bomb.png", b"IMG:" + b"\x00" * 10_000),
+                        ("ok.png", b"IMG:acne")])
+    lines = post(client, [("set.zip", archive), ("big.png", b"IMG:" + b"y" * 100)])
+
+    assert [l["filename"] for l in lines] == ["bomb.png", "ok.png", "big.png"]
+    assert "too large" in lines[0]["error"]
+    assert lines[1]["disease"] == "acne"
+    assert "too large" in lines[2]["error"]
+
+
+def test_member_whose_header_understates_its_size(monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_MAX_IMAGE_BYTES", 64)
+    f = io.BytesIO(make_zip([("bomb.png", b"IMG:" + b"\x00" * 10_000)]))
+    zf = zipfile.ZipFile(f)
+    zf.infolist()[0].file_size = 10              # what a lying header says
+    monkeypatch.setattr(main.zipfile, "ZipFile", lambda _: zf)
+
+    # zipfile stops at the declared size and then fails the CRC check;
+    # either way nothing past the limit reaches the decoder
+    [(name, data, error)] = main.iter_uploaded_images([("set.zip", f)])
+    assert name == "bomb.png" and data is None
+    assert error
+
+
+# ---------------- _score_chunk ----------------
+def test_chunk_streams_in_order_as_results_complete(monkeypatch):
+    release = {}
+    emitted = []
+
+    monkeypatch.setattr(main, "decode_upload",
+                        lambda data, tta=False: (FakeImage(data), data))
+
+    async def cached_predict(image, key, tta=False):
+        await release[image.data].wait()
+        return {"final_label": image.data.decode(), "confidence": 0.5,
+                "source": "cnn"}
+
+    monkeypatch.setattr(main, "cached_predict", cached_predict)
+
+    async def main_():
+        for k in (b"a", b"b", b"c"):
+            release[k] = asyncio.Event()
+        chunk = [(0, "a", b"a", None), (1, "b", b"b", None),
+                 (2, "c", b"c", None), (3, "d", None, "Invalid zip: x")]
+
+        async def consume():
+            async for line in main._score_chunk(chunk):
+                emitted.append(json.loads(line)["index"])
+
+        consumer = asyncio.ensure_future(consume())
+        # Later images finishing first are held back...
+        release[b"c"].set()
+        release[b"b"].set()
+        await asyncio.sleep(0.05)
+        assert emitted == []
+        # ...and the first one releases the whole finished prefix
+        release[b"a"].set()
+        await consumer
+
+    asyncio.run(main_())
+    assert emitted == [0, 1, 2, 3]
@@ -0,0 +1,11 @@
+from backend.prefork import restart_delay
+
+
+def test_restart_delay_doubles_then_caps():
+    delays = [restart_delay(n, base=1, cap=30) for n in range(1, 8)]
+    assert delays == [1, 2, 4, 8, 16, 30, 30]
+
+
+def test_first_restart_waits_the_base_delay():
+    assert restart_delay(0, base=0.5, cap=10) == 0.5
+    assert restart_delay(1, base=0.5, cap=10) == 0.5
@@ -0,0 +1,153 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from ml_code import preprocessing as pp
+
+
+@pytest.fixture
+def u8():
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 256, (3, 8, 6, 3), dtype=np.uint8)
+    x[0, 0, 0] = (0, 128, 255)          # make sure the extremes are in
+    return x
+
+
+def ref_mean_std(x, mean, std):
+    # torchvision ToTensor + Normalize, NHWC -> NCHW
+    y = (x.astype(np.float64) / 255.0 - np.array(mean)) / np.array(std)
+    return y.transpose(0, 3, 1, 2)
+
+
+# ---------------- reference formulas ----------------
+def test_affine_matches_formula_and_is_float32(u8):
+    scale = np.array([0.5, 0.25, 2.0])
+    shift = np.array([1.0, -3.0, 0.5])
+    y = pp._affine(u8, scale, shift, None)
+    assert y.dtype == np.float32 and y.shape == u8.shape
+    np.testing.assert_allclose(y, u8 * scale - shift, rtol=1e-6, atol=1e-6)
+
+
+def test_mobilenet_preprocess_matches_keras_formula(u8):
+    y = pp.mobilenet_preprocess(u8)
+    np.testing.assert_allclose(y, u8 / 127.5 - 1.0, atol=1e-6)
+    assert y.min() >= -1.0 and y.max() <= 1.0
+
+
+def test_unit_scale(u8):
+    y = pp.unit_scale(u8)
+    np.testing.assert_allclose(y, u8 / 255.0, atol=1e-7)
+    assert y[0, 0, 0, 0] == 0.0
+    assert y[0, 0, 0, 2] == pytest.approx(1.0, abs=1e-6)
+
+
+def test_cnn_normalize_is_the_training_rescale(u8):
+    # train_cnn.py: rescale=1/255; serving, TTA and calibration share it
+    np.testing.assert_array_equal(pp.cnn_normalize(u8), pp.unit_scale(u8))
+
+
+@pytest.mark.parametrize("fn, mean, std", [
+    (pp.clip_normalize, pp.CLIP_MEAN, pp.CLIP_STD),
+    (pp.imagenet_normalize, pp.IMAGENET_MEAN, pp.IMAGENET_STD),
+])
+def test_mean_std_normalisers_match_torchvision_formula(u8, fn, mean, std):
+    y = fn(u8)
+    assert y.shape == (3, 3, 8, 6)
+    assert y.dtype == np.float32
+    np.testing.assert_allclose(y, ref_mean_std(u8, mean, std), atol=1e-5)
+
+
+def test_mean_std_output_is_a_channels_last_view(u8):
+    out = np.empty(u8.shape, dtype=np.float32)
+    y = pp.clip_normalize(u8, out=out)
+    assert np.shares_memory(y, out)
+    assert out.flags["C_CONTIGUOUS"]
+
+
+def test_single_image_without_batch_axis(u8):
+    np.testing.assert_allclose(pp.unit_scale(u8[0]), u8[0] / 255.0, atol=1e-7)
+    assert pp.imagenet_normalize(u8[0]).shape == (3, 8, 6)
+
+
+# ---------------- out= and buffer reuse ----------------
+@pytest.mark.parametrize("fn", [pp.mobilenet_preprocess, pp.unit_scale,
+                                pp.cnn_normalize, pp.clip_normalize,
+                                pp.imagenet_normalize])
+def test_out_is_written_in_place(u8, fn):
+    out = np.full(u8.shape, np.nan, dtype=np.float32)
+    y = fn(u8, out=out)
+    assert np.shares_memory(y, out)
+    assert not np.isnan(out).any()
+    np.testing.assert_array_equal(y, fn(u8))
+
+
+def test_buffer_is_reused_and_sliced_per_thread():
+    a = pp.buffer("test_reuse", (4, 2, 2, 3))
+    b = pp.buffer("test_reuse", (2, 2, 2, 3))
+    assert b.shape == (2, 2, 2, 3)
+    assert np.shares_memory(a, b)
+
+    c = pp.buffer("test_reuse", (8, 2, 2, 3))       # grows
+    assert c.shape == (8, 2, 2, 3)
+    assert not np.shares_memory(a, c)
+
+    d = pp.buffer("test_reuse", (8, 2, 2, 3), np.uint8)
+    assert d.dtype == np.uint8
+
+    assert not np.shares_memory(pp.buffer("test_other", (4, 2, 2, 3)),
+                                pp.buffer("test_reuse", (4, 2, 2, 3)))
+
+
+def test_buffer_differs_between_threads():
+    mine = pp.buffer("test_thread", (2, 2, 2, 3))
+    seen = []
+    t = threading.Thread(
+        target=lambda: seen.append(pp.buffer("test_thread", (2, 2, 2, 3)))
+    )
+    t.start()
+    t.join()
+    assert not np.shares_memory(mine, seen[0])
+
+
+def test_reused_buffer_gives_fresh_results_across_calls(u8):
+    # A big batch then a small one through the same scratch buffer:
+    # the second result must not contain anything from the first
+    big = pp.clip_normalize(u8, out=pp.buffer("test_clip", u8.shape))
+    big_copy = big.copy()
+
+    small_in = 255 - u8[:1]
+    small = pp.clip_normalize(small_in, out=pp.buffer("test_clip", small_in.shape))
+    np.testing.assert_allclose(
+        small, ref_mean_std(small_in, pp.CLIP_MEAN, pp.CLIP_STD), atol=1e-5
+    )
+    assert small.shape[0] == 1
+    # Documented contract: the earlier result was overwritten in place
+    assert not np.allclose(big[:1], big_copy[:1])
+
+
+def test_concurrent_threads_do_not_corrupt_each_other():
+    rng = np.random.default_rng(2)
+    inputs = [rng.integers(0, 256, (4, 16, 16, 3), dtype=np.uint8)
+              for _ in range(4)]
+    errors = []
+
+    def work(x):
+        try:
+            for _ in range(50):
+                y = pp.imagenet_normalize(x, out=pp.buffer("test_conc", x.shape))
+                np.testing.assert_allclose(
+                    y, ref_mean_std(x, pp.IMAGENET_MEAN, pp.IMAGENET_STD),
+                    atol=1e-5,
+                )
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(x,)) for x in inputs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
@@ -0,0 +1,175 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from ml_code import tta
+from ml_code.tta import view_index, tta_views, tta_probs
+
+H, W = 48, 64   # not square, so a swapped h / w shows up
+
+FLIP = getattr(Image, "Transpose", Image)
+
+
+def coord_image(h=H, w=W):
+    """
+    R = source row, G = source column, B = 255: every output pixel says
+    which input pixel it was taken from.
+    """
+    ys, xs = np.mgrid[0:h, 0:w]
+    return np.stack([ys, xs, np.full_like(ys, 255)], axis=-1).astype(np.uint8)
+
+
+def views_of(img):
+    return tta_views(img[None])
+
+
+def reference_views(img):
+    """
+    The same views built with PIL, in view_index order.
+    """
+    pil = Image.fromarray(img)
+    h, w = img.shape[:2]
+    out = [pil.transpose(FLIP.FLIP_LEFT_RIGHT), pil.transpose(FLIP.FLIP_TOP_BOTTOM)]
+
+    # view_index rotates by +deg in image (y-down) coordinates, which is
+    # PIL's counter-clockwise rotate() by -deg
+    for deg in tta.TTA_ROTATIONS:
+        out.append(pil.rotate(-deg, resample=Image.NEAREST))
+
+    ch, cw = int(h * tta.TTA_CROP), int(w * tta.TTA_CROP)
+    for y0, x0 in [(0, 0), (0, w - cw), (h - ch, 0), (h - ch, w - cw),
+                   ((h - ch) // 2, (w - cw) // 2)]:
+        crop = pil.crop((x0, y0, x0 + cw, y0 + ch))
+        out.append(crop.resize((w, h), Image.NEAREST))
+    return [np.asarray(v) for v in out]
+
+
+def test_view_count_and_shape():
+    idx = view_index(H, W)
+    assert idx.shape == (2 + len(tta.TTA_ROTATIONS) + 5, H * W)
+    assert idx.min() >= 0 and idx.max() < H * W
+
+
+def test_flips_match_pil_exactly():
+    img = coord_image()
+    ours = views_of(img)
+    ref = reference_views(img)
+    np.testing.assert_array_equal(ours[0], ref[0])
+    np.testing.assert_array_equal(ours[1], ref[1])
+
+
+@pytest.mark.parametrize("view", [2, 3])
+def test_rotations_match_pil(view):
+    img = coord_image()
+    ours = views_of(img)[view].astype(int)
+    ref = reference_views(img)[view].astype(int)
+
+    # PIL fills out-of-bounds source pixels (B = 0); view_index clamps
+    # to the edge. Compare where PIL had a real source pixel.
+    inside = ref[..., 2] == 255
+    assert inside.mean() > 0.8
+
+    d = np.abs(ours[..., :2] - ref[..., :2])[inside]
+    # Same geometry; nearest-pixel rounding may differ on exact ties
+    assert d.max() <= 1
+    assert (d.sum(axis=-1) == 0).mean() > 0.99
+
+
+def test_rotation_direction_is_not_mirrored():
+    img = coord_image()
+    ours = views_of(img)
+    ref = reference_views(img)
+    # Each of ours is much closer to its own reference than to the
+    # opposite rotation
+    inside = (ref[2][..., 2] == 255) & (ref[3][..., 2] == 255)
+    for a, b in ((2, 3), (3, 2)):
+        mine = ours[a, ..., :2].astype(int)[inside]
+        own = np.abs(mine - ref[a][..., :2][inside]).mean()
+        other = np.abs(mine - ref[b][..., :2][inside]).mean()
+        assert own < other / 4
+
+
+@pytest.mark.parametrize("view", range(4, 9))
+def test_crops_match_pil(view):
+    img = coord_image()
+    ours = views_of(img)[view].astype(int)
+    ref = reference_views(img)[view].astype(int)
+
+    # Same box; the nearest upscale may pick the neighbouring row/column
+    d = np.abs(ours[..., :2] - ref[..., :2])
+    assert d.max() <= 1
+    np.testing.assert_array_equal(ours[0, 0], ref[0, 0])
+
+
+def test_crop_views_keep_their_corner():
+    img = coord_image()
+    ours = views_of(img)
+    ch, cw = int(H * tta.TTA_CROP), int(W * tta.TTA_CROP)
+    corners = [(0, 0), (0, W - cw), (H - ch, 0), (H - ch, W - cw),
+               ((H - ch) // 2, (W - cw) // 2)]
+    for view, (y0, x0) in zip(range(4, 9), corners):
+        assert tuple(ours[view, 0, 0, :2]) == (y0, x0)
+        # Covers at most the crop, never beyond it
+        assert ours[view, ..., 0].max() < y0 + ch
+        assert ours[view, ..., 1].max() < x0 + cw
+
+
+def test_tta_views_layout_and_out_buffer():
+    rng = np.random.default_rng(0)
+    u8 = rng.integers(0, 256, (3, H, W, 3), dtype=np.uint8)
+    idx = view_index(H, W)
+    v = len(idx)
+
+    out = np.empty((3 * v, H, W, 3), dtype=np.uint8)
+    res = tta_views(u8, out=out)
+    assert res is out
+
+    for i in range(3):
+        flat = u8[i].reshape(H * W, 3)
+        for j in range(v):
+            np.testing.assert_array_equal(
+                out[i * v + j], flat[idx[j]].reshape(H, W, 3)
+            )
+
+
+class FakeModel:
+    def __init__(self, n_classes):
+        self.n_classes = n_classes
+        self.batches = []
+
+    def predict(self, x):
+        self.batches.append(len(x))
+        probs = np.zeros((len(x), self.n_classes), dtype=np.float32)
+        probs[:, 0] = 1.0
+        return probs
+
+
+def test_tta_probs_only_touches_low_confidence_images():
+    rng = np.random.default_rng(1)
+    u8 = rng.integers(0, 256, (3, H, W, 3), dtype=np.uint8)
+    probs = np.array([[0.95, 0.05], [0.4, 0.6], [0.9, 0.1]], dtype=np.float32)
+    model = FakeModel(2)
+
+    new, low = tta_probs(model, u8, probs, lambda x, out=None: x,
+                         threshold=0.75)
+
+    v = len(view_index(H, W))
+    assert low.tolist() == [False, True, False]
+    assert model.batches == [v]                    # one forward, one image
+    np.testing.assert_array_equal(new[[0, 2]], probs[[0, 2]])
+    np.testing.assert_allclose(new[1], [(0.4 + v) / (v + 1), 0.6 / (v + 1)],
+                               rtol=1e-6)
+    assert probs[1, 0] == np.float32(0.4)          # input left as is
+
+
+def test_tta_probs_skips_forward_when_all_confident():
+    u8 = np.zeros((2, H, W, 3), dtype=np.uint8)
+    probs = np.array([[0.9, 0.1], [0.2, 0.8]], dtype=np.float32)
+    model = FakeModel(2)
+
+    new, low = tta_probs(model, u8, probs, lambda x, out=None: x,
+                         threshold=0.75)
+    assert not low.any()
+    assert new is probs
+    assert model.batches == []
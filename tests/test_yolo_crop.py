@@ -0,0 +1,172 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ml_code.detection import yolo_crop
+from ml_code.detection.yolo_crop import BoxCache, largest_boxes, lesion_boxes, crop_batch
+
+
+def boxes(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, 4)
+
+
+# ---------------- largest_boxes ----------------
+def test_picks_the_largest_of_several_boxes():
+    out = largest_boxes(
+        [boxes([0, 0, 10, 10], [5, 5, 45, 25], [1, 1, 20, 20])],
+        [(100, 100, 3)],
+    )
+    assert out.tolist() == [[5, 5, 45, 25]]
+
+
+def test_no_boxes_anywhere():
+    out = largest_boxes([boxes(), boxes()], [(10, 10, 3), (20, 20, 3)])
+    assert out.tolist() == [[-1] * 4, [-1] * 4]
+    assert out.dtype == np.int64
+
+
+def test_images_without_boxes_mixed_with_others():
+    out = largest_boxes(
+        [boxes(), boxes([0, 0, 4, 4], [0, 0, 8, 8]), boxes(), boxes([2, 2, 6, 3])],
+        [(50, 50, 3)] * 4,
+    )
+    assert out.tolist() == [[-1] * 4, [0, 0, 8, 8], [-1] * 4, [2, 2, 6, 3]]
+
+
+def test_tie_keeps_the_first_detection():
+    # YOLO returns boxes by confidence; equal areas keep that order
+    out = largest_boxes(
+        [boxes([0, 0, 10, 20], [30, 30, 50, 40], [60, 60, 70, 70])],
+        [(100, 100, 3)],
+    )
+    assert out.tolist() == [[0, 0, 10, 20]]
+
+
+def test_boxes_are_clipped_to_their_own_image():
+    out = largest_boxes(
+        [boxes([-5, -3, 150, 40]), boxes([10, 10, 90, 300])],
+        [(60, 120, 3), (200, 80, 3)],     # (h, w, c)
+    )
+    assert out.tolist() == [[0, 0, 120, 40], [10, 10, 80, 200]]
+
+
+def test_fractional_coordinates_truncate():
+    out = largest_boxes([boxes([1.9, 2.2, 10.7, 11.5])], [(20, 20, 3)])
+    assert out.tolist() == [[1, 2, 10, 11]]
+
+
+# ---------------- BoxCache ----------------
+def test_cache_key_depends_on_pixels_shape_model_and_conf():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (8, 6, 3), dtype=np.uint8)
+    key = BoxCache.key(img, "yolo.pt", 0.25)
+
+    assert key == BoxCache.key(img.copy(), "yolo.pt", 0.25)
+    assert key != BoxCache.key(img, "other.pt", 0.25)
+    assert key != BoxCache.key(img, "yolo.pt", 0.5)
+
+    changed = img.copy()
+    changed[0, 0, 0] ^= 1
+    assert key != BoxCache.key(changed, "yolo.pt", 0.25)
+
+    # Same bytes, different shape
+    assert key != BoxCache.key(img.reshape(6, 8, 3), "yolo.pt", 0.25)
+
+
+def test_cache_key_of_a_strided_view_matches_its_copy():
+    rng = np.random.default_rng(1)
+    big = rng.integers(0, 256, (10, 10, 3), dtype=np.uint8)
+    view = big[::2, 1:7]
+    assert not view.flags["C_CONTIGUOUS"]
+    assert BoxCache.key(view, "m", 0.25) == BoxCache.key(view.copy(), "m", 0.25)
+
+
+def test_cache_lru_eviction():
+    cache = BoxCache(maxsize=2)
+    a, b, c = (np.array([i] * 4) for i in range(3))
+    cache.put("a", a)
+    cache.put("b", b)
+    assert cache.get("a") is a          # "a" most recent now
+    cache.put("c", c)
+    assert cache.get("b") is None
+    assert cache.get("a") is a and cache.get("c") is c
+
+
+def test_cache_disabled_with_maxsize_zero():
+    cache = BoxCache(maxsize=0)
+    cache.put("a", np.zeros(4))
+    assert cache.get("a") is None
+
+
+# ---------------- lesion_boxes / crop_batch ----------------
+class _Boxes:
+    def __init__(self, xyxy):
+        self.xyxy = self
+        self._xyxy = xyxy
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._xyxy
+
+
+class _Result:
+    def __init__(self, xyxy):
+        self.boxes = None if xyxy is None else _Boxes(xyxy)
+
+
+class FakeYolo:
+    def __init__(self, per_call):
+        self.per_call = per_call
+        self.calls = []
+
+    def __call__(self, imgs, conf, verbose):
+        self.calls.append(len(imgs))
+        return [_Result(self.per_call(img)) for img in imgs]
+
+
+@pytest.fixture
+def fake_yolo(monkeypatch):
+    monkeypatch.setattr(yolo_crop, "box_cache", BoxCache(maxsize=8))
+
+    def install(per_call):
+        model = FakeYolo(per_call)
+        monkeypatch.setattr(yolo_crop, "load_yolo", lambda path=None: model)
+        return model
+
+    return install
+
+
+def test_cache_hits_skip_yolo(fake_yolo):
+    model = fake_yolo(lambda img: boxes([1, 1, 5, 4]))
+    img = np.zeros((10, 10, 3), dtype=np.uint8)
+    other = np.ones((10, 10, 3), dtype=np.uint8)
+
+    first = lesion_boxes([img, other])
+    again = lesion_boxes([img.copy(), other, np.full((10, 10, 3), 2, np.uint8)])
+
+    assert first.tolist() == [[1, 1, 5, 4]] * 2
+    assert again.tolist() == [[1, 1, 5, 4]] * 3
+    assert model.calls == [2, 1]        # only the new image went to YOLO
+
+
+def test_no_detection_is_cached_and_crops_to_none(fake_yolo):
+    model = fake_yolo(lambda img: None)
+    img = np.zeros((10, 10, 3), dtype=np.uint8)
+
+    assert crop_batch([img]) == [None]
+    assert crop_batch([img]) == [None]
+    assert model.calls == [1]
+
+
+def test_crop_is_a_view_and_respects_min_size(fake_yolo):
+    fake_yolo(lambda img: boxes([2, 3, 8, 9]) if img[0, 0, 0] == 0
+              else boxes([2, 3, 3, 9]))
+    img = np.zeros((12, 12, 3), dtype=np.uint8)
+    thin = np.full((12, 12, 3), 7, dtype=np.uint8)
+
+    crop, none = crop_batch([img, thin], min_size=2)
+    assert crop.shape == (6, 6, 3)
+    assert np.shares_memory(crop, img)
+    assert none is None